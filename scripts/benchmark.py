@@ -0,0 +1,47 @@
+import os
+import json
+import time
+import logging
+import argparse
+from src.setup_logging import setup_logging
+from src.benchmark import Benchmark, STAGES, compare
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput benchmark of the capture, render, record and stream paths")
+    parser.add_argument("--input", help="RAW recording to use instead of synthetic events")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--rates", nargs="+", type=float, help="Event rates to sweep, in events/s")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds of events per run")
+    parser.add_argument("--max-events", type=int, default=5000000)
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--pixel-format", default="bgr24", choices=["bgr24", "gray"],
+                        help="Frames fed to the ffmpeg stage, as streamed by remote_live")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results JSON path (default: assets/benchmarks/)")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    benchmark = Benchmark(input_path=args.input, batch_sizes=args.batch_sizes, event_rates=args.rates,
+                          stages=args.stages, duration_s=args.duration, max_events=args.max_events,
+                          fps=args.fps, seed=args.seed, pixel_format=args.pixel_format)
+    results = benchmark.run()
+
+    output = args.output
+    if output is None:
+        revision = (results["meta"]["git"] or "unknown")[:12]
+        output = os.path.join("assets", "benchmarks", f"bench_{time.strftime('%y%m%d_%H%M%S')}_{revision}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    logger.info(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            base = json.load(f)
+        for change in compare(base, results):
+            logger.info(f"{change['stage']:8s} batch={change['batch_size']:<7d} "
+                        f"rate={change['event_rate'] / 1e6:.1f} Mev/s: {change['change'] * 100:+.1f}%")
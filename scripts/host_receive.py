@@ -1,13 +1,93 @@
+import argparse
+import time
 import cv2
+from src.render import recolor, read_time_stamp, IndexedFrameRenderer
+from src.event_stream import EventStreamReceiver
+from src.video_receiver import LatestFrameReceiver, LatencyMeter
 
-cap = cv2.VideoCapture("udp://0.0.0.0:5000", cv2.CAP_FFMPEG)
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("Frame missing")
-        continue
-    
-    cv2.imshow("Stream", frame)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
\ No newline at end of file
+parser = argparse.ArgumentParser(description="Receive the event frame stream of the camera")
+parser.add_argument("--port", type=int, default=None, help="5000 for video, 5001 for events")
+parser.add_argument("--gray", action="store_true", help="Recolour palette-indexed gray frames")
+parser.add_argument("--events", action="store_true",
+                    help="Receive event packets (remote_events) and render them here")
+parser.add_argument("--protocol", choices=["tcp", "udp"], default="tcp", help="Transport of the event packets")
+parser.add_argument("--latency", action="store_true",
+                    help="Show the latency and jitter of time stamped frames (time_stamps=True on the sender)")
+parser.add_argument("--connect", metavar="CAMERA_IP",
+                    help="Pull the video over TCP from a camera streaming with a listen_port, instead of UDP")
+parser.add_argument("--buffered", action="store_true", help="Keep the default FFmpeg demuxer buffering")
+parser.add_argument("--fps", type=int, default=25, help="Frame rate of the rendered events")
+args = parser.parse_args()
+port = args.port or (5001 if args.events else 5000)
+
+
+def receive_events():
+    receiver = EventStreamReceiver(port, protocol=args.protocol)
+    print(f"Waiting for events on {args.protocol} port {port}")
+    renderer = None
+    closed = False
+
+    def on_frame(ts, frame):
+        nonlocal closed
+        cv2.imshow("Stream", recolor(frame))
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            closed = True
+
+    try:
+        for evs in receiver:
+            if renderer is None or (renderer.width, renderer.height) != (receiver.width, receiver.height):
+                renderer = IndexedFrameRenderer(receiver.width, receiver.height, fps=args.fps)
+                renderer.set_output_callback(on_frame)
+            renderer.process_events(evs)
+            if closed:
+                break
+    finally:
+        if receiver.lost:
+            print(f"Lost {receiver.lost} packets")
+        receiver.close()
+
+
+if args.events:
+    receive_events()
+    raise SystemExit
+
+if args.connect:
+    url = f"tcp://{args.connect}:{port}"
+else:
+    # Overrun the socket buffer rather than fail on bursts
+    url = f"udp://0.0.0.0:{port}?overrun_nonfatal=1"
+receiver = LatestFrameReceiver(url, low_latency=not args.buffered).start()
+meter = LatencyMeter()
+last_report = time.time()
+
+try:
+    while True:
+        latest = receiver.latest(timeout=0.5)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+        if latest is None:
+            continue
+        frame, _ = latest
+
+        stamp = read_time_stamp(frame) if args.latency else None
+        if args.gray:
+            frame = recolor(frame[:, :, 1])
+
+        if stamp is not None:
+            meter.add(stamp, time.time())
+            stats = meter.stats()
+            cv2.putText(frame, f"{stats['latency_ms']:.0f} ms (p95 {stats['p95_ms']:.0f}), "
+                               f"jitter {stats['jitter_ms']:.1f} ms",
+                        (10, frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1)
+        cv2.imshow("Stream", frame)
+
+        if time.time() - last_report >= 5:
+            last_report = time.time()
+            stats = meter.stats()
+            report = f"{receiver.received} frames, {receiver.skipped} skipped"
+            if stats is not None:
+                report += (f", latency {stats['latency_ms']:.0f} ms (p95 {stats['p95_ms']:.0f}), "
+                           f"jitter {stats['jitter_ms']:.1f} ms")
+            print(report)
+finally:
+    receiver.close()
@@ -1,46 +1,61 @@
 import logging
 import time
-import threading
 from gpiozero import DigitalInputDevice
 from src.setup_logging import setup_logging
 from src.camera import Camera
 
 class Launcher:
-    def __init__(self, input_pin: int = 4, run_duration: int = 20):
+    def __init__(self, input_pin: int = 4, run_duration: int = 20,
+                 pre_trigger_us: int = 500000, pre_trigger_mb: int = 32):
         self.input_pin = input_pin
         self.run_duration = run_duration
+        self.pre_trigger_us = pre_trigger_us
+        self.pre_trigger_mb = pre_trigger_mb
         self.signal_detected = False
+        self.recording_done = None
         self.camera = Camera()
-        self.task_thread = None
 
     def start(self):
+        # Stream into the pre-trigger buffer before the first signal
+        self.camera.arm(pre_trigger_us=self.pre_trigger_us, pre_trigger_mb=self.pre_trigger_mb)
+
         self.input_device = DigitalInputDevice(self.input_pin, pull_up=False, bounce_time=0.05)
         self.input_device.when_activated = self.on_signal_detected
 
     def on_signal_detected(self):
         if not self.signal_detected:
-            self.signal_detected = True
-            self.task_thread = threading.Thread(target=self.my_task, daemon=True)
-            self.task_thread.start()
+            # Only flag the task once the recorder took the trigger, so
+            # stop_task waits on this recording and not on the previous one
+            self.recording_done = self.my_task()
+            self.signal_detected = self.recording_done is not None
 
     def my_task(self):
         logger.info("Task started.")
-        self.camera.set_end_event_false()
-        self.camera.headless_record()
+        # The recorder releases itself after run_duration of sensor time
+        return self.camera.trigger(duration_us=self.run_duration * 1000000)
 
     def stop_task(self):
-        logger.info("Stopping task...")
-        self.camera.set_end_event_true()
+        logger.info("Waiting for the recording to finish...")
 
-        if self.task_thread and self.task_thread.is_alive():
-            self.task_thread.join()
-            logger.info("Task thread has stopped safely.")
+        if not self.recording_done.wait(timeout=self.run_duration + 10):
+            logger.warning(f"Recording still {self.camera.recorder_state.name}, releasing it.")
+            self.camera.release()
+            self.recording_done.wait(timeout=10)
 
     def reset_task(self):
         logger.info("Resetting task...")
-        self.camera.set_end_event_false()
+
+        session = self.camera.last_recording
+        if session and session.trigger_latency_ms is not None:
+            logger.info(f"Trigger to first event: {session.trigger_latency_ms:.2f} ms")
+
+        self.recording_done = None
         self.signal_detected = False
 
+    def close(self):
+        self.input_device.close()
+        self.camera.disarm()
+
 if __name__ == "__main__":
     setup_logging()
     logger = logging.getLogger(__name__)
@@ -54,8 +69,6 @@ if __name__ == "__main__":
     try:
         while True:
             if launcher.signal_detected:
-
-                time.sleep(launcher.run_duration)
                 launcher.stop_task()
                 logger.info("Task finished.")
 
@@ -73,5 +86,5 @@ if __name__ == "__main__":
         logger.warning("Exiting program by user.")
 
     finally:
-        launcher.input_device.close()
+        launcher.close()
         logger.info("Program terminated.")
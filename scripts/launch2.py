@@ -10,6 +10,7 @@ class Launcher:
         self.run_duration = run_duration
         self.camera = Camera()
         self.task_thread = None
+        self.result = None
 
     def start(self):
         logger.info(f"Program started. Waiting {self.start_delay} seconds before recording...")
@@ -20,7 +21,7 @@ class Launcher:
     def my_task(self):
         logger.info("Recording started.")
         self.camera.set_end_event_false()
-        self.camera.headless_record()
+        self.result = self.camera.headless_record(duration_us=self.run_duration * 1000000)
 
     def stop_task(self):
         logger.info("Stopping recording...")
@@ -30,6 +31,15 @@ class Launcher:
             self.task_thread.join()
             logger.info("Recording stopped safely.")
 
+    def wait_task(self):
+        # The clip length is measured in sensor time by headless_record itself
+        if self.task_thread:
+            self.task_thread.join()
+
+        if self.result:
+            duration = (self.result.last_ts - self.result.first_ts) / 1e6 if self.result.event_count else 0
+            logger.info(f"Recorded {self.result.event_count} events over {duration:.3f} s")
+
 if __name__ == "__main__":
     setup_logging()
     logger = logging.getLogger(__name__)
@@ -38,8 +48,7 @@ if __name__ == "__main__":
     launcher.start()
 
     try:
-        time.sleep(launcher.run_duration)
-        launcher.stop_task()
+        launcher.wait_task()
         logger.info("Recording finished.")
 
     except KeyboardInterrupt:
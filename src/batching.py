@@ -0,0 +1,150 @@
+import time
+import logging
+import numpy as np
+
+try:
+    from .evt_codec import EVENT_DTYPE
+except ImportError:
+    from evt_codec import EVENT_DTYPE
+
+
+class BatchPolicy:
+    """
+    How events are batched between an iterator and a mode loop.
+
+    - "time": batches of `delta_t` us of sensor time
+    - "count": batches of `n_events` events
+    - "adaptive": the iterator yields `min_delta_t` batches which are merged
+      into batches of up to `max_delta_t`. The merged span doubles while the
+      loop body takes more than `high_load` of the sensor time it covers and
+      halves once it takes less than `low_load`, so batches grow under load
+      and come back down to `min_delta_t` when latency is affordable.
+      The SDK iterator cannot change its delta_t once started, so it still
+      decodes `min_delta_t` slices: merging saves sink and loop calls,
+      not source iterations, and costs one copy of the merged events.
+
+    Larger batches mean fewer loop iterations (and fewer
+    EventLoop.poll_and_dispatch calls) per second, at the cost of latency.
+    """
+
+    MODES = ("time", "count", "adaptive")
+
+    def __init__(self, mode="time", delta_t=10000, n_events=10000, min_delta_t=1000, max_delta_t=100000,
+                 low_load=0.25, high_load=0.75):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown batching mode: {mode}")
+        self.logger = logging.getLogger(__name__)
+        self.mode = mode
+        self.delta_t = delta_t
+        self.n_events = n_events
+        self.min_delta_t = min_delta_t
+        self.max_delta_t = max(max_delta_t, min_delta_t)
+        self.low_load = low_load
+        self.high_load = high_load
+
+    @classmethod
+    def time(cls, delta_t):
+        return cls("time", delta_t=delta_t)
+
+    @classmethod
+    def count(cls, n_events):
+        return cls("count", n_events=n_events)
+
+    @classmethod
+    def adaptive(cls, min_delta_t=1000, max_delta_t=100000):
+        return cls("adaptive", min_delta_t=min_delta_t, max_delta_t=max_delta_t)
+
+    @classmethod
+    def parse(cls, batching, default_delta_t=10000):
+        """
+        Policy from a BatchPolicy, a delta_t in us, or a string such as
+        "time:1000", "count:50000", "adaptive" or "adaptive:1000-50000".
+        None gives time batches of `default_delta_t`.
+        """
+        if batching is None:
+            return cls.time(default_delta_t)
+        if isinstance(batching, cls):
+            return batching
+        if isinstance(batching, int):
+            return cls.time(batching)
+
+        mode, _, value = str(batching).partition(":")
+        if mode == "time":
+            return cls.time(int(value) if value else default_delta_t)
+        if mode == "count":
+            return cls.count(int(value) if value else 10000)
+        if mode == "adaptive":
+            if not value:
+                return cls.adaptive()
+            low, _, high = value.partition("-")
+            return cls.adaptive(int(low), int(high or low))
+        raise ValueError(f"Invalid batching: {batching}")
+
+    def __str__(self):
+        if self.mode == "time":
+            return f"time:{self.delta_t}"
+        if self.mode == "count":
+            return f"count:{self.n_events}"
+        return f"adaptive:{self.min_delta_t}-{self.max_delta_t}"
+
+    def iterator_kwargs(self):
+        """Arguments of EventsIterator (or EventFileReader, iterator_from_device) for this policy"""
+        if self.mode == "count":
+            return {"mode": "n_events", "n_events": self.n_events}
+        if self.mode == "adaptive":
+            return {"mode": "delta_t", "delta_t": self.min_delta_t}
+        return {"mode": "delta_t", "delta_t": self.delta_t}
+
+    def batches(self, iterator):
+        """
+        Batches of `iterator`, an iterator created with `iterator_kwargs()`.
+
+        Merged adaptive batches are views on a buffer reused for the next
+        batch; the loop body must be done with a batch before asking for the
+        next one. A slice that needs no merging is passed on without a copy.
+        """
+        if self.mode != "adaptive":
+            yield from iterator
+            return
+
+        buffer = np.empty(1 << 16, dtype=EVENT_DTYPE)
+        target = self.min_delta_t
+        load = None
+        count = 0
+        merged = 0
+
+        for evs in iterator:
+            merged += 1
+            span = merged * self.min_delta_t
+            if span >= target and merged == 1:
+                batch = evs
+            else:
+                if count + len(evs) > len(buffer):
+                    grown = np.empty(max(2 * len(buffer), count + len(evs)), dtype=EVENT_DTYPE)
+                    grown[:count] = buffer[:count]
+                    buffer = grown
+                buffer[count:count + len(evs)] = evs
+                count += len(evs)
+                if span < target:
+                    continue
+                batch = buffer[:count]
+
+            start = time.perf_counter()
+            yield batch
+            busy = time.perf_counter() - start
+
+            # Smoothed fraction of the sensor time spent in the loop body
+            sample = busy / (span / 1e6)
+            load = sample if load is None else 0.7 * load + 0.3 * sample
+            if load > self.high_load and target < self.max_delta_t:
+                target = min(2 * target, self.max_delta_t)
+                self.logger.debug(f"Load {load:.2f}, batching {target} us")
+            elif load < self.low_load and target > self.min_delta_t:
+                target = max(target // 2, self.min_delta_t)
+                self.logger.debug(f"Load {load:.2f}, batching {target} us")
+
+            count = 0
+            merged = 0
+
+        if merged:
+            yield buffer[:count]
@@ -0,0 +1,377 @@
+import os
+import time
+import shutil
+import platform
+import resource
+import tempfile
+import logging
+import subprocess
+import numpy as np
+
+try:
+    from .evt_codec import read_raw_header
+    from .event_file import EventFileWriter, EventFileReader
+    from .event_query import load_events
+    from .simulator import SimulatedDevice
+    from .render import DARK_PALETTE
+    from .encoder_service import EncoderConfig
+except ImportError:
+    from evt_codec import read_raw_header
+    from event_file import EventFileWriter, EventFileReader
+    from event_query import load_events
+    from simulator import SimulatedDevice
+    from render import DARK_PALETTE
+    from encoder_service import EncoderConfig
+
+STAGES = ("decode", "frames", "raw_log", "ffmpeg")
+RESULTS_VERSION = 1
+
+
+def git_revision(repo_dir=None):
+    """Commit hash of the tree being benchmarked, suffixed with -dirty if modified"""
+    repo_dir = repo_dir or os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def synthetic_events(event_rate, duration_us, width=1280, height=720, seed=0, distribution="blob"):
+    """Reproducible synthetic events at `event_rate` events/s"""
+    device = SimulatedDevice(width=width, height=height, event_rate=event_rate, noise_rate=0,
+                             distribution=distribution, realtime=False, seed=seed)
+    return device.events_iterator(delta_t=duration_us).generate(0, duration_us)
+
+
+def retime(events, event_rate):
+    """Copy of `events` with timestamps scaled so they arrive at `event_rate` events/s"""
+    retimed = events.copy()
+    if len(events) > 1:
+        duration_us = max(int(events["t"][-1] - events["t"][0]), 1)
+        scale = len(events) / duration_us * 1e6 / event_rate
+        retimed["t"] = ((events["t"] - events["t"][0]) * scale).astype(np.int64)
+    return retimed
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return None
+        ms = np.array(self.samples) * 1e3
+        return {
+            "p50": float(np.percentile(ms, 50)),
+            "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)),
+            "max": float(ms.max()),
+        }
+
+
+class ResourceMeter:
+    """Wall time, CPU usage and peak RSS over a `with` block"""
+
+    def __enter__(self):
+        # Reset the kernel high water mark so the peak belongs to this block only
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+        self.start = time.perf_counter()
+        self.usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self.start
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_s = (usage.ru_utime - self.usage.ru_utime) + (usage.ru_stime - self.usage.ru_stime)
+        child_cpu_s = (children.ru_utime - self.children.ru_utime) + (children.ru_stime - self.children.ru_stime)
+        self.cpu_percent = 100 * cpu_s / self.wall_s if self.wall_s else 0.0
+        self.child_cpu_percent = 100 * child_cpu_s / self.wall_s if self.wall_s else 0.0
+        self.peak_rss_mb = self._peak_rss_mb(usage)
+        return False
+
+    @staticmethod
+    def _peak_rss_mb(usage):
+        try:
+            with open("/proc/self/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return usage.ru_maxrss / 1024
+
+
+class Benchmark:
+    """
+    Drive each stage of the capture, render, record and stream paths as
+    fast as possible over a sweep of batch sizes and event rates.
+
+    The source is a recording (`input_path`) or synthetic events. For every
+    event rate, the source events are retimed to that rate and written to a
+    temporary RAW file, so every stage sees the same events; a recording
+    without `event_rates` is benchmarked at its native rate. Stages:
+
+    - decode: reading the RAW file back in batches of `batch_size` events
+    - frames: PeriodicFrameGenerationAlgorithm at `fps`
+    - raw_log: EventFileWriter, as used by the headless and armed recorders
+    - ffmpeg: the encoder of remote_live (EncoderConfig.command, quality
+      "medium") fed `pixel_format` frames, encoding to a null sink
+
+    Runs are seeded and sized by event count, so results of the same
+    command are comparable between commits.
+    """
+
+    def __init__(self, input_path=None, batch_sizes=(1000, 10000, 100000), event_rates=None,
+                 stages=STAGES, duration_s=2.0, max_events=5000000, fps=25, width=1280, height=720,
+                 seed=0, decoder="auto", work_dir=None, pixel_format="bgr24"):
+        self.logger = logging.getLogger(__name__)
+        self.input_path = input_path
+        self.batch_sizes = list(batch_sizes)
+        if event_rates is None and input_path is None:
+            event_rates = (1e6, 1e7)
+        self.event_rates = list(event_rates) if event_rates else [None]
+        self.stages = list(stages)
+        self.duration_s = duration_s
+        self.max_events = max_events
+        self.fps = fps
+        self.pixel_format = pixel_format
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.decoder = self._pick_decoder(decoder)
+        self.work_dir = work_dir
+
+    def _pick_decoder(self, decoder):
+        if decoder != "auto":
+            return decoder
+        try:
+            import metavision_core.event_io  # noqa: F401
+            return "sdk"
+        except ImportError:
+            return "numpy"
+
+    def run(self):
+        work_dir = tempfile.mkdtemp(prefix="benchmark_", dir=self.work_dir)
+        results = {
+            "version": RESULTS_VERSION,
+            "meta": self.meta(),
+            "runs": [],
+        }
+
+        try:
+            source = self.load_source()
+            for event_rate in self.event_rates:
+                if event_rate is None:
+                    events, raw_path = source, self.input_path
+                else:
+                    events = retime(source, event_rate)
+                    raw_path = os.path.join(work_dir, f"source_{int(event_rate)}.raw")
+                    with EventFileWriter(raw_path, self.width, self.height) as writer:
+                        writer.write(events)
+
+                for batch_size in self.batch_sizes:
+                    for stage in self.stages:
+                        run = self.run_stage(stage, events, raw_path, batch_size, work_dir)
+                        run["event_rate"] = event_rate or self.native_rate(events)
+                        results["runs"].append(run)
+                        self.logger.info(self.describe(run))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return results
+
+    def meta(self):
+        return {
+            "git": git_revision(),
+            "seed": self.seed,
+            "source": os.path.abspath(self.input_path) if self.input_path else "synthetic",
+            "decoder": self.decoder,
+            "duration_s": self.duration_s,
+            "max_events": self.max_events,
+            "fps": self.fps,
+            "pixel_format": self.pixel_format,
+            "geometry": [self.width, self.height],
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    def load_source(self):
+        if self.input_path is None:
+            rate = max(self.event_rates)
+            duration_us = int(min(self.duration_s, self.max_events / rate) * 1e6)
+            return synthetic_events(rate, duration_us, self.width, self.height, self.seed)
+
+        header = read_raw_header(self.input_path)
+        self.width, self.height = header["width"] or self.width, header["height"] or self.height
+        events = load_events(self.input_path, 0, int(self.duration_s * 1e6))
+        return events[:self.max_events]
+
+    @staticmethod
+    def native_rate(events):
+        if len(events) < 2:
+            return 0.0
+        return len(events) / max(int(events["t"][-1] - events["t"][0]), 1) * 1e6
+
+    def run_stage(self, stage, events, raw_path, batch_size, work_dir):
+        run = {"stage": stage, "batch_size": batch_size}
+        bench = getattr(self, f"bench_{stage}")
+        latencies = LatencyRecorder()
+
+        try:
+            with ResourceMeter() as meter:
+                counts = bench(events, raw_path, batch_size, work_dir, latencies)
+        except (ImportError, FileNotFoundError) as e:
+            run["skipped"] = str(e)
+            return run
+
+        run.update(counts)
+        run["wall_s"] = meter.wall_s
+        run["events_per_s"] = counts["events"] / meter.wall_s if meter.wall_s else 0.0
+        if "frames" in counts:
+            run["frames_per_s"] = counts["frames"] / meter.wall_s if meter.wall_s else 0.0
+        run["cpu_percent"] = meter.cpu_percent
+        run["child_cpu_percent"] = meter.child_cpu_percent
+        run["peak_rss_mb"] = meter.peak_rss_mb
+        run["latency_ms"] = latencies.summary()
+        return run
+
+    @staticmethod
+    def batches(events, batch_size):
+        for begin in range(0, len(events), batch_size):
+            yield events[begin:begin + batch_size]
+
+    def bench_decode(self, events, raw_path, batch_size, work_dir, latencies):
+        if self.decoder == "sdk":
+            from metavision_core.event_io import EventsIterator
+            iterator = EventsIterator(input_path=raw_path, mode="n_events", n_events=batch_size)
+        else:
+            # Chunks of about batch_size EVT 2.0 words, decoded into columns
+            reader = EventFileReader(raw_path, use_index=False, chunk_bytes=batch_size * 4)
+            iterator = (t for _, _, _, t in reader.chunks())
+
+        count = 0
+        start = time.perf_counter()
+        for evs in iterator:
+            latencies.add(time.perf_counter() - start)
+            count += len(evs)
+            if count >= len(events):
+                break
+            start = time.perf_counter()
+        return {"events": count}
+
+    def bench_frames(self, events, raw_path, batch_size, work_dir, latencies):
+        from metavision_sdk_core import PeriodicFrameGenerationAlgorithm, ColorPalette
+
+        frames = [0]
+        event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=self.width, sensor_height=self.height,
+                                                           fps=self.fps, palette=ColorPalette.Dark)
+
+        def on_cd_frame_cb(ts, cd_frame):
+            frames[0] += 1
+
+        event_frame_gen.set_output_callback(on_cd_frame_cb)
+        for evs in self.batches(events, batch_size):
+            start = time.perf_counter()
+            event_frame_gen.process_events(evs)
+            latencies.add(time.perf_counter() - start)
+        return {"events": len(events), "frames": frames[0]}
+
+    def bench_raw_log(self, events, raw_path, batch_size, work_dir, latencies):
+        log_path = os.path.join(work_dir, "raw_log.raw")
+        with EventFileWriter(log_path, self.width, self.height) as writer:
+            for evs in self.batches(events, batch_size):
+                start = time.perf_counter()
+                writer.write(evs)
+                latencies.add(time.perf_counter() - start)
+            written = writer.bytes_written
+        os.remove(log_path)
+        return {"events": len(events), "bytes": written}
+
+    def bench_ffmpeg(self, events, raw_path, batch_size, work_dir, latencies):
+        if shutil.which("ffmpeg") is None:
+            raise FileNotFoundError("ffmpeg not found")
+
+        # The encoder of remote_live (quality="medium"), without the network
+        config = EncoderConfig(self.width & ~1, self.height & ~1, pixel_format=self.pixel_format, fps=self.fps)
+        ffmpeg_cmd = config.command(output=("-f", "null", "-"))
+        ffmpeg_cmd[1:1] = ["-loglevel", "error"]
+        proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
+
+        frames = 0
+        frame = np.empty(config.frame_shape, dtype=np.uint8)
+        # Gray frames hold palette indices, recoloured by the receiver
+        colors = np.arange(len(DARK_PALETTE), dtype=np.uint8) if self.pixel_format == "gray" else DARK_PALETTE
+        for evs in self.frame_slices(events):
+            evs = evs[(evs["x"] < config.width) & (evs["y"] < config.height)]
+            # Rendering is not part of this stage, only the pipe write
+            frame[:] = colors[0]
+            frame[evs["y"], evs["x"]] = colors[1 + evs["p"]]
+            start = time.perf_counter()
+            proc.stdin.write(memoryview(frame).cast("B"))
+            latencies.add(time.perf_counter() - start)
+            frames += 1
+
+        proc.stdin.close()
+        proc.wait()
+        return {"events": len(events), "frames": frames}
+
+    def frame_slices(self, events):
+        if len(events) == 0:
+            return
+        period_us = int(1e6 / self.fps)
+        edges = np.arange(int(events["t"][0]), int(events["t"][-1]) + period_us, period_us)
+        bounds = np.searchsorted(events["t"], edges)
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            yield events[begin:end]
+
+    @staticmethod
+    def describe(run):
+        if "skipped" in run:
+            return f"{run['stage']:8s} batch={run['batch_size']:<7d} skipped: {run['skipped']}"
+        latency = run["latency_ms"] or {}
+        return (f"{run['stage']:8s} batch={run['batch_size']:<7d} rate={run['event_rate'] / 1e6:.1f} Mev/s "
+                f"-> {run['events_per_s'] / 1e6:.2f} Mev/s, cpu {run['cpu_percent']:.0f}%, "
+                f"rss {run['peak_rss_mb']:.0f} MB, p99 {latency.get('p99', 0):.2f} ms")
+
+
+def run_key(run):
+    return run["stage"], run["batch_size"], round(run.get("event_rate") or 0)
+
+
+def compare(base, current):
+    """
+    Relative change of the throughput of each run of `current` against the
+    same (stage, batch size, event rate) run of `base`.
+    """
+    base_runs = {run_key(run): run for run in base["runs"] if "skipped" not in run}
+    changes = []
+    for run in current["runs"]:
+        previous = base_runs.get(run_key(run))
+        if previous is None or "skipped" in run or not previous["events_per_s"]:
+            continue
+        changes.append({
+            "stage": run["stage"],
+            "batch_size": run["batch_size"],
+            "event_rate": run["event_rate"],
+            "base_events_per_s": previous["events_per_s"],
+            "events_per_s": run["events_per_s"],
+            "change": run["events_per_s"] / previous["events_per_s"] - 1,
+        })
+    return changes
@@ -1,35 +1,73 @@
-from metavision_core.event_io import EventsIterator, LiveReplayEventsIterator, is_live_camera
-from metavision_sdk_core import PeriodicFrameGenerationAlgorithm, ColorPalette
-from metavision_sdk_ui import EventLoop, BaseWindow, MTWindow, UIKeyEvent
-from metavision_core.event_io.raw_reader import initiate_device
 import threading
+import itertools
+import sys
 import os
 import time
 import logging
 import json
 import curses
-import subprocess
+from dataclasses import dataclass, field
+from enum import Enum, auto
 from pathlib import Path
-
-class Camera:
-    def __init__(self):
+import numpy as np
+
+try:
+    from .event_file import EventFileWriter, open_event_writer, lock_for_writing
+    from .ring_buffer import EventRingBuffer
+    from .simulator import iterator_from_device
+    from .recording_summary import SummaryWorker
+    from .raw_index import index_path
+    from .modes import PipelineModes, recording_path
+except ImportError:
+    from event_file import EventFileWriter, open_event_writer, lock_for_writing
+    from ring_buffer import EventRingBuffer
+    from simulator import iterator_from_device
+    from recording_summary import SummaryWorker
+    from raw_index import index_path
+    from modes import PipelineModes, recording_path
+
+class RecorderState(Enum):
+    IDLE = auto()
+    ARMED = auto()
+    RECORDING = auto()
+    FINALIZING = auto()
+
+@dataclass
+class RecordingResult:
+    path: str
+    trigger_ts: int = None
+    pre_trigger_events: int = 0
+    trigger_latency_ms: float = None
+    event_count: int = 0
+    first_ts: int = None
+    last_ts: int = None
+    segments: list = field(default_factory=list)
+    stats: dict = None
+
+class Camera(PipelineModes):
+    def __init__(self, device=None, simulate=None, batching=None):
         self.logger = logging.getLogger(__name__)
-
-        try:
-            # HAL Device on live camera
-            self.device = initiate_device("")
-        except Exception as e:
-            self.logger.error(f"Failed to initiate device: {e}")
-            self.logger.info("Continue without camera")
-            self.device = None
-
-        self.end_event = True
+        super().__init__(device, simulate, batching)
+
+        self.stop_event = threading.Event()
+
+        # Armed (pre-trigger) recording
+        self.recorder_state = RecorderState.IDLE
+        self.trigger_event = threading.Event()
+        self.disarm_event = threading.Event()
+        self.armed_ready = threading.Event()
+        self.trigger_time = None
+        self.trigger_localtime = None
+        self.trigger_duration_us = None
+        self.session_done = None
+        self.armed_thread = None
+        self.last_recording = None
 
     def set_end_event_true(self):
-        self.end_event = True
+        self.stop_event.set()
 
     def set_end_event_false(self):
-        self.end_event = False
+        self.stop_event.clear()
 
     def adjust(self):
         if not self.device:
@@ -109,315 +147,285 @@ class Camera:
 
             stdscr.refresh()
 
-    def record(self):
+    def headless_record(self, output_dir="assets/", duration_us=None, max_events=None, stop_event=None,
+                        segment_s=None, segment_mb=None, batching=None, stop_check_us=100000):
+        """
+        Record without display until `duration_us` of sensor time, `max_events`
+        or `stop_event`, whichever comes first.
+
+        Without a duration, event limit or segmentation, the device logs its
+        own stream (native format, every event type) and the events are only
+        counted here. Otherwise they are written by an EventFileWriter, cut
+        on the exact sensor timestamp boundary, and split into segments with
+        `segment_s` and/or `segment_mb`, each segment with its own summary.
+
+        `stop_event` is only looked at on empty batches and once every
+        `stop_check_us` of sensor time; on empty batches the duration is
+        checked against the iterator clock, so a static scene does not keep
+        the recording going. Summary sidecars are built by a SummaryWorker,
+        off this loop.
+        """
         if not self.device:
             self.logger.warning("No device available for recording.")
-            return
-
-        # Events iterator on Device
-        mv_iterator = EventsIterator.from_device(device=self.device)
-        height, width = mv_iterator.get_size()  # Camera Geometry
-
-        # Start the recording
-        output_dir = Path(__file__).parent.parent / "assets"
-        log_path = str(output_dir) + "recording_" + time.strftime("%y%m%d_%H%M%S", time.localtime()) + ".raw"
-        if self.device.get_i_events_stream():
-            self.logger.info(f'Recording to {log_path}')
-            self.device.get_i_events_stream().log_raw_data(log_path)
-
-        self.logger.info("Open window")
-        with MTWindow(title="Metavision Events Viewer",
-                        width=width,
-                        height=height,
-                        mode=BaseWindow.RenderMode.BGR) as window:
-            def keyboard_cb(key, scancode, action, mods):
-                if key == UIKeyEvent.KEY_ESCAPE or key == UIKeyEvent.KEY_Q:
-                    window.set_close_flag()
-
-            window.set_keyboard_callback(keyboard_cb)
-
-            # Event Frame Generator
-            event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=width,
-                                                            sensor_height=height,
-                                                            fps=25,
-                                                            palette=ColorPalette.Dark)
-
-            def on_cd_frame_cb(ts, cd_frame):
-                window.show_async(cd_frame)
-
-            event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-            # Process events
-            for evs in mv_iterator:
-                # Dispatch system events to the window
-                EventLoop.poll_and_dispatch()
-                event_frame_gen.process_events(evs)
-
-                if window.should_close():
-                    # Stop the recording
-                    self.device.get_i_events_stream().stop_log_raw_data()
-                    self.logger.info(f"Stopped recording. Saved to {log_path}")
-                    break
+            return None
 
-
-    def headless_record(self, output_dir="assets/"):
-        if not self.device:
-            self.logger.warning("No device available for recording.")
-            return
+        if stop_event is None:
+            stop_event = self.stop_event
 
         # Events iterator on Device
-        mv_iterator = EventsIterator.from_device(device=self.device)
+        policy = self.batch_policy(batching)
+        mv_iterator = iterator_from_device(self.device, **policy.iterator_kwargs())
         height, width = mv_iterator.get_size()  # Camera Geometry
 
         # Start the recording
-        if self.device.get_i_events_stream():
-            log_path = "recording_" + time.strftime("%y%m%d_%H%M%S", time.localtime()) + ".raw"
-            if output_dir != "":
-                log_path = os.path.join(output_dir, log_path)
-            self.logger.info(f'Recording to {log_path}')
+        log_path = recording_path(output_dir)
+        self.logger.info(f'Recording to {log_path}')
+        exact = duration_us is not None or max_events is not None or segment_s is not None or segment_mb is not None
+        writer = None
+        lock = None
+        summaries = SummaryWorker(width, height)
+        if exact:
+            writer = open_event_writer(log_path, width, height, segment_s=segment_s, segment_mb=segment_mb,
+                                       summaries=summaries)
+        else:
             self.device.get_i_events_stream().log_raw_data(log_path)
+            lock = lock_for_writing(log_path)
 
+        event_count = 0
+        first_ts = None
+        last_ts = None
+        deadline = None     # Exclusive sensor time boundary of the clip
+        next_check = None   # Sensor time of the next look at stop_event
         try:
-            for evs in mv_iterator:
-                if self.end_event is True:
+            for evs in policy.batches(mv_iterator):
+                if deadline is None:
+                    start_ts = int(evs["t"][0]) if len(evs) else mv_iterator.get_current_time()
+                    deadline = start_ts + duration_us if duration_us is not None else sys.maxsize
+                    next_check = start_ts + stop_check_us
+
+                if len(evs) == 0:
+                    if stop_event.is_set() or mv_iterator.get_current_time() >= deadline:
+                        break
+                    continue
+
+                batch_ts = int(evs["t"][-1])
+                if batch_ts >= next_check:
+                    next_check = batch_ts + stop_check_us
+                    if stop_event.is_set():
+                        deadline = min(deadline, batch_ts + 1)
+
+                if batch_ts >= deadline:
+                    evs = evs[:np.searchsorted(evs["t"], deadline)]
+                if max_events is not None and event_count + len(evs) >= max_events:
+                    evs = evs[:max_events - event_count]
+
+                if writer is not None:
+                    writer.write(evs)
+                else:
+                    summaries.update(log_path, evs)
+                if len(evs):
+                    if first_ts is None:
+                        first_ts = int(evs["t"][0])
+                    last_ts = int(evs["t"][-1])
+                    event_count += len(evs)
+
+                if batch_ts + 1 >= deadline or event_count == max_events:
                     break
         except KeyboardInterrupt:
             self.logger.info("Interrupted by user.")
         except Exception as e:
             self.logger.error(f"Error during recording: {e}")
         finally:
-            self.device.get_i_events_stream().stop_log_raw_data()
-            self.logger.info(f"Stopped recording. Saved to {log_path}")
-
-    def play(self, input_file: str = ""):
-        if input_file == "":
-            self.logger.error("No input file provided for playback.")
+            if writer is not None:
+                writer.close()
+            else:
+                self.device.get_i_events_stream().stop_log_raw_data()
+                lock.close()
+            summaries.close()
+            if getattr(writer, "segments", None):
+                self.logger.info(f"Stopped recording. Saved {event_count} events "
+                                 f"to {len(writer.segments)} segments of {log_path}")
+            else:
+                self.logger.info(f"Stopped recording. Saved {event_count} events to {log_path}")
+
+        return RecordingResult(path=log_path,
+                               event_count=event_count,
+                               first_ts=first_ts,
+                               last_ts=last_ts,
+                               segments=getattr(writer, "segments", []),
+                               stats=summaries.stats.get(log_path))
+
+    def arm(self, output_dir="assets/", pre_trigger_us=500000, pre_trigger_mb=32, batching=None):
+        """Open the device stream and keep it warm in the background until disarmed"""
+        if not self.device:
+            self.logger.warning("No device available for recording.")
             return
 
-        if not os.path.exists(input_file):
-            self.logger.error(f"Input file does not exist: {input_file}")
+        if self.recorder_state != RecorderState.IDLE:
+            self.logger.warning(f"Recorder is not idle ({self.recorder_state.name}).")
             return
 
-        self.logger.info("Setup events iterator")
-        self.mv_iterator = EventsIterator(input_path=input_file, delta_t=1000)
-        height, width = self.mv_iterator.get_size() # Camera Geometry
-
-        if not is_live_camera(input_file):
-            self.mv_iterator = LiveReplayEventsIterator(self.mv_iterator)
-
-        self.logger.info("Open window")
-        with MTWindow(
-            title="Metavision Events Viewer",
-            width=width,
-            height=height,
-            mode=BaseWindow.RenderMode.BGR
-        ) as window:
-
-            def keyboard_cb(key, scancode, action, mods):
-                if key == UIKeyEvent.KEY_ESCAPE or key == UIKeyEvent.KEY_Q:
-                    window.set_close_flag()
-
-            window.set_keyboard_callback(keyboard_cb)
-
-            # Event Frame Generator
-            event_frame_gen = PeriodicFrameGenerationAlgorithm(
-                sensor_width=width,
-                sensor_height=height,
-                fps=25,
-                palette=ColorPalette.Dark
-            )
-
-            def on_cd_frame_cb(ts, cd_frame):
-                window.show_async(cd_frame)
-
-            event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-            # Process events
-            for evs in self.mv_iterator:
-                # Dispatch system events to the window
-                EventLoop.poll_and_dispatch()
-                event_frame_gen.process_events(evs)
-
-                if window.should_close():
-                    break
-
-    def live(self):
+        self.trigger_event.clear()
+        self.disarm_event.clear()
+        self.armed_thread = threading.Thread(target=self.armed_record,
+                                             args=(output_dir, pre_trigger_us, pre_trigger_mb, batching),
+                                             daemon=True)
+        self.armed_thread.start()
+
+    def trigger(self, duration_us=None):
+        """
+        Start a recording, prefixed with the buffered history.
+
+        With `duration_us`, the recording is released on its own once that much
+        sensor time has passed since the trigger.
+
+        Returns an event set once this recording is saved and the recorder is
+        armed again (or disarmed), None if the trigger is ignored.
+        """
+        if self.recorder_state != RecorderState.ARMED:
+            self.logger.warning(f"Trigger ignored, recorder is {self.recorder_state.name}.")
+            return None
+
+        self.trigger_time = time.perf_counter()
+        self.trigger_localtime = time.localtime()
+        self.trigger_duration_us = duration_us
+        self.session_done = threading.Event()
+        self.armed_ready.clear()
+        self.trigger_event.set()
+        return self.session_done
+
+    def release(self):
+        """Close the current recording and go back to buffering"""
+        self.trigger_event.clear()
+
+    def disarm(self):
+        self.trigger_event.clear()
+        self.disarm_event.set()
+
+        if self.armed_thread and self.armed_thread.is_alive():
+            self.armed_thread.join()
+        self.armed_thread = None
+
+    def armed_record(self, output_dir="assets/", pre_trigger_us=500000, pre_trigger_mb=32, batching=None):
+        """
+        Recorder state machine: IDLE -> ARMED -> RECORDING -> FINALIZING -> ARMED ...
+
+        The iterator stays open for the whole armed session and the next output
+        file is opened ahead of time, so a trigger only switches where the
+        events go.
+        """
         if not self.device:
-            self.logger.warning("No device available for living.")
+            self.logger.warning("No device available for recording.")
             return
 
-        # Events iterator on Device
-        mv_iterator = EventsIterator.from_device(device=self.device)
+        # Events iterator on Device, short batches keep the trigger latency low
+        policy = self.batch_policy(batching, delta_t=1000)
+        mv_iterator = iterator_from_device(self.device, **policy.iterator_kwargs())
         height, width = mv_iterator.get_size()  # Camera Geometry
 
-        self.logger.info("Open window")
-        with MTWindow(title="Metavision Events Viewer",
-                        width=width,
-                        height=height,
-                        mode=BaseWindow.RenderMode.BGR) as window:
-            def keyboard_cb(key, scancode, action, mods):
-                if key == UIKeyEvent.KEY_ESCAPE or key == UIKeyEvent.KEY_Q:
-                    window.set_close_flag()
-
-            window.set_keyboard_callback(keyboard_cb)
-
-            # Event Frame Generator
-            event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=width,
-                                                            sensor_height=height,
-                                                            fps=25,
-                                                            palette=ColorPalette.Dark)
-
-            def on_cd_frame_cb(ts, cd_frame):
-                window.show_async(cd_frame)
-
-            event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-            # Process events
-            for evs in mv_iterator:
-                # Dispatch system events to the window
-                EventLoop.poll_and_dispatch()
-                event_frame_gen.process_events(evs)
-
-                if window.should_close():
-                    # Stop the recording
-                    self.logger.info(f"Stopped living")
-                    break
+        # Fixed size history, allocated once for the whole armed session
+        ring = EventRingBuffer(max_bytes=pre_trigger_mb * 1024 * 1024, max_duration_us=pre_trigger_us)
+        self.logger.info(f"Armed with {pre_trigger_us / 1e6:.2f} s / {ring.nbytes / 1e6:.1f} MB pre-trigger buffer")
 
-    def remote_live(self, quality="medium", fps=25):
-        if not self.device:
-            self.logger.warning("No device available for streaming.")
-            return
+        # One name per recording, so the summary worker never mixes two of them
+        pending_count = itertools.count()
 
-        mv_iterator = EventsIterator.from_device(device=self.device)
-        height, width = mv_iterator.get_size()
+        def open_pending_writer():
+            pending_path = os.path.join(output_dir, f".pending_{os.getpid()}_{next(pending_count)}.raw")
+            return EventFileWriter(pending_path, width, height)
 
-        receiver_ip = input("Enter the receiver's IP address to stream to: ")
-        # receiver_port = int(input("Enter the port to stream to: "))
-        receiver_port = 5000
-        self.logger.info(f"Streaming live frame to {receiver_ip}:{receiver_port} (quality={quality}, fps={fps})")
+        writer = open_pending_writer()
+        # Summaries are built off the recording thread, and saved once renamed
+        summaries = SummaryWorker(width, height, save_interval_s=None)
+        self.set_recorder_state(RecorderState.ARMED)
+        session = None
 
-        # Compression settings
-        if quality == "low":
-            preset, crf = "slow", 35
-        elif quality == "high":
-            preset, crf = "veryfast", 20
-        else:
-            preset, crf = "fast", 28
-
-        # ffmpeg command
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-f", "rawvideo",
-            "-pixel_format", "bgr24",
-            "-video_size", f"{width}x{height}",
-            "-r", "25",
-            "-i", "-",
-            "-c:v", "libx264",
-            "-preset", f"{preset}",
-            "-crf", f"{crf}",
-            "-tune", "zerolatency",
-            "-g", "25",
-            "-f", "mpegts",
-            f"udp://{receiver_ip}:{receiver_port}"
-        ]
-
-        proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
-
-        # Event Frame Generator
-        event_frame_gen = PeriodicFrameGenerationAlgorithm(
-            sensor_width=width,
-            sensor_height=height,
-            fps=fps,
-            palette=ColorPalette.Dark,
-        )
-
-        def on_cd_frame_cb(ts, cd_frame):
-            try:
-                proc.stdin.write(cd_frame.tobytes())
-            except (BrokenPipeError, IOError):
-                self.logger.error("SSH stream closed.")
-                proc.terminate()
-
-        event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-        for evs in mv_iterator:
-            EventLoop.poll_and_dispatch()
-            event_frame_gen.process_events(evs)
-            if proc.poll() is not None:
-                break
-
-        proc.stdin.close()
-        proc.wait()
-        self.logger.info("Stopped streaming.")
-
-    def remote_play(self, input_file="", quality="medium", fps=25):
-        if input_file == "":
-            self.logger.error("No input file provided for playback.")
-            return
-
-        if not os.path.exists(input_file):
-            self.logger.error(f"Input file does not exist: {input_file}")
-            return
+        try:
+            for evs in policy.batches(mv_iterator):
+                if self.disarm_event.is_set():
+                    break
 
-        receiver_ip = input("Enter the receiver's IP address to stream to: ")
-        # receiver_port = int(input("Enter the port to stream to: "))
-        receiver_port = 5000
-        self.logger.info(f"Streaming {input_file} to {receiver_ip}:{receiver_port} (quality={quality}, fps={fps})")
+                if self.recorder_state == RecorderState.ARMED:
+                    if not self.trigger_event.is_set():
+                        ring.push(evs)
+                        continue
+
+                    self.set_recorder_state(RecorderState.RECORDING)
+                    trigger_ts = int(evs["t"][0]) if len(evs) else mv_iterator.get_current_time()
+                    session = RecordingResult(path=writer.path,
+                                              trigger_ts=trigger_ts,
+                                              pre_trigger_events=len(ring))
+                    end_ts = None
+                    if self.trigger_duration_us is not None:
+                        end_ts = trigger_ts + self.trigger_duration_us
+                    for x, y, p, t in ring.segments():
+                        summaries.update_columns(writer.path, x, y, p, t)
+                    ring.flush_to(writer)
+
+                if self.recorder_state == RecorderState.RECORDING:
+                    if len(evs) and session.trigger_latency_ms is None:
+                        session.trigger_latency_ms = (time.perf_counter() - self.trigger_time) * 1e3
+
+                    # Cut on the sensor time boundary, the rest goes back to the history
+                    split = len(evs)
+                    if end_ts is not None and len(evs) and evs["t"][-1] >= end_ts:
+                        split = int(np.searchsorted(evs["t"], end_ts))
+                        self.trigger_event.clear()
+                    writer.write(evs[:split])
+                    summaries.update(writer.path, evs[:split])
+
+                    if not self.trigger_event.is_set():
+                        self.finalize_recording(writer, session, output_dir, summaries)
+                        self.last_recording = session
+                        writer = open_pending_writer()
+                        self.set_recorder_state(RecorderState.ARMED)
+                        self.session_done.set()
+                        ring.push(evs[split:])
 
-        if quality == "low":
-            preset, crf = "slow", 35
-        elif quality == "high":
-            preset, crf = "veryfast", 20
+        except Exception as e:
+            self.logger.error(f"Error during armed recording: {e}")
+        finally:
+            if self.recorder_state == RecorderState.RECORDING:
+                self.finalize_recording(writer, session, output_dir, summaries)
+                self.last_recording = session
+            elif self.recorder_state == RecorderState.ARMED:
+                writer.close()
+                os.remove(writer.path)
+                if os.path.exists(index_path(writer.path)):
+                    os.remove(index_path(writer.path))
+            summaries.close()
+
+            self.set_recorder_state(RecorderState.IDLE)
+            if self.session_done is not None:
+                self.session_done.set()
+            self.logger.info("Disarmed")
+
+    def set_recorder_state(self, state):
+        self.recorder_state = state
+        if state == RecorderState.ARMED:
+            self.armed_ready.set()
         else:
-            preset, crf = "fast", 28
-
-        self.mv_iterator = EventsIterator(input_path=input_file, delta_t=1000)
-        height, width = self.mv_iterator.get_size()
-
-        if not is_live_camera(input_file):
-            self.mv_iterator = LiveReplayEventsIterator(self.mv_iterator)
-
-        # ffmpeg command
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-f", "rawvideo",
-            "-pixel_format", "bgr24",
-            "-video_size", f"{width}x{height}",
-            "-r", "25",
-            "-i", "-",
-            "-c:v", "libx264",
-            "-preset", f"{preset}",
-            "-crf", f"{crf}",
-            "-tune", "zerolatency",
-            "-g", "25",
-            "-f", "mpegts",
-            f"udp://{receiver_ip}:{receiver_port}"
-        ]
-
-        proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
-
-        event_frame_gen = PeriodicFrameGenerationAlgorithm(
-            sensor_width=width,
-            sensor_height=height,
-            fps=fps,
-            palette=ColorPalette.Dark
-        )
-
-        def on_cd_frame_cb(ts, cd_frame):
-            try:
-                proc.stdin.write(cd_frame.tobytes())
-            except (BrokenPipeError, IOError):
-                self.logger.error("UDP stream closed.")
-                proc.terminate()
-
-        event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-        for evs in self.mv_iterator:
-            EventLoop.poll_and_dispatch()
-            event_frame_gen.process_events(evs)
-            if proc.poll() is not None:
-                break
-
-        proc.stdin.close()
-        proc.wait()
-        self.logger.info("Stopped streaming.")
+            self.armed_ready.clear()
+
+    def finalize_recording(self, writer, session, output_dir, summaries=None):
+        self.set_recorder_state(RecorderState.FINALIZING)
+        writer.close()
+
+        # Name the file after the trigger time rather than the time it was opened
+        log_path = recording_path(output_dir, self.trigger_localtime)
+        os.replace(writer.path, log_path)
+        # The seek index stays valid, the rename keeps the size and mtime it checks
+        if os.path.exists(index_path(writer.path)):
+            os.replace(index_path(writer.path), index_path(log_path))
+
+        session.path = log_path
+        session.event_count = writer.event_count
+        session.first_ts = writer.first_ts
+        session.last_ts = writer.last_ts
+        if summaries is not None:
+            # session.stats is set once the worker has caught up and saved the sidecar
+            summaries.finish(writer.path, log_path, on_saved=lambda stats: setattr(session, "stats", stats))
+
+        latency = "n/a" if session.trigger_latency_ms is None else f"{session.trigger_latency_ms:.2f} ms"
+        self.logger.info(f"Stopped recording. Saved {writer.event_count} events to {log_path} "
+                         f"(trigger to first event: {latency})")
@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+import threading
+import subprocess
+from dataclasses import dataclass
+
+try:
+    from .frame_writer import FrameWriter
+except ImportError:
+    from frame_writer import FrameWriter
+
+TS_PACKET_SIZE = 188
+# 7 MPEG-TS packets, the usual payload of a UDP datagram
+CHUNK_SIZE = 7 * TS_PACKET_SIZE
+PAT_PID = 0
+
+
+def ts_pid(packet):
+    return (packet[1] & 0x1F) << 8 | packet[2]
+
+
+def ts_random_access(packet):
+    """Whether a TS packet has the random access indicator, set by ffmpeg on keyframes"""
+    return packet[3] & 0x20 and packet[4] > 0 and packet[5] & 0x40
+
+
+@dataclass(frozen=True)
+class EncoderConfig:
+    width: int
+    height: int
+    pixel_format: str = "bgr24"
+    fps: int = 25
+    preset: str = "fast"
+    crf: int = 28
+    frame_queue: int = 2
+    nice: int = 0
+
+    @property
+    def keyint(self):
+        """Frames between keyframes, forced on multiples of it"""
+        return self.fps
+
+    @property
+    def frame_shape(self):
+        if self.pixel_format == "gray":
+            return (self.height, self.width)
+        return (self.height, self.width, 3)
+
+    def command(self, output=("-f", "mpegts", "pipe:1")):
+        return [
+            "ffmpeg",
+            "-f", "rawvideo",
+            "-pixel_format", self.pixel_format,
+            "-video_size", f"{self.width}x{self.height}",
+            "-r", f"{self.fps}",
+            "-i", "-",
+            "-c:v", "libx264",
+            "-preset", f"{self.preset}",
+            "-crf", f"{self.crf}",
+            "-tune", "zerolatency",
+            "-g", f"{self.keyint}",
+            "-force_key_frames", f"expr:gte(n,n_forced*{self.keyint})",
+            "-pix_fmt", "yuv420p",
+            "-flush_packets", "1",
+            *output,
+        ]
+
+
+class Encoder:
+    """
+    One ffmpeg (libx264, MPEG-TS) process.
+
+    Frames go in through `frame_writer`, and the encoded stream is read on a
+    thread and handed, in whole TS packets, to the attached output (e.g. a
+    StreamRelay), or discarded when none is attached.
+
+    Keyframes are forced every `config.keyint` frames of the pipe. A session
+    resuming the running encoder (`begin_session`) pads the pipe with blank
+    frames so that its first frame is a keyframe, and its output starts at
+    the tables (PAT, PMT) before that keyframe, so a new viewer can decode
+    from the first packet. The time to that first random access packet is
+    logged.
+    """
+
+    def __init__(self, config):
+        self.logger = logging.getLogger(__name__)
+        self.config = config
+        self.output = None
+        self.started_at = time.perf_counter()
+        self.session_started_at = self.started_at
+        self.first_frame_ms = None
+        self.session_first_frame_ms = None
+        self.cold = True
+        self.waiting_keyframe = True
+
+        nice = config.nice
+        self.proc = subprocess.Popen(config.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     preexec_fn=(lambda: os.nice(nice)) if nice else None)
+        self.frame_writer = FrameWriter(self.proc.stdin, config.frame_shape, queue_size=config.frame_queue,
+                                        late_after_s=2 / config.fps, name="encoder-writer")
+        self.pump = threading.Thread(target=self.read_output, name="encoder-output", daemon=True)
+        self.pump.start()
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None and not self.frame_writer.failed
+
+    def attach(self, output):
+        """Send the encoded stream to `output.publish`"""
+        self.output = output
+
+    def detach(self):
+        self.output = None
+
+    def begin_session(self):
+        """Start the output of a new session at the next frame, made a keyframe, and time it from now"""
+        self.session_started_at = time.perf_counter()
+        self.session_first_frame_ms = None
+        self.waiting_keyframe = True
+        self.frame_writer.align(self.config.keyint)
+
+    def read_output(self):
+        pending = b""
+        tables = None   # Offset in pending of the last PAT while waiting for a keyframe
+        while True:
+            # Whatever the encoder has written so far, published in whole TS packets
+            data = self.proc.stdout.read1(CHUNK_SIZE)
+            if not data:
+                break
+            scanned = len(pending) - len(pending) % TS_PACKET_SIZE
+            pending += data
+            if self.waiting_keyframe:
+                pending, tables = self.skip_to_keyframe(pending, scanned, tables)
+                if self.waiting_keyframe:
+                    continue
+            end = len(pending) - len(pending) % TS_PACKET_SIZE
+            if end:
+                output = self.output
+                if output is not None:
+                    output.publish(pending[:end])
+                pending = pending[end:]
+
+    def skip_to_keyframe(self, pending, start, tables):
+        """
+        Drop the output of the session before its first keyframe, except the
+        last tables before it; returns what is left and the offset of the tables
+        """
+        end = len(pending) - len(pending) % TS_PACKET_SIZE
+        for offset in range(start, end, TS_PACKET_SIZE):
+            packet = pending[offset:offset + TS_PACKET_SIZE]
+            if ts_pid(packet) == PAT_PID:
+                tables = offset
+            elif ts_random_access(packet):
+                self.waiting_keyframe = False
+                self.first_frame_out()
+                return pending[offset if tables is None else tables:], None
+        if tables is None:
+            return pending[end:], None
+        return pending[tables:], 0
+
+    def first_frame_out(self):
+        now = time.perf_counter()
+        self.session_first_frame_ms = (now - self.session_started_at) * 1000
+        if self.first_frame_ms is None:
+            self.first_frame_ms = (now - self.started_at) * 1000
+        self.logger.info(f"First keyframe out {self.session_first_frame_ms:.0f} ms after "
+                         f"{'starting ffmpeg' if self.cold else 'resuming the warm encoder'}")
+
+    def cpu_time(self):
+        """CPU seconds used by ffmpeg so far, None where /proc is not available"""
+        try:
+            with open(f"/proc/{self.proc.pid}/stat") as f:
+                fields = f.read().rpartition(")")[2].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def close(self, drain=True):
+        self.frame_writer.close(drain=drain and self.proc.poll() is None)
+        if self.frame_writer.failed:
+            self.logger.error(f"Encoder closed: {self.frame_writer.error}")
+        try:
+            self.proc.stdin.close()
+        except (BrokenPipeError, IOError):
+            pass
+        self.proc.wait()
+        self.pump.join()
+        self.proc.stdout.close()
+        self.output = None
+
+
+class EncoderService:
+    """
+    Keep an encoder warm between streaming sessions.
+
+    `acquire` hands out the running encoder when it has the requested
+    settings and is healthy, so a new session skips the ffmpeg and codec
+    startup; otherwise the old encoder is closed and a new one started.
+    `release` detaches the session output and keeps the encoder idle for
+    `keep_warm_s` (0 closes it at once). A failed encoder is replaced on
+    the next `acquire`.
+    """
+
+    def __init__(self, keep_warm_s=600.0):
+        self.logger = logging.getLogger(__name__)
+        self.keep_warm_s = keep_warm_s
+        self.lock = threading.Lock()
+        self.encoder = None
+        self.idle_timer = None
+
+    def acquire(self, config):
+        with self.lock:
+            self.cancel_idle_timer()
+            encoder = self.encoder
+            if encoder is not None and encoder.config == config and encoder.alive:
+                encoder.cold = False
+                encoder.begin_session()
+                self.logger.info("Reusing the warm encoder")
+                return encoder
+
+            if encoder is not None:
+                if not encoder.alive:
+                    self.logger.warning(f"Encoder failed (exit code {encoder.proc.poll()}), starting a new one")
+                encoder.close(drain=False)
+            self.encoder = Encoder(config)
+            return self.encoder
+
+    def release(self, encoder, drain=True):
+        with self.lock:
+            encoder.detach()
+            if encoder is not self.encoder:
+                encoder.close(drain=False)
+                return
+            if self.keep_warm_s and encoder.alive:
+                self.cancel_idle_timer()
+                self.idle_timer = threading.Timer(self.keep_warm_s, self.expire, args=(encoder,))
+                self.idle_timer.daemon = True
+                self.idle_timer.start()
+                return
+            self.encoder = None
+        encoder.close(drain=drain)
+
+    def expire(self, encoder):
+        with self.lock:
+            if encoder is not self.encoder or encoder.output is not None:
+                return
+            self.encoder = None
+        self.logger.info(f"Encoder idle for {self.keep_warm_s:.0f} s, stopping it")
+        encoder.close(drain=False)
+
+    def cancel_idle_timer(self):
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def shutdown(self):
+        with self.lock:
+            self.cancel_idle_timer()
+            encoder, self.encoder = self.encoder, None
+        if encoder is not None:
+            encoder.close(drain=False)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import numpy as np
+from pathlib import Path
+
+try:
+    from .event_file import EventFileReader
+except ImportError:
+    from event_file import EventFileReader
+
+CACHE_VERSION = 1
+COLUMNS = {"x": np.uint16, "y": np.uint16, "p": np.int16, "t": np.int64}
+
+
+class CachedEvents:
+    """
+    Columnar, memory-mapped view of a decoded recording.
+
+    `x`, `y`, `p` and `t` are read-only np.memmap columns, so slicing them
+    is zero-copy and the recording may be larger than RAM. `time_index[i]`
+    is the position of the first event at or after `i * step_us`.
+    """
+
+    def __init__(self, entry_dir, meta):
+        self.entry_dir = entry_dir
+        self.meta = meta
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.step_us = meta["step_us"]
+        self.event_count = meta["event_count"]
+
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, self._map(name, dtype))
+        self.time_index = np.load(os.path.join(entry_dir, "time_index.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return self.event_count
+
+    @property
+    def duration_us(self):
+        return int(self.t[-1]) if self.event_count else 0
+
+    def _map(self, name, dtype):
+        if self.event_count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.entry_dir, f"{name}.bin"), dtype=dtype, mode="r",
+                         shape=(self.event_count,))
+
+    def range(self, t_start_us, t_end_us):
+        """Positions [begin, end) of the events in [t_start_us, t_end_us)"""
+        return self._position(t_start_us), self._position(t_end_us)
+
+    def window(self, t_start_us, t_end_us):
+        """Zero-copy (x, y, p, t) views on the events in [t_start_us, t_end_us)"""
+        begin, end = self.range(t_start_us, t_end_us)
+        return self.x[begin:end], self.y[begin:end], self.p[begin:end], self.t[begin:end]
+
+    def _position(self, ts):
+        bucket = int(ts) // self.step_us
+        if bucket < 0:
+            return 0
+        if bucket + 1 >= len(self.time_index):
+            begin, end = int(self.time_index[-1]) if len(self.time_index) else 0, self.event_count
+        else:
+            begin, end = int(self.time_index[bucket]), int(self.time_index[bucket + 1])
+        # Only the events of a single bucket are searched
+        return begin + int(np.searchsorted(self.t[begin:end], ts))
+
+
+class EventCache:
+    """
+    On-disk cache of decoded recordings, one directory of column files per
+    recording.
+
+    An entry is rebuilt when the size or mtime of its source changes, and
+    least recently used entries are evicted to keep the cache under
+    `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=4 * 1024 ** 3, step_us=10000):
+        self.logger = logging.getLogger(__name__)
+        if cache_dir is None:
+            cache_dir = Path(__file__).parent.parent / "assets" / ".cache"
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.step_us = step_us
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def entry_dir(self, raw_path):
+        real_path = os.path.realpath(raw_path)
+        digest = hashlib.sha1(real_path.encode("utf-8")).hexdigest()[:12]
+        stem = os.path.splitext(os.path.basename(real_path))[0]
+        return os.path.join(self.cache_dir, f"{stem}-{digest}")
+
+    def open(self, raw_path):
+        """Cached events of a recording, decoding it first if needed"""
+        entry_dir = self.entry_dir(raw_path)
+        meta = self._read_meta(entry_dir)
+        stat = os.stat(raw_path)
+
+        if meta is None or meta["source_size"] != stat.st_size or meta["source_mtime"] != stat.st_mtime:
+            meta = self._build(raw_path, entry_dir, stat)
+            self.evict(keep=entry_dir)
+
+        # Mark as recently used for the LRU eviction
+        os.utime(os.path.join(entry_dir, "meta.json"))
+        return CachedEvents(entry_dir, meta)
+
+    def get(self, raw_path):
+        """Cached events if an up to date entry exists, without building one"""
+        entry_dir = self.entry_dir(raw_path)
+        meta = self._read_meta(entry_dir)
+        if meta is None:
+            return None
+
+        stat = os.stat(raw_path)
+        if meta["source_size"] != stat.st_size or meta["source_mtime"] != stat.st_mtime:
+            return None
+
+        os.utime(os.path.join(entry_dir, "meta.json"))
+        return CachedEvents(entry_dir, meta)
+
+    def size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+
+        for entry_dir, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if entry_dir == keep:
+                continue
+            self.logger.info(f"Evicting {entry_dir} from the event cache")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def _entries(self):
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            meta_path = os.path.join(entry_dir, "meta.json")
+            if not os.path.isfile(meta_path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            yield entry_dir, os.stat(meta_path).st_mtime, size
+
+    def _read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == CACHE_VERSION else None
+
+    def _build(self, raw_path, entry_dir, stat):
+        self.logger.info(f"Caching decoded events of {raw_path}")
+        start = time.perf_counter()
+
+        # Build next to the final entry and swap it in once complete
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        reader = EventFileReader(raw_path, use_index=False)
+        files = {name: open(os.path.join(tmp_dir, f"{name}.bin"), "wb") for name in COLUMNS}
+        time_index = []
+        next_bucket_ts = 0
+        count = 0
+        try:
+            for x, y, p, t in reader.chunks():
+                for name, column in (("x", x), ("y", y), ("p", p), ("t", t)):
+                    column.astype(COLUMNS[name], copy=False).tofile(files[name])
+
+                if t[-1] >= next_bucket_ts:
+                    buckets = np.arange(next_bucket_ts, int(t[-1]) + 1, self.step_us)
+                    time_index.append(count + np.searchsorted(t, buckets))
+                    next_bucket_ts = int(buckets[-1]) + self.step_us
+                count += len(t)
+        finally:
+            for f in files.values():
+                f.close()
+
+        time_index = np.concatenate(time_index) if time_index else np.zeros(1, dtype=np.int64)
+        np.save(os.path.join(tmp_dir, "time_index.npy"), time_index.astype(np.int64))
+
+        height, width = reader.get_size()
+        meta = {
+            "version": CACHE_VERSION,
+            "source": os.path.realpath(raw_path),
+            "source_size": stat.st_size,
+            "source_mtime": stat.st_mtime,
+            "event_count": count,
+            "width": width,
+            "height": height,
+            "step_us": self.step_us,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=4)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+
+        self.logger.info(f"Cached {count} events of {raw_path} in {time.perf_counter() - start:.1f} s")
+        return meta
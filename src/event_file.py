@@ -0,0 +1,361 @@
+import os
+import time
+import json
+import fcntl
+import logging
+import numpy as np
+
+try:
+    from .evt_codec import EVENT_DTYPE, DECODERS, raw_header, read_raw_header, encode_evt2
+    from .raw_index import RawIndex, RawIndexBuilder
+except ImportError:
+    from evt_codec import EVENT_DTYPE, DECODERS, raw_header, read_raw_header, encode_evt2
+    from raw_index import RawIndex, RawIndexBuilder
+
+
+def lock_for_writing(path):
+    """
+    Hold an exclusive lock on `path`, created if missing, until the
+    returned file is closed, so is_being_written tells it is open. A file
+    its writer locked already (an EventFileWriter) is left as is.
+    """
+    lock = open(path, "ab")
+    try:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        pass
+    return lock
+
+
+def is_being_written(path):
+    """Whether a writer holds the lock of `path`, see lock_for_writing"""
+    try:
+        with open(path, "rb") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+class EventFileWriter:
+    """
+    Write decoded CD events to an EVT 2.0 RAW file.
+
+    Unless `index_step_us` is None, a seek index is built while writing and
+    saved next to the file on close. The file is locked while open, see
+    is_being_written. With a SummaryWorker as `summaries`, the events also
+    feed the summary sidecar of the file, finished on close.
+    """
+
+    def __init__(self, path, width, height, index_step_us=10000, summaries=None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.width = width
+        self.height = height
+        self.event_count = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.summaries = summaries
+
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        self._file = open(path, "wb")
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._file.write(raw_header(width, height))
+        self._data_offset = self._file.tell()
+        self._last_time_high = -1
+        self._index = RawIndexBuilder(index_step_us) if index_step_us else None
+
+    @property
+    def bytes_written(self):
+        return self._file.tell()
+
+    def write(self, evs):
+        if len(evs) == 0:
+            return
+        self.write_columns(evs["x"], evs["y"], evs["p"], evs["t"])
+
+    def write_columns(self, x, y, p, t):
+        if len(t) == 0:
+            return
+
+        if self._index is not None:
+            next_bucket_ts = self._index.next_bucket_ts
+            if next_bucket_ts is None or t[-1] >= next_bucket_ts:
+                # Start the batch with a TIME_HIGH word, so the index can point at it
+                self._last_time_high = -1
+                self._index.add_point(self._file.tell(), (int(t[0]) >> 6) << 6)
+
+        words, self._last_time_high = encode_evt2(x, y, p, t, self._last_time_high)
+        self._file.write(words)
+        if self.summaries is not None:
+            self.summaries.update_columns(self.path, x, y, p, t)
+
+        if self.first_ts is None:
+            self.first_ts = int(t[0])
+        self.last_ts = int(t[-1])
+        self.event_count += len(t)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+
+        if self._index is not None and self._index.t0 is not None:
+            try:
+                self._index.finish(self.path, "EVT2", self._data_offset).save()
+            except OSError as e:
+                self.logger.warning(f"Could not save seek index of {self.path}: {e}")
+        if self.summaries is not None:
+            self.summaries.finish(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class EventFileReader:
+    """
+    Iterate over the CD events of a RAW recording in `delta_t` batches, or
+    in batches of `n_events` with mode="n_events".
+
+    Decoding is vectorized and starts from the seek index entry closest to
+    `start_ts` instead of the beginning of the file. Timestamps are relative
+    to the start of the recording, as with the SDK readers. With `realtime`,
+    batches are paced to the sensor clock like LiveReplayEventsIterator.
+    """
+
+    def __init__(self, input_path, delta_t=10000, start_ts=0, end_ts=None, index=None,
+                 use_index=True, realtime=False, chunk_bytes=1024 * 1024, mode="delta_t", n_events=10000):
+        self.input_path = input_path
+        self.mode = mode
+        self.delta_t = delta_t
+        self.n_events = n_events
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.realtime = realtime
+        self.chunk_bytes = chunk_bytes
+
+        self.header = read_raw_header(input_path)
+        self.index = index
+        if self.index is None and start_ts > 0 and use_index:
+            self.index = RawIndex.open(input_path)
+
+        self.current_time = start_ts
+
+    def get_size(self):
+        return self.header["height"], self.header["width"]
+
+    def get_current_time(self):
+        return self.current_time
+
+    def chunks(self):
+        """Decoded (x, y, p, t) columns of the file from `start_ts`, one read chunk at a time"""
+        decoder = DECODERS[self.header["format"]]()
+        word_size = decoder.word_dtype.itemsize
+
+        offset = self.header["data_offset"]
+        origin = None
+        if self.index is not None:
+            offset, resync_ts = self.index.lookup(self.start_ts)
+            decoder.seed(resync_ts)
+            origin = self.index.t0
+
+        chunk_bytes = self.chunk_bytes - self.chunk_bytes % word_size
+        with open(self.input_path, "rb") as f:
+            f.seek(offset)
+            while True:
+                data = f.read(chunk_bytes)
+                if len(data) < word_size:
+                    break
+
+                words = np.frombuffer(data, dtype=decoder.word_dtype, count=len(data) // word_size)
+                x, y, p, t = decoder.decode(words)
+
+                if origin is None:
+                    if decoder.first_time_high is None:
+                        continue
+                    origin = decoder.first_time_high
+                t -= origin
+
+                begin = int(np.searchsorted(t, self.start_ts)) if len(t) and t[0] < self.start_ts else 0
+                end = len(t)
+                done = self.end_ts is not None and len(t) and t[-1] >= self.end_ts
+                if done:
+                    end = int(np.searchsorted(t, self.end_ts))
+
+                if end > begin:
+                    yield x[begin:end], y[begin:end], p[begin:end], t[begin:end]
+                if done:
+                    break
+
+    def __iter__(self):
+        batch_end = self.start_ts + self.delta_t
+        pending = np.empty(0, dtype=EVENT_DTYPE)
+        replay_start = time.perf_counter()
+
+        for x, y, p, t in self.chunks():
+            evs = np.empty(len(pending) + len(t), dtype=EVENT_DTYPE)
+            evs[:len(pending)] = pending
+            evs["x"][len(pending):] = x
+            evs["y"][len(pending):] = y
+            evs["p"][len(pending):] = p
+            evs["t"][len(pending):] = t
+
+            begin = 0
+            if self.mode == "n_events":
+                for cut in range(self.n_events, len(evs) + 1, self.n_events):
+                    yield self._emit(evs[begin:cut], int(evs["t"][cut - 1]), replay_start)
+                    begin = cut
+            else:
+                # Cut the chunk at every batch boundary it spans
+                boundaries = np.arange(batch_end, int(t[-1]) + 1, self.delta_t)
+                cuts = np.searchsorted(evs["t"], boundaries)
+                for cut in cuts:
+                    yield self._emit(evs[begin:cut], batch_end, replay_start)
+                    batch_end += self.delta_t
+                    begin = cut
+            pending = evs[begin:]
+
+        if len(pending):
+            last_ts = int(pending["t"][-1]) if self.mode == "n_events" else batch_end
+            yield self._emit(pending, last_ts, replay_start)
+
+    def _emit(self, evs, batch_end, replay_start):
+        self.current_time = batch_end
+        if self.realtime:
+            delay = (batch_end - self.start_ts) / 1e6 - (time.perf_counter() - replay_start)
+            if delay > 0:
+                time.sleep(delay)
+        return evs
+
+
+class SegmentedEventWriter:
+    """
+    Write events to a series of EVT 2.0 segments, rotated every `segment_us`
+    of sensor time and/or once a segment exceeds `segment_bytes`.
+
+    Batches are split on the exact boundary so no event is lost between
+    segments, and each closed segment gets a `.manifest.json` sidecar, and
+    its own summary sidecar with a SummaryWorker as `summaries`, the one
+    RecordingCatalog lists it with.
+    """
+
+    def __init__(self, path, width, height, segment_us=None, segment_bytes=None, summaries=None):
+        if segment_us is None and segment_bytes is None:
+            raise ValueError("Either segment_us or segment_bytes must be given")
+
+        self.logger = logging.getLogger(__name__)
+        self.base_path = path
+        self.width = width
+        self.height = height
+        self.segment_us = segment_us
+        self.segment_bytes = segment_bytes
+        self.summaries = summaries
+
+        self.segments = []
+        self.event_count = 0
+        self.first_ts = None
+        self.last_ts = None
+
+        self._writer = None
+        self._segment_end_ts = None
+        self._open_segment()
+
+    @property
+    def path(self):
+        return self._writer.path
+
+    def write(self, evs):
+        if len(evs) == 0:
+            return
+        self.write_columns(evs["x"], evs["y"], evs["p"], evs["t"])
+
+    def write_columns(self, x, y, p, t):
+        n = len(t)
+        start = 0
+
+        while start < n:
+            if self.segment_bytes is not None and self._writer.bytes_written >= self.segment_bytes:
+                self._rotate()
+
+            end = n
+            if self.segment_us is not None:
+                if self._segment_end_ts is None:
+                    self._segment_end_ts = int(t[start]) + self.segment_us
+                if t[n - 1] >= self._segment_end_ts:
+                    end = start + int(np.searchsorted(t[start:], self._segment_end_ts))
+
+            if end > start:
+                self._writer.write_columns(x[start:end], y[start:end], p[start:end], t[start:end])
+
+            if end == n:
+                break
+
+            # Next slot of the time grid holding the remaining events
+            while t[end] >= self._segment_end_ts:
+                self._segment_end_ts += self.segment_us
+            self._rotate()
+            start = end
+
+        if n:
+            if self.first_ts is None:
+                self.first_ts = int(t[0])
+            self.last_ts = int(t[-1])
+            self.event_count += n
+
+    def close(self):
+        if self._writer is not None:
+            self._close_segment()
+            self._writer = None
+
+    def _open_segment(self):
+        stem, ext = os.path.splitext(self.base_path)
+        segment_path = f"{stem}_{len(self.segments):03d}{ext}"
+        self._writer = EventFileWriter(segment_path, self.width, self.height, summaries=self.summaries)
+        self.segments.append(segment_path)
+
+    def _close_segment(self):
+        writer = self._writer
+        writer.close()
+
+        manifest = {
+            "session": os.path.basename(self.base_path),
+            "segment_index": len(self.segments) - 1,
+            "path": os.path.basename(writer.path),
+            "start_ts": writer.first_ts,
+            "end_ts": writer.last_ts,
+            "event_count": writer.event_count,
+            "bytes": os.path.getsize(writer.path),
+        }
+        with open(os.path.splitext(writer.path)[0] + ".manifest.json", "w") as f:
+            json.dump(manifest, f, indent=4)
+
+        self.logger.info(f"Closed segment {writer.path} ({writer.event_count} events)")
+
+    def _rotate(self):
+        self._close_segment()
+        self._open_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_event_writer(path, width, height, segment_s=None, segment_mb=None, summaries=None):
+    """EventFileWriter, or SegmentedEventWriter when a rotation period or size is given"""
+    if segment_s is None and segment_mb is None:
+        return EventFileWriter(path, width, height, summaries=summaries)
+
+    segment_us = int(segment_s * 1e6) if segment_s is not None else None
+    segment_bytes = int(segment_mb * 1024 * 1024) if segment_mb is not None else None
+    return SegmentedEventWriter(path, width, height, segment_us=segment_us, segment_bytes=segment_bytes,
+                                summaries=summaries)
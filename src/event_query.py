@@ -0,0 +1,66 @@
+import numpy as np
+
+try:
+    from .evt_codec import EVENT_DTYPE
+    from .event_file import EventFileReader
+    from .raw_index import RawIndex
+except ImportError:
+    from evt_codec import EVENT_DTYPE
+    from event_file import EventFileReader
+    from raw_index import RawIndex
+
+
+def load_events(path, t_start_us, t_end_us, roi=None, polarity=None, use_index=True,
+                cache=None, chunk_bytes=16 * 1024 * 1024):
+    """
+    Load the CD events of a RAW recording in [t_start_us, t_end_us) as one
+    contiguous EVENT_DTYPE array.
+
+    Times are relative to the start of the recording. `roi` is an
+    (x_min, y_min, x_max, y_max) half-open box and `polarity` keeps only
+    ON (1) or OFF (0) events. Decoding starts from the seek index, which is
+    built and cached on first use unless `use_index` is False. Filtering is
+    vectorized per decoded chunk and each kept event is copied once, into
+    the returned array.
+
+    With an EventCache, the events are read from its memory-mapped columns
+    instead of being decoded.
+    """
+    if t_end_us <= t_start_us:
+        return np.empty(0, dtype=EVENT_DTYPE)
+
+    if cache is not None:
+        chunks = [cache.open(path).window(t_start_us, t_end_us)]
+    else:
+        index = RawIndex.open(path) if use_index else None
+        reader = EventFileReader(path, start_ts=t_start_us, end_ts=t_end_us, index=index,
+                                 use_index=use_index, chunk_bytes=chunk_bytes)
+        chunks = reader.chunks()
+
+    selected = []
+    total = 0
+    for x, y, p, t in chunks:
+        mask = None
+        if roi is not None:
+            x_min, y_min, x_max, y_max = roi
+            mask = (x >= x_min) & (x < x_max) & (y >= y_min) & (y < y_max)
+        if polarity is not None:
+            mask = (p == polarity) if mask is None else mask & (p == polarity)
+
+        count = len(t) if mask is None else int(np.count_nonzero(mask))
+        if count:
+            selected.append((x, y, p, t, mask, count))
+            total += count
+
+    events = np.empty(total, dtype=EVENT_DTYPE)
+    begin = 0
+    for x, y, p, t, mask, count in selected:
+        end = begin + count
+        for name, column in (("x", x), ("y", y), ("p", p), ("t", t)):
+            if mask is None:
+                events[name][begin:end] = column
+            else:
+                np.compress(mask, column, out=events[name][begin:end])
+        begin = end
+
+    return events
@@ -0,0 +1,172 @@
+import numpy as np
+
+# Histograms of inter-event times and batch sizes: bin 0 holds 0, bin k
+# holds [2**(k-1), 2**k)
+LOG2_BINS = 48
+
+
+def log2_bins(values):
+    """Histogram bin of every value, see LOG2_BINS"""
+    bins = np.zeros(len(values), dtype=np.intp)
+    positive = values > 0
+    bins[positive] = np.minimum(np.log2(values[positive]).astype(np.intp) + 1, LOG2_BINS - 1)
+    return bins
+
+
+def histogram_percentile(histogram, q):
+    """Lower bound of the log2 bin holding the q-th percentile"""
+    total = histogram.sum()
+    if total == 0:
+        return None
+    index = int(np.searchsorted(np.cumsum(histogram), total * q / 100))
+    return 0 if index == 0 else 2 ** (index - 1)
+
+
+class EventStatistics:
+    """
+    Running statistics of CD event batches, vectorised with NumPy.
+
+    `update` counts events and polarities, the event rate over sensor time
+    and over the last `rate_window_us`, per-pixel event counts, inter-event
+    times and batch sizes. Accumulators are allocated once: pixel indices
+    are buffered and counted with one np.bincount per `pixel_buffer` events,
+    and times and sizes go into log2 histograms.
+    """
+
+    def __init__(self, width, height, rate_window_us=1000000, pixel_buffer=1 << 20, history=1024):
+        self.width = width
+        self.height = height
+        self.rate_window_us = rate_window_us
+        self.flat_counts = np.zeros(width * height, dtype=np.int64)
+        self.pixel_buffer = np.empty(pixel_buffer, dtype=np.intp)
+        self.buffered = 0
+        self.dt_histogram = np.zeros(LOG2_BINS, dtype=np.int64)
+        self.batch_histogram = np.zeros(LOG2_BINS, dtype=np.int64)
+        # Last event time and size of the latest batches, for the recent rate
+        self.batch_ends = np.zeros(history, dtype=np.int64)
+        self.batch_sizes = np.zeros(history, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.flat_counts.fill(0)
+        self.dt_histogram.fill(0)
+        self.batch_histogram.fill(0)
+        self.buffered = 0
+        self.event_count = 0
+        self.on_count = 0
+        self.batch_count = 0
+        self.min_batch = None
+        self.max_batch = 0
+        self.first_ts = None
+        self.last_ts = None
+
+    def update(self, evs):
+        self.update_columns(evs["x"], evs["y"], evs["p"], evs["t"])
+
+    def update_columns(self, x, y, p, t):
+        n = len(t)
+        self.batch_histogram[log2_bins(np.array([n]))[0]] += 1
+        self.min_batch = n if self.min_batch is None else min(self.min_batch, n)
+        self.max_batch = max(self.max_batch, n)
+        slot = self.batch_count % len(self.batch_ends)
+        self.batch_count += 1
+        if n == 0:
+            self.batch_sizes[slot] = 0
+            self.batch_ends[slot] = self.last_ts or 0
+            return
+
+        self.event_count += n
+        self.on_count += int(np.count_nonzero(p))
+
+        # Inter-event times, including the gap since the previous batch
+        dt = np.diff(t, prepend=t[0] if self.last_ts is None else self.last_ts)
+        if self.last_ts is None:
+            dt = dt[1:]
+            self.first_ts = int(t[0])
+        self.dt_histogram += np.bincount(log2_bins(dt), minlength=LOG2_BINS)
+        self.last_ts = int(t[-1])
+        self.batch_ends[slot] = self.last_ts
+        self.batch_sizes[slot] = n
+
+        # Linearised pixel indices, counted once the buffer is full
+        begin = 0
+        while begin < n:
+            count = min(n - begin, len(self.pixel_buffer) - self.buffered)
+            index = self.pixel_buffer[self.buffered:self.buffered + count]
+            index[:] = y[begin:begin + count]
+            index *= self.width
+            index += x[begin:begin + count]
+            self.buffered += count
+            begin += count
+            if self.buffered == len(self.pixel_buffer):
+                self.flush()
+
+    def flush(self):
+        if self.buffered:
+            self.flat_counts += np.bincount(self.pixel_buffer[:self.buffered], minlength=len(self.flat_counts))
+            self.buffered = 0
+
+    @property
+    def pixel_counts(self):
+        """Events per pixel, shape (height, width)"""
+        self.flush()
+        return self.flat_counts.reshape(self.height, self.width)
+
+    @property
+    def duration_us(self):
+        return 0 if self.first_ts is None else self.last_ts - self.first_ts
+
+    @property
+    def rate(self):
+        """Events per second of sensor time since the start"""
+        return self.event_count * 1e6 / self.duration_us if self.duration_us else 0.0
+
+    @property
+    def recent_rate(self):
+        """Events per second over the last `rate_window_us` of sensor time"""
+        if self.last_ts is None:
+            return 0.0
+        filled = min(self.batch_count, len(self.batch_ends))
+        ends, sizes = self.batch_ends[:filled], self.batch_sizes[:filled]
+        recent = ends > self.last_ts - self.rate_window_us
+        span = min(self.rate_window_us, self.duration_us)
+        return float(sizes[recent].sum()) * 1e6 / span if span else 0.0
+
+    @property
+    def on_ratio(self):
+        return self.on_count / self.event_count if self.event_count else 0.0
+
+    def hot_pixels(self, k=10):
+        """[(x, y, count)] of the `k` pixels with the most events"""
+        counts = self.pixel_counts.reshape(-1)
+        # Among active pixels only, argpartition is slow on long runs of zeros
+        active = np.flatnonzero(counts)
+        if len(active) > k:
+            active = active[np.argpartition(counts[active], -k)[-k:]]
+        top = active[np.argsort(counts[active])[::-1]]
+        return [(int(i % self.width), int(i // self.width), int(counts[i])) for i in top]
+
+    def summary(self):
+        counts = self.pixel_counts
+        return {
+            "event_count": self.event_count,
+            "duration_s": self.duration_us / 1e6,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "event_rate": self.rate,
+            "on_ratio": self.on_ratio,
+            "active_pixels": int(np.count_nonzero(counts)),
+            "max_pixel_count": int(counts.max()) if counts.size else 0,
+            "hot_pixels": self.hot_pixels(),
+            "inter_event_us": {
+                "mean": self.duration_us / (self.event_count - 1) if self.event_count > 1 else None,
+                "p50": histogram_percentile(self.dt_histogram, 50),
+                "p99": histogram_percentile(self.dt_histogram, 99),
+            },
+            "batches": {
+                "count": self.batch_count,
+                "min": self.min_batch,
+                "max": self.max_batch,
+                "mean": self.event_count / self.batch_count if self.batch_count else None,
+            },
+        }
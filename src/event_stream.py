@@ -0,0 +1,244 @@
+import zlib
+import socket
+import struct
+import logging
+import numpy as np
+
+try:
+    from .evt_codec import EVENT_DTYPE
+except ImportError:
+    from evt_codec import EVENT_DTYPE
+
+# Optional compressors, zlib is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+MAGIC = b"EVPK"
+VERSION = 1
+
+# magic, version, codec, reserved, width, height, sequence, t0, event count, payload bytes
+HEADER = struct.Struct("<4sBBHHHIqII")
+
+CODECS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+CODEC_NAMES = {value: name for name, value in CODECS.items()}
+
+# Largest UDP payload, packets are split to fit in a datagram
+MAX_DATAGRAM = 65000
+
+
+def available_codec(codec):
+    """`codec` if it can be used here, otherwise the zlib fallback"""
+    if codec == "zstd" and zstandard is None or codec == "lz4" and lz4_frame is None:
+        logging.getLogger(__name__).warning(f"{codec} is not installed, falling back to zlib")
+        return "zlib"
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression: {codec}")
+    return codec
+
+
+def _compress(codec, data, compressor=None):
+    if codec == "zstd":
+        return compressor.compress(data)
+    if codec == "lz4":
+        return lz4_frame.compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 1)
+    return data
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("Received zstd packets but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "lz4":
+        if lz4_frame is None:
+            raise ValueError("Received lz4 packets but lz4 is not installed")
+        return lz4_frame.decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+class EventPacketEncoder:
+    """
+    Encode CD events into self-contained packets.
+
+    A packet holds the time of its first event and, per event, the time
+    delta to the previous one (uint32) and x | y << 14 | p << 28 (uint32),
+    stored column by column so they compress well. Packets hold at most
+    `max_events`, so each one fits in a UDP datagram.
+    """
+
+    def __init__(self, width, height, codec="zstd", max_events=8000):
+        self.width = width
+        self.height = height
+        self.codec = available_codec(codec)
+        self.max_events = max_events
+        self.sequence = 0
+        self.compressor = zstandard.ZstdCompressor(level=1) if self.codec == "zstd" else None
+
+    def encode(self, evs):
+        """Packets (bytes) of a batch of events"""
+        packets = []
+        for begin in range(0, len(evs), self.max_events):
+            packets.append(self._packet(evs[begin:begin + self.max_events]))
+        return packets
+
+    def _packet(self, evs):
+        t = evs["t"]
+        dt = np.empty(len(evs), dtype="<u4")
+        dt[0] = 0
+        np.subtract(t[1:], t[:-1], out=dt[1:], casting="unsafe")
+        xyp = (evs["x"].astype("<u4") | evs["y"].astype("<u4") << 14 | (evs["p"].astype("<u4") & 1) << 28)
+
+        payload = _compress(self.codec, dt.tobytes() + xyp.tobytes(), self.compressor)
+        header = HEADER.pack(MAGIC, VERSION, CODECS[self.codec], 0, self.width, self.height,
+                             self.sequence, int(t[0]), len(evs), len(payload))
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        return header + payload
+
+
+def decode_header(data):
+    magic, version, codec, _, width, height, sequence, t0, count, payload_len = HEADER.unpack(data[:HEADER.size])
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not an event packet")
+    return {
+        "codec": CODEC_NAMES.get(codec),
+        "width": width,
+        "height": height,
+        "sequence": sequence,
+        "t0": t0,
+        "count": count,
+        "payload_len": payload_len,
+    }
+
+
+def decode_payload(header, payload):
+    """EVENT_DTYPE array of a packet"""
+    data = _decompress(header["codec"], payload)
+    count = header["count"]
+    dt = np.frombuffer(data, dtype="<u4", count=count)
+    xyp = np.frombuffer(data, dtype="<u4", count=count, offset=4 * count)
+
+    evs = np.empty(count, dtype=EVENT_DTYPE)
+    np.cumsum(dt, out=evs["t"])
+    evs["t"] += header["t0"]
+    evs["x"] = xyp & 0x3FFF
+    evs["y"] = (xyp >> 14) & 0x3FFF
+    evs["p"] = (xyp >> 28) & 1
+    return evs
+
+
+class EventStreamSender:
+    """Send event packets to a receiver over TCP (reliable) or UDP (lossy, lower latency)"""
+
+    def __init__(self, host, port=5001, protocol="tcp", codec="zstd", width=1280, height=720):
+        if protocol not in ("tcp", "udp"):
+            raise ValueError(f"Unknown protocol: {protocol}")
+        self.logger = logging.getLogger(__name__)
+        self.address = (host, port)
+        self.protocol = protocol
+        self.encoder = EventPacketEncoder(width, height, codec=codec)
+        self.bytes_sent = 0
+        self.events_sent = 0
+
+        if protocol == "tcp":
+            self.sock = socket.create_connection(self.address)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, evs):
+        if len(evs) == 0:
+            return
+        for packet in self.encoder.encode(evs):
+            if self.protocol == "tcp":
+                self.sock.sendall(packet)
+            else:
+                self.sock.sendto(packet, self.address)
+            self.bytes_sent += len(packet)
+        self.events_sent += len(evs)
+
+    def close(self):
+        self.sock.close()
+
+
+class EventStreamReceiver:
+    """
+    Receive event packets sent by an EventStreamSender.
+
+    Iterating yields one EVENT_DTYPE array per packet. `lost` counts the
+    packets missing from the sequence, for UDP.
+    """
+
+    def __init__(self, port=5001, protocol="tcp", host="0.0.0.0"):
+        self.logger = logging.getLogger(__name__)
+        self.protocol = protocol
+        self.width = None
+        self.height = None
+        self.lost = 0
+        self._next_sequence = None
+
+        if protocol == "tcp":
+            self.server = socket.create_server((host, port))
+        else:
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.server.bind((host, port))
+
+    def __iter__(self):
+        packets = self._tcp_packets() if self.protocol == "tcp" else self._udp_packets()
+        for header, payload in packets:
+            self.width, self.height = header["width"], header["height"]
+            if self._next_sequence is not None and header["sequence"] != self._next_sequence:
+                self.lost += (header["sequence"] - self._next_sequence) & 0xFFFFFFFF
+            self._next_sequence = (header["sequence"] + 1) & 0xFFFFFFFF
+            yield decode_payload(header, payload)
+
+    def _udp_packets(self):
+        while True:
+            data, _ = self.server.recvfrom(MAX_DATAGRAM + HEADER.size)
+            try:
+                header = decode_header(data)
+            except (ValueError, struct.error):
+                continue
+            yield header, data[HEADER.size:HEADER.size + header["payload_len"]]
+
+    def _tcp_packets(self):
+        while True:
+            conn, address = self.server.accept()
+            self.logger.info(f"Event stream from {address[0]}")
+            self._next_sequence = None
+            with conn:
+                while True:
+                    data = self._read_exactly(conn, HEADER.size)
+                    if data is None:
+                        break
+                    header = decode_header(data)
+                    payload = self._read_exactly(conn, header["payload_len"])
+                    if payload is None:
+                        break
+                    yield header, payload
+            self.logger.info("Event stream closed")
+
+    @staticmethod
+    def _read_exactly(conn, size):
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            n = conn.recv_into(view[received:])
+            if n == 0:
+                return None
+            received += n
+        return bytes(buffer)
+
+    def close(self):
+        self.server.close()
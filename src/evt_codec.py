@@ -0,0 +1,311 @@
+import time
+import numpy as np
+
+# Same layout as metavision_sdk_base.EventCD, so arrays can be fed back to the SDK algorithms
+EVENT_DTYPE = np.dtype({
+    "names": ["x", "y", "p", "t"],
+    "formats": ["<u2", "<u2", "<i2", "<i8"],
+    "offsets": [0, 2, 4, 8],
+    "itemsize": 16,
+})
+
+# EVT 2.0 word types
+EVT2_CD_OFF = 0x0
+EVT2_CD_ON = 0x1
+EVT2_TIME_HIGH = 0x8
+
+# EVT 3.0 word types
+EVT3_ADDR_Y = 0x0
+EVT3_ADDR_X = 0x2
+EVT3_VECT_BASE_X = 0x3
+EVT3_VECT_12 = 0x4
+EVT3_VECT_8 = 0x5
+EVT3_TIME_LOW = 0x6
+EVT3_TIME_HIGH = 0x8
+
+
+def raw_header(width, height):
+    """Header of an EVT 2.0 RAW file, readable by the Metavision SDK"""
+    date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    return (
+        f"% date {date}\n"
+        f"% evt 2.0\n"
+        f"% format EVT2;height={height};width={width}\n"
+        f"% geometry {width}x{height}\n"
+        f"% end\n"
+    ).encode("ascii")
+
+
+def read_raw_header(path):
+    """
+    Parse the `%` header of a RAW file.
+
+    Returns a dict with the event format ("EVT2" or "EVT3"), the geometry and
+    the byte offset where the event data starts.
+    """
+    header = {"format": None, "width": None, "height": None, "data_offset": 0}
+
+    with open(path, "rb") as f:
+        while True:
+            line = f.readline()
+            if not line.startswith(b"%"):
+                break
+            header["data_offset"] = f.tell()
+
+            text = line[1:].decode("ascii", errors="replace").strip()
+            if text == "end":
+                break
+
+            key, _, value = text.partition(" ")
+            if key == "format":
+                fields = value.split(";")
+                header["format"] = fields[0].strip()
+                for item in fields[1:]:
+                    name, _, number = item.partition("=")
+                    if name in ("width", "height"):
+                        header[name] = int(number)
+            elif key == "evt" and header["format"] is None:
+                header["format"] = "EVT" + value.strip().split(".")[0]
+            elif key == "geometry" and header["width"] is None:
+                width, _, height = value.partition("x")
+                header["width"], header["height"] = int(width), int(height)
+
+    if header["format"] not in DECODERS:
+        raise ValueError(f"Unsupported event format in {path}: {header['format']}")
+
+    return header
+
+
+def encode_evt2(x, y, p, t, last_time_high=-1):
+    """
+    Encode CD events into EVT 2.0 words.
+
+    A TIME_HIGH word is inserted whenever the upper timestamp bits change,
+    including against `last_time_high` carried over from the previous call.
+    Returns the words and the time high of the last event.
+    """
+    time_high = t >> 6
+    words = (
+        (p.astype(np.uint32) & 1) << 28
+        | (t.astype(np.uint32) & 0x3F) << 22
+        | (x.astype(np.uint32) & 0x7FF) << 11
+        | (y.astype(np.uint32) & 0x7FF)
+    )
+
+    changes = np.flatnonzero(time_high[1:] != time_high[:-1]) + 1
+    if time_high[0] != last_time_high:
+        changes = np.concatenate(([0], changes))
+
+    if changes.size:
+        high_words = (EVT2_TIME_HIGH << 28) | (time_high[changes] & 0x0FFFFFFF).astype(np.uint32)
+        words = np.insert(words, changes, high_words.astype(np.uint32))
+
+    return words.astype("<u4", copy=False), int(time_high[-1])
+
+
+def _last_before(source_idx, at):
+    """Position in `source_idx` of the last entry before each index of `at`, -1 if none"""
+    return np.searchsorted(source_idx, at) - 1
+
+
+class _Decoder:
+    """
+    Common state of the vectorized decoders.
+
+    Chunks must be fed in file order. Timestamps are unwrapped across the
+    TIME_HIGH counter overflow, and events seen before the first TIME_HIGH
+    of the stream are dropped since their time is unknown.
+    """
+    word_dtype = None
+    period = None
+
+    def __init__(self, time_high=None):
+        self.time_high = None   # Unwrapped time of the last TIME_HIGH, in us
+        self.first_time_high = None
+        self._loops = 0
+        self._last_raw_high = None
+        if time_high is not None:
+            self.seed(time_high)
+
+    def seed(self, time_high):
+        """Start from a resync point whose TIME_HIGH has the given unwrapped time"""
+        self._loops = time_high // self.period
+        self._last_raw_high = time_high % self.period
+        self.time_high = None
+
+    def _unwrap(self, raw_highs):
+        if raw_highs.size == 0:
+            return raw_highs.astype(np.int64)
+
+        previous = raw_highs[0] if self._last_raw_high is None else self._last_raw_high
+        steps = np.diff(raw_highs, prepend=previous)
+        loops = self._loops + np.cumsum(steps < -(self.period // 2))
+
+        self._loops = int(loops[-1])
+        self._last_raw_high = int(raw_highs[-1])
+        highs = raw_highs + loops * self.period
+
+        if self.first_time_high is None:
+            self.first_time_high = int(highs[0])
+        return highs
+
+
+class Evt2Decoder(_Decoder):
+    word_dtype = np.dtype("<u4")
+    period = 1 << 34
+
+    def decode(self, words):
+        """Decode EVT 2.0 words into (x, y, p, t) columns"""
+        types = words >> 28
+
+        high_idx = np.flatnonzero(types == EVT2_TIME_HIGH)
+        highs = self._unwrap((words[high_idx] & 0x0FFFFFFF).astype(np.int64) << 6)
+
+        cd_idx = np.flatnonzero(types <= EVT2_CD_ON)
+        pos = _last_before(high_idx, cd_idx)
+        if self.time_high is None:
+            cd_idx, pos = cd_idx[pos >= 0], pos[pos >= 0]
+        base = np.where(pos >= 0, highs[pos] if highs.size else 0, self.time_high or 0)
+
+        if highs.size:
+            self.time_high = int(highs[-1])
+
+        cd = words[cd_idx]
+        x = ((cd >> 11) & 0x7FF).astype(np.uint16)
+        y = (cd & 0x7FF).astype(np.uint16)
+        p = types[cd_idx].astype(np.int16)
+        t = base + ((cd >> 22) & 0x3F)
+        return x, y, p, t
+
+
+class Evt3Decoder(_Decoder):
+    word_dtype = np.dtype("<u2")
+    period = 1 << 24
+
+    def __init__(self, time_high=None):
+        super().__init__(time_high)
+        self.time_low = None
+        self.y = None
+        self.base_x = None  # Next x of the current vector run, already advanced
+        self.pol = 0
+
+    def seed(self, time_high):
+        super().seed(time_high)
+        self.time_low = None
+        self.y = None
+        self.base_x = None
+
+    def decode(self, words):
+        """Decode EVT 3.0 words into (x, y, p, t) columns"""
+        types = words >> 12
+        payload = (words & 0xFFF).astype(np.int64)
+
+        high_idx = np.flatnonzero(types == EVT3_TIME_HIGH)
+        highs = self._unwrap(payload[high_idx] << 12)
+        low_idx = np.flatnonzero(types == EVT3_TIME_LOW)
+        y_idx = np.flatnonzero(types == EVT3_ADDR_Y)
+        base_idx = np.flatnonzero(types == EVT3_VECT_BASE_X)
+        single_idx = np.flatnonzero(types == EVT3_ADDR_X)
+        vect_idx = np.flatnonzero((types == EVT3_VECT_12) | (types == EVT3_VECT_8))
+
+        def state_at(source_idx, values, at, current):
+            pos = _last_before(source_idx, at)
+            known = pos >= 0 if current is None else np.ones(len(at), dtype=bool)
+            fallback = 0 if current is None else current
+            return np.where(pos >= 0, values[pos] if len(values) else 0, fallback), known
+
+        ys = payload[y_idx] & 0x7FF
+        lows = payload[low_idx]
+
+        # Single events
+        s_high, s_known = state_at(high_idx, highs, single_idx, self.time_high)
+        s_low, s_low_known = state_at(low_idx, lows, single_idx, self.time_low)
+        s_y, s_y_known = state_at(y_idx, ys, single_idx, self.y)
+        s_valid = s_known & s_low_known & s_y_known
+
+        # Vector events, x runs from the last VECT_BASE_X advanced by the previous vectors
+        widths = np.where(types[vect_idx] == EVT3_VECT_12, 12, 8)
+        advance = np.cumsum(widths) - widths
+        vects_before_base = np.searchsorted(vect_idx, base_idx)
+        base_advance = np.concatenate(([0], np.cumsum(widths)))[vects_before_base]
+        base_pos = _last_before(base_idx, vect_idx)
+
+        bases = payload[base_idx] & 0x7FF
+        base_pols = (payload[base_idx] >> 11) & 1
+        if len(base_idx):
+            v_x0 = np.where(base_pos >= 0, bases[base_pos] + advance - base_advance[base_pos],
+                            (self.base_x or 0) + advance)
+            v_pol = np.where(base_pos >= 0, base_pols[base_pos], self.pol)
+        else:
+            v_x0 = (self.base_x or 0) + advance
+            v_pol = np.full(len(vect_idx), self.pol)
+        v_base_known = base_pos >= 0 if self.base_x is None else np.ones(len(vect_idx), dtype=bool)
+
+        v_high, v_known = state_at(high_idx, highs, vect_idx, self.time_high)
+        v_low, v_low_known = state_at(low_idx, lows, vect_idx, self.time_low)
+        v_y, v_y_known = state_at(y_idx, ys, vect_idx, self.y)
+        v_valid = v_known & v_low_known & v_y_known & v_base_known
+
+        bits = (payload[vect_idx, None] >> np.arange(12)) & 1
+        bits[types[vect_idx] == EVT3_VECT_8, 8:] = 0
+        bits[~v_valid] = 0
+
+        # Scatter both kinds of events at their position in the stream, allocating the output once
+        counts = np.zeros(len(words), dtype=np.int64)
+        counts[single_idx[s_valid]] = 1
+        counts[vect_idx] = bits.sum(axis=1)
+        starts = np.cumsum(counts) - counts
+        total = int(counts.sum())
+
+        x = np.empty(total, dtype=np.uint16)
+        y = np.empty(total, dtype=np.uint16)
+        p = np.empty(total, dtype=np.int16)
+        t = np.empty(total, dtype=np.int64)
+
+        out = starts[single_idx[s_valid]]
+        singles = payload[single_idx[s_valid]]
+        x[out] = singles & 0x7FF
+        y[out] = s_y[s_valid]
+        p[out] = (singles >> 11) & 1
+        t[out] = s_high[s_valid] + s_low[s_valid]
+
+        rows, cols = np.nonzero(bits)
+        out = starts[vect_idx][rows] + (np.cumsum(bits, axis=1) - bits)[rows, cols]
+        x[out] = v_x0[rows] + cols
+        y[out] = v_y[rows]
+        p[out] = v_pol[rows]
+        t[out] = v_high[rows] + v_low[rows]
+
+        # Carry the decoder state over to the next chunk
+        if len(highs):
+            self.time_high = int(highs[-1])
+        if len(lows):
+            self.time_low = int(lows[-1])
+        if len(ys):
+            self.y = int(ys[-1])
+        if len(base_idx):
+            trailing = widths[vect_idx > base_idx[-1]].sum()
+            self.base_x = int(bases[-1]) + int(trailing)
+            self.pol = int(base_pols[-1])
+        elif self.base_x is not None:
+            self.base_x += int(widths.sum())
+
+        return x, y, p, t
+
+
+DECODERS = {"EVT2": Evt2Decoder, "EVT3": Evt3Decoder}
+
+
+def time_high_points(words, evt_format, decoder):
+    """
+    Word positions and unwrapped times of the TIME_HIGH words of a chunk.
+
+    These are the points where decoding can restart; `decoder` only carries
+    the overflow state between chunks.
+    """
+    if evt_format == "EVT2":
+        idx = np.flatnonzero((words >> 28) == EVT2_TIME_HIGH)
+        return idx, decoder._unwrap((words[idx] & 0x0FFFFFFF).astype(np.int64) << 6)
+
+    idx = np.flatnonzero((words >> 12) == EVT3_TIME_HIGH)
+    return idx, decoder._unwrap((words[idx] & 0xFFF).astype(np.int64) << 12)
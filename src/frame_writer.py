@@ -0,0 +1,148 @@
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+
+
+class FrameWriter:
+    """
+    Write frames to a pipe (e.g. ffmpeg stdin) from a dedicated thread.
+
+    `submit` copies the frame into one of `queue_size + 1` preallocated
+    slots and returns at once. When all slots are taken, the oldest queued
+    frame is dropped to make room, so the queue only ever holds the latest
+    frames. Slots go to the pipe as memoryviews, without an intermediate
+    bytes copy. A frame written more than `late_after_s` after its
+    submission is counted as late, and `write_time` adds up the seconds
+    spent blocked on the pipe, i.e. waiting for the reader. `position`
+    counts every frame given to the pipe, including the blank frames of
+    `align`.
+    """
+
+    def __init__(self, pipe, frame_shape, dtype=np.uint8, queue_size=2, late_after_s=0.1, name="frame-writer"):
+        self.logger = logging.getLogger(__name__)
+        self.pipe = pipe
+        self.late_after_s = late_after_s
+        self.slots = [np.empty(frame_shape, dtype=dtype) for _ in range(queue_size + 1)]
+        self.blank = None
+        self.align_to = None
+        self.free = list(range(len(self.slots)))
+        self.queued = deque()   # (slot, submit time) in submission order
+        self.condition = threading.Condition()
+        self.closing = False
+        self.error = None
+
+        self.submitted = 0
+        self.written = 0
+        self.position = 0
+        self.dropped = 0
+        self.late = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    @property
+    def queue_depth(self):
+        return len(self.queued)
+
+    def submit(self, frame):
+        """Queue a copy of `frame`, returns False if the frame or an older one was dropped"""
+        with self.condition:
+            if self.closing or self.error is not None:
+                self.dropped += 1
+                return False
+
+            self.submitted += 1
+            kept_all = True
+            if not self.free:
+                # Recycle the slot of the oldest frame still waiting
+                slot, _ = self.queued.popleft()
+                self.free.append(slot)
+                self.dropped += 1
+                kept_all = False
+
+            slot = self.free.pop()
+            np.copyto(self.slots[slot], frame, casting="unsafe")
+            self.queued.append((slot, time.perf_counter()))
+            self.condition.notify()
+            return kept_all
+
+    def align(self, frames):
+        """
+        Drop the queued frames and put the next submitted frame at a multiple
+        of `frames` in the pipe, preceded by as many blank frames as needed.
+        """
+        with self.condition:
+            self.dropped += len(self.queued)
+            self.free.extend(slot for slot, _ in self.queued)
+            self.queued.clear()
+            self.align_to = frames
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queued and not self.closing:
+                    self.condition.wait()
+                if not self.queued:
+                    break
+                slot, submitted = self.queued.popleft()
+                align_to, self.align_to = self.align_to, None
+
+            # The slot is neither free nor queued while it is being written
+            view = memoryview(self.slots[slot]).cast("B")
+            write_start = time.perf_counter()
+            try:
+                if align_to:
+                    padding = -self.position % align_to
+                    if padding and self.blank is None:
+                        self.blank = memoryview(np.zeros_like(self.slots[0])).cast("B")
+                    for _ in range(padding):
+                        self.pipe.write(self.blank)
+                    self.position += padding
+                self.pipe.write(view)
+                self.pipe.flush()
+            except (BrokenPipeError, OSError, ValueError) as e:
+                with self.condition:
+                    self.error = e
+                    self.free.append(slot)
+                    self.free.extend(queued_slot for queued_slot, _ in self.queued)
+                    self.queued.clear()
+                break
+
+            written = time.perf_counter()
+            with self.condition:
+                self.free.append(slot)
+                self.written += 1
+                self.position += 1
+                self.bytes_written += view.nbytes
+                self.write_time += written - write_start
+                if written - submitted > self.late_after_s:
+                    self.late += 1
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "late": self.late,
+            "queue_depth": self.queue_depth,
+            "write_time": self.write_time,
+        }
+
+    def close(self, drain=True):
+        """Stop the writer thread, after writing the queued frames if `drain`"""
+        with self.condition:
+            if not drain:
+                self.dropped += len(self.queued)
+                self.free.extend(slot for slot, _ in self.queued)
+                self.queued.clear()
+            self.closing = True
+            self.condition.notify()
+        self.thread.join()
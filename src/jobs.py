@@ -0,0 +1,179 @@
+import time
+import logging
+import threading
+from enum import Enum, auto
+
+
+class JobState(Enum):
+    RUNNING = auto()
+    STOPPING = auto()
+    DONE = auto()
+    STOPPED = auto()
+    FAILED = auto()
+
+    def __str__(self):
+        return self.name.lower()
+
+
+class Job:
+    """
+    One mode (capture, playback, stream) run on a background thread.
+
+    The target is called with the job's `stop_event` and `on_batch`, as
+    taken by run_pipeline, and the batches update the event count, the
+    sensor time covered and the throughput over the last `rate_interval_s`.
+    With `total_us`, e.g. the duration of a played file, `progress` is the
+    fraction of it covered so far.
+    """
+
+    def __init__(self, name, target, kwargs=None, exclusive=True, total_us=None, rate_interval_s=0.5):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.target = target
+        self.kwargs = kwargs or {}
+        self.exclusive = exclusive
+        self.total_us = total_us
+        self.rate_interval_s = rate_interval_s
+        self.stop_event = threading.Event()
+        self.state = JobState.RUNNING
+        self.result = None
+        self.error = None
+
+        self.events = 0
+        self.batches = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.rate = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self.window_start = None
+        self.window_events = 0
+        self.thread = threading.Thread(target=self.run, name=f"job-{name}", daemon=True)
+
+    def start(self):
+        self.started_at = self.window_start = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            self.result = self.target(stop_event=self.stop_event, on_batch=self.on_batch, **self.kwargs)
+            self.state = JobState.STOPPED if self.stop_event.is_set() else JobState.DONE
+        except Exception as e:
+            self.error = e
+            self.state = JobState.FAILED
+            self.logger.error(f"Job {self.name} failed: {e}")
+        finally:
+            self.finished_at = time.perf_counter()
+            self.rate = 0.0
+
+    def on_batch(self, evs):
+        n = len(evs)
+        self.events += n
+        self.batches += 1
+        if n:
+            if self.first_ts is None:
+                self.first_ts = int(evs["t"][0])
+            self.last_ts = int(evs["t"][-1])
+
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+        if elapsed >= self.rate_interval_s:
+            self.rate = (self.events - self.window_events) / elapsed
+            self.window_start = now
+            self.window_events = self.events
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+    @property
+    def elapsed_s(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def progress(self):
+        if not self.total_us or self.first_ts is None:
+            return None
+        return min(1.0, (self.last_ts - self.first_ts) / self.total_us)
+
+    def stop(self, timeout=None):
+        """Ask the job to stop and wait for it, returns False if it is still running after `timeout`"""
+        if self.running:
+            self.state = JobState.STOPPING
+            self.stop_event.set()
+            self.thread.join(timeout)
+        return not self.running
+
+    def status(self):
+        line = f"{self.name}: {self.state} {self.elapsed_s:.0f} s, {self.events / 1e6:.2f} Mev"
+        if self.running:
+            line += f", {self.rate / 1e6:.2f} Mev/s"
+        if self.progress is not None:
+            line += f", {self.progress * 100:.0f}%"
+        if self.error is not None:
+            line += f" ({self.error})"
+        return line
+
+
+class JobScheduler:
+    """
+    Named background jobs, at most one running per name.
+
+    `exclusive` jobs, those reading the device, never run together:
+    starting one while another is running is refused with a warning.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def start(self, name, target, exclusive=True, total_us=None, **kwargs):
+        """Run `target(stop_event=..., on_batch=..., **kwargs)` as job `name`, None if refused"""
+        with self.lock:
+            current = self.jobs.get(name)
+            if current is not None and current.running:
+                self.logger.warning(f"{name} is already running")
+                return None
+            if exclusive:
+                busy = [job.name for job in self.jobs.values() if job.running and job.exclusive]
+                if busy:
+                    self.logger.warning(f"Cannot start {name} while {busy[0]} is running, stop it first")
+                    return None
+            job = Job(name, target, kwargs, exclusive=exclusive, total_us=total_us)
+            self.jobs[name] = job
+            job.start()
+        self.logger.info(f"Started {name}")
+        return job
+
+    def get(self, name):
+        return self.jobs.get(name)
+
+    def is_running(self, name):
+        job = self.jobs.get(name)
+        return job is not None and job.running
+
+    def stop(self, name, timeout=5.0):
+        job = self.jobs.get(name)
+        if job is None or not job.running:
+            return True
+        self.logger.info(f"Stopping {name}")
+        stopped = job.stop(timeout)
+        if not stopped:
+            self.logger.warning(f"{name} did not stop within {timeout:.0f} s")
+        return stopped
+
+    def stop_all(self, timeout=5.0):
+        for name in list(self.jobs):
+            self.stop(name, timeout)
+
+    def running(self):
+        with self.lock:
+            return [job for job in self.jobs.values() if job.running]
+
+    def status_lines(self):
+        with self.lock:
+            return [job.status() for job in self.jobs.values()]
@@ -1,19 +1,29 @@
-from metavision_core.event_io import EventsIterator, LiveReplayEventsIterator, is_live_camera
-from metavision_sdk_core import PeriodicFrameGenerationAlgorithm, ColorPalette
-from metavision_sdk_ui import EventLoop, BaseWindow, MTWindow, UIKeyEvent
-from metavision_core.event_io.raw_reader import initiate_device
-import threading
 import os
+import sys
 import time
+import select
 import logging
 import json
 import curses
-import subprocess
 from collections import deque
 from datetime import datetime
 from pathlib import Path
 from enum import Enum, auto
 
+try:
+    from .recording_summary import start_backfill
+    from .recording_catalog import RecordingCatalog
+    from .jobs import JobScheduler
+    from .modes import PipelineModes
+except ImportError:
+    from recording_summary import start_backfill
+    from recording_catalog import RecordingCatalog
+    from jobs import JobScheduler
+    from modes import PipelineModes
+
+# Refresh rate of the menu while jobs are running, to show their progress
+UI_FPS = 4
+
 class Menu(Enum):
     HOME = auto()
 
@@ -58,6 +68,8 @@ class CursesLogHandler(logging.Handler):
     def __init__(self, max_lines=100):
         super().__init__()
         self.log_lines = deque(maxlen=max_lines)  # Store recent log messages
+        self.version = 0      # Bumped on every message, the window is only redrawn when it changes
+        self.wake_fd = None   # Written to on every message, to wake up the menu loop
     
     def emit(self, record):
         try:
@@ -67,6 +79,12 @@ class CursesLogHandler(logging.Handler):
             timestamp = datetime.now().strftime('%H:%M:%S')
             formatted_entry = f"[{timestamp}] {log_entry}"
             self.log_lines.append(formatted_entry)
+            self.version += 1
+            if self.wake_fd is not None:
+                try:
+                    os.write(self.wake_fd, b"\0")
+                except OSError:
+                    pass  # Pipe full, the loop is awake anyway
         except Exception:
             self.handleError(record)
     
@@ -76,23 +94,63 @@ class CursesLogHandler(logging.Handler):
             return list(self.log_lines)
         return list(self.log_lines)[-num_lines:]
     
+def sparkline(counts, width):
+    """`counts` resampled to `width` characters of increasing density"""
+    levels = " .:-=+*#%@"
+    if not counts or width <= 0:
+        return ""
+    step = max(1, -(-len(counts) // width))
+    sums = [sum(counts[i:i + step]) for i in range(0, len(counts), step)]
+    peak = max(sums) or 1
+    return "".join(levels[min(len(levels) - 1, value * len(levels) // peak)] for value in sums)
+
+def summary_line(summary):
+    if summary is None:
+        return "(no summary yet)"
+    line = (f"{summary['duration_s']:.1f} s  {summary['event_count'] / 1e6:.2f} Mev  "
+            f"mean {summary['mean_rate'] / 1e6:.2f} / peak {summary['peak_rate'] / 1e6:.2f} Mev/s")
+    if summary.get("approximate"):
+        line += "  (approximate)"
+    return line if summary["complete"] else line + "  (recording)"
+
 # ------------------------------ Camera Handler ------------------------------ #
-class CameraHandler:
-    def __init__(self):
+class CameraHandler(PipelineModes):
+    def __init__(self, device=None, simulate=None, batching=None):
         self.setup_logging()
         self.logger = logging.getLogger(__name__)
-        
-        try:
-            # HAL Device on live camera
-            self.device = initiate_device("")
-        except Exception as e:
-            self.logger.error(f"Failed to initiate device: {e}")
-            self.logger.info("Continue without camera")
-            self.device = None
-
-        self.display_menu_items = [mode for mode in Menu if mode != Menu.HOME]
+        super().__init__(device, simulate, batching)
+
+        # Capture, playback and stream modes started from the menu run as background jobs
+        self.jobs = JobScheduler()
+        self.jobs_shown = None
+        self.mode_entered = False
+
+        # Recordings listed by the PLAY menu
+        self.play_catalog = None
+        self.backfill_thread = None
+
+        self.screens = {
+            Menu.HOME: self.run_home,
+            Menu.RECORD: self.run_record,
+            Menu.PLAY: self.run_play,
+            Menu.LIVE: self.run_live,
+            Menu.ADJUST: self.run_adjust,
+            Menu.REMOTE_RECORD: self.run_remote_record,
+            Menu.REMOTE_LIVE: self.run_remote_live,
+            Menu.REMOTE_PLAY: self.run_remote_play,
+        }
+        # Modes without a screen (REMOTE_ADJUST, HEADLESS_*) are not offered
+        self.display_menu_items = [mode for mode in Menu if mode in self.screens and mode != Menu.HOME]
         self.current_mode = Menu.HOME
         self.selected_idx = 0
+
+        # Menu loop: log version on screen, wake up pipe, and its own load
+        self.logs_drawn = None
+        self.wake_fd = None
+        self.ui_wakeups = 0
+        self.ui_redraws = 0
+        self.ui_started = None
+        self.ui_cpu_start = None
     
     def setup_logging(self):
         # Create custom handler for curses display
@@ -112,8 +170,12 @@ class CameraHandler:
         root_logger.addHandler(self.curses_handler)
         root_logger.addHandler(console_handler)
 
-    def display_logs_in_window(self):
-        """Display recent log messages in the log window"""
+    def display_logs_in_window(self, force=False):
+        """Display recent log messages in the log window, if there are new ones"""
+        version = self.curses_handler.version
+        if version == self.logs_drawn and not force:
+            return
+        self.logs_drawn = version
         self.log_window.erase()
         self.log_window.box()
         
@@ -135,7 +197,16 @@ class CameraHandler:
         self.log_window.refresh()
     
     def menu(self):
-        curses.wrapper(self.main_loop)
+        try:
+            curses.wrapper(self.main_loop)
+        finally:
+            self.jobs.stop_all()
+            self.encoder_service.shutdown()
+            load = self.ui_load()
+            if load is not None:
+                self.logger.info(f"Menu used {load['cpu_s'] * 1000:.0f} ms CPU in {load['wall_s']:.0f} s "
+                                 f"({load['cpu_percent']:.2f}%), {load['wakeups']} wakeups, "
+                                 f"{load['redraws']} redraws")
 
     def main_loop(self, stdscr):
         curses.curs_set(0)
@@ -152,27 +223,98 @@ class CameraHandler:
         menu_window.nodelay(False)
         self.log_window.nodelay(True)
 
+        # Log messages of other threads wake the loop up through this pipe
+        self.wake_fd, wake_w = os.pipe()
+        os.set_blocking(self.wake_fd, False)
+        os.set_blocking(wake_w, False)
+        self.curses_handler.wake_fd = wake_w
+
+        self.ui_started = time.perf_counter()
+        self.ui_cpu_start = time.thread_time()
         self.logger.info("Application started")
-        
-        while True:
-            # Update log window
-            self.display_logs_in_window()
 
-            # Read user input with timeout
-            menu_window.timeout(100)  # 100ms timeout
-            key = menu_window.getch()
-            
-            # Handle modes
-            if self.current_mode == Menu.HOME:
-                self.run_home(menu_window, key)
-            elif self.current_mode == Menu.RECORD:
-                self.run_record(menu_window, key)
-            elif self.current_mode == Menu.PLAY:
-                self.run_play(menu_window, key)
-            elif self.current_mode == Menu.LIVE:
-                self.run_live(menu_window, key)
-            elif self.current_mode == Menu.ADJUST:
-                self.run_adjust(menu_window, key)
+        drawn_mode = None
+        key = -1
+        try:
+            while True:
+                # Update log window
+                self.display_logs_in_window()
+
+                # Redraw the screen on input, on a mode switch, or when what it shows changed
+                mode = self.current_mode
+                if key != -1 or mode != drawn_mode or self.screen_changed(mode):
+                    drawn_mode = mode
+                    self.ui_redraws += 1
+                    if mode in self.screens:
+                        self.screens[mode](menu_window, key)
+                    if self.current_mode != mode:
+                        # Show the new screen without waiting for input
+                        key = -1
+                        continue
+
+                # Sleep until a key or a log message, or the next frame while jobs are running
+                key = self.wait_for_key(menu_window, self.idle_timeout(mode))
+        finally:
+            self.curses_handler.wake_fd = None
+            os.close(wake_w)
+            os.close(self.wake_fd)
+            self.wake_fd = None
+
+    def wait_for_key(self, window, timeout=None):
+        """Next key, or -1 after `timeout` seconds or when a log message arrives"""
+        window.timeout(0)
+        key = window.getch()
+        if key == -1:
+            readable, _, _ = select.select([sys.stdin, self.wake_fd], [], [], timeout)
+            self.ui_wakeups += 1
+            if self.wake_fd in readable:
+                try:
+                    os.read(self.wake_fd, 4096)
+                except BlockingIOError:
+                    pass
+            key = window.getch()
+        return key
+
+    def idle_timeout(self, mode):
+        if self.jobs.running():
+            return 1 / UI_FPS
+        # PLAY checks for new recordings
+        return 1.0 if mode in [Menu.PLAY, Menu.REMOTE_PLAY] else None
+
+    def screen_changed(self, mode):
+        """Whether the screen of `mode` is out of date without any input"""
+        if mode in [Menu.PLAY, Menu.REMOTE_PLAY] and self.play_catalog is not None and self.play_catalog.refresh():
+            return True
+        if mode in [Menu.HOME, Menu.RECORD, Menu.PLAY, Menu.LIVE, Menu.REMOTE_RECORD, Menu.REMOTE_LIVE,
+                    Menu.REMOTE_PLAY]:
+            return self.jobs.status_lines() != self.jobs_shown
+        return False
+
+    def draw_jobs(self, window, y):
+        """Status of the jobs from line `y` of `window`"""
+        self.jobs_shown = self.jobs.status_lines()
+        rows, cols = window.getmaxyx()
+        for i, line in enumerate(self.jobs_shown):
+            if y + i >= rows - 1:
+                break
+            try:
+                window.addstr(y + i, 3, line[:cols - 4])
+            except curses.error:
+                break
+
+    def ui_load(self):
+        """CPU time of the menu thread since the menu started, None before"""
+        if self.ui_started is None:
+            return None
+        cpu_s = time.thread_time() - self.ui_cpu_start
+        wall_s = time.perf_counter() - self.ui_started
+        return {
+            "cpu_s": cpu_s,
+            "wall_s": wall_s,
+            "cpu_percent": 100 * cpu_s / wall_s if wall_s else 0.0,
+            "wakeups": self.ui_wakeups,
+            "redraws": self.ui_redraws,
+        }
 
     def run_home(self, window: curses.window, key):
         if key == ord("q") or key == ord("Q"):
@@ -186,8 +328,9 @@ class CameraHandler:
             selected_mode = self.display_menu_items[self.selected_idx]
             self.logger.info(f"Enter pressed, switching to mode: {selected_mode.name}")
             self.current_mode = selected_mode
+            self.mode_entered = True
     
-        window.clear()
+        window.erase()
         window.box()
         window.addstr(1, 1, "HOME MENU")
         window.addstr(2, 1, "Use ↑/↓ to select, Enter to confirm, q to quit")
@@ -202,72 +345,151 @@ class CameraHandler:
             except curses.error:
                 break
 
+        self.draw_jobs(window, 5 + len(self.display_menu_items))
         window.refresh()
 
     def run_record(self, window: curses.window, key):
-        if key == ord("b") or key == ord("B"):
+        recording = self.jobs.is_running("record")
+
+        if key in [ord("q"), ord("Q"), ord("b"), ord("B")]:
+            self.jobs.stop("record")
             self.current_mode = Menu.HOME
-        
-        window.clear()
+            return
+
+        if not recording and key in [10, 13, curses.KEY_ENTER]:
+            output_dir = str(Path(__file__).parent.parent / "assets")
+            recording = self.jobs.start("record", self.record, output_dir=output_dir) is not None
+
+        window.erase()
         window.box()
         window.addstr(1, 1, "RECORD MODE")
-        window.addstr(2, 1, "Press 'b' to go back")
+        if recording:
+            window.addstr(2, 1, "Recording, press 'q' to stop and go back")
+        else:
+            window.addstr(2, 1, "Press Enter to start recording, 'q' to go back")
+        self.draw_jobs(window, 4)
         window.refresh()
 
     def run_play(self, window: curses.window, key):
-        # Search files
+        def start(window, entry, total_us):
+            self.jobs.start("play", self.play, exclusive=False, total_us=total_us, input_file=entry.path)
+
+        self.run_catalog(window, key, "play", "PLAY MODE", start)
+
+    def run_remote_play(self, window: curses.window, key):
+        def start(window, entry, total_us):
+            receivers = self.ask_receivers(window, 2)
+            if receivers:
+                self.jobs.start("remote_play", self.remote_play, exclusive=False, total_us=total_us,
+                                input_file=entry.path, receivers=receivers)
+
+        self.run_catalog(window, key, "remote_play", "REMOTE PLAY MODE", start)
+
+    def run_catalog(self, window, key, job, title, start):
+        """List the recordings, and start `job` on the selected one with `start(window, entry, total_us)`"""
+        # Recordings, rescanned only when the folder changes
         folder_path = Path(__file__).parent.parent / "assets"
-        raw_files = [f for f in os.listdir(folder_path) if f.endswith(".raw")]
-        
-        if not raw_files:
-            window.clear()
+        if self.play_catalog is None:
+            self.play_catalog = RecordingCatalog(folder_path)
+        catalog = self.play_catalog
+        catalog.refresh()
+
+        if not hasattr(self, "play_selected_idx"):
+            self.play_selected_idx = 0
+            if self.backfill_thread is None or not self.backfill_thread.is_alive():
+                # Recordings made before summaries existed get one in the background
+                self.backfill_thread = start_backfill(folder_path)
+
+        if not len(catalog):
+            window.erase()
             window.box()
             window.addstr(1, 1, "No .raw files found!")
             window.addstr(2, 1, "Press 'q' to go back")
             window.refresh()
             if key in [ord("q"), ord("Q")]:
                 self.current_mode = Menu.HOME
+                del self.play_selected_idx
             return
 
-        if not hasattr(self, "play_selected_idx"):
-            self.play_selected_idx = 0
+        rows, cols = window.getmaxyx()
+        catalog.page_size = max(1, rows - 7)
+        self.play_selected_idx = min(self.play_selected_idx, len(catalog) - 1)
 
         if key == curses.KEY_UP:
-            self.play_selected_idx = (self.play_selected_idx - 1) % len(raw_files)
+            self.play_selected_idx = (self.play_selected_idx - 1) % len(catalog)
         elif key == curses.KEY_DOWN:
-            self.play_selected_idx = (self.play_selected_idx + 1) % len(raw_files)
+            self.play_selected_idx = (self.play_selected_idx + 1) % len(catalog)
+        elif key in [curses.KEY_PPAGE, curses.KEY_LEFT]:
+            self.play_selected_idx = max(self.play_selected_idx - catalog.page_size, 0)
+        elif key in [curses.KEY_NPAGE, curses.KEY_RIGHT]:
+            self.play_selected_idx = min(self.play_selected_idx + catalog.page_size, len(catalog) - 1)
+        elif key in [ord("s"), ord("S")]:
+            # Keep the same recording selected in the new order
+            selected = catalog[self.play_selected_idx].name
+            if key == ord("S"):
+                catalog.sort(reverse=not catalog.reverse)
+            else:
+                catalog.next_sort()
+            self.play_selected_idx = catalog.index(selected) or 0
         elif key in [10, 13, curses.KEY_ENTER]:  # Enter
-            selected_file = os.path.join(folder_path, raw_files[self.play_selected_idx])
-            self.play(selected_file)
+            entry = catalog[self.play_selected_idx]
+            total_us = int(entry.duration_s * 1e6) if entry.duration_s else None
+            start(window, entry, total_us)
+        elif key in [ord("x"), ord("X")]:
+            self.jobs.stop(job)
         elif key in [ord("q"), ord("Q")]:
+            self.jobs.stop(job)
             self.current_mode = Menu.HOME
             del self.play_selected_idx
             return
 
-        window.clear()
+        window.erase()
         window.box()
-        window.addstr(1, 1, "PLAY MODE - Select file")
-        window.addstr(2, 1, "Use ↑/↓ to select, Enter to play, 'q' to go back")
-        
-        for i, f in enumerate(raw_files):
-            if i == self.play_selected_idx:
-                window.addstr(3+i, 3, f"> {f}", curses.A_REVERSE)
-            else:
-                window.addstr(3+i, 3, f"  {f}")
+        window.addstr(1, 1, f"{title} - Select file")
+        window.addstr(2, 1, "↑/↓ select, ←/→ page, s sort (S reverse), Enter play, x stop, 'q' back"[:cols - 2])
 
+        page = self.play_selected_idx // catalog.page_size
+        first = page * catalog.page_size
+        for i, entry in enumerate(catalog.page(page)):
+            line = f"{entry.name}  {entry.size / 1e6:.1f} MB  {summary_line(entry.summary)}"[:cols - 6]
+            try:
+                if first + i == self.play_selected_idx:
+                    window.addstr(3+i, 3, f"> {line}", curses.A_REVERSE)
+                else:
+                    window.addstr(3+i, 3, f"  {line}")
+            except curses.error:
+                break
+
+        footer = 3 + catalog.page_size
+        try:
+            order = f"{catalog.sort_key}{' reversed' if catalog.reverse else ''}"
+            window.addstr(footer, 3, f"Page {page + 1}/{catalog.pages}, {len(catalog)} recordings by {order}"[:cols - 4])
+            # Event rate over the selected recording
+            summary = catalog[self.play_selected_idx].summary
+            if summary is not None:
+                window.addstr(footer + 1, 3, "Rate  " + sparkline(summary["timeline"]["counts"], cols - 12))
+        except curses.error:
+            pass
+
+        self.draw_jobs(window, footer + 2)
         window.refresh()
 
     def run_live(self, window: curses.window, key):
-        if key == ord("q") or key == ord("Q"):
+        if key in [ord("q"), ord("Q")]:
+            self.jobs.stop("live")
             self.current_mode = Menu.HOME
             return
-        
-        self.live()
-        
-        window.clear()
+
+        # Started when entering the mode, and again with Enter once its window was closed
+        if self.mode_entered or (key in [10, 13, curses.KEY_ENTER] and not self.jobs.is_running("live")):
+            self.mode_entered = False
+            self.jobs.start("live", self.live)
+
+        window.erase()
         window.box()
         window.addstr(1, 1, "LIVE MODE")
-        window.addstr(2, 1, "Press 'q' to go back")
+        window.addstr(2, 1, "Press Enter to restart the live view, 'q' to stop and go back")
+        self.draw_jobs(window, 4)
         window.refresh()
 
     def run_adjust(self, window: curses.window, key):
@@ -287,53 +509,21 @@ class CameraHandler:
 
         self.adjust_running = True
 
-        # Start live thread
-        if not hasattr(self, "live_thread") or not self.live_thread.is_alive():
-            self.live_stop_event = threading.Event()
-
-            def live_thread_fn():
-                self.logger.info("Start live feed in adjust mode")
-                mv_iterator = EventsIterator.from_device(device=self.device)
-                height, width = mv_iterator.get_size()
-
-                with MTWindow(title="Metavision Events Viewer",
-                            width=width,
-                            height=height,
-                            mode=BaseWindow.RenderMode.BGR) as window_mt:
-
-                    event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=width,
-                                                                    sensor_height=height,
-                                                                    fps=25,
-                                                                    palette=ColorPalette.Dark)
-
-                    def on_cd_frame_cb(ts, cd_frame):
-                        window_mt.show_async(cd_frame)
-
-                    event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-                    for evs in mv_iterator:
-                        if not self.adjust_running:
-                            break
-
-                        EventLoop.poll_and_dispatch()
-                        event_frame_gen.process_events(evs)
-
-                self.logger.info("Stop live feed in adjust mode")
-
-            self.live_thread = threading.Thread(target=live_thread_fn, daemon=True)
-            self.live_thread.start()
+        # Live feed to see the effect of the biases
+        if not self.jobs.is_running("live"):
+            self.jobs.start("live", self.live)
 
         # Start adjust curses loop
         save_file = Path(__file__).parent.parent / "assets" / "biases.json"
         idx, step = 0, 1
 
-        window.timeout(50)
+        k = -1
         while self.adjust_running:
-            k = window.getch()
 
             if k in [ord("q"), ord("Q")]:
                 self.current_mode = Menu.HOME
                 self.adjust_running = False
+                self.jobs.stop("live")
                 break
             elif k == curses.KEY_UP:
                 idx = (idx - 1) % len(bias_list)
@@ -355,7 +545,7 @@ class CameraHandler:
                     for name, val in saved.items():
                         biases.set(name, val)
             
-            window.clear()
+            window.erase()
             window.box()
             window.addstr(1, 1, "BIAS ADJUSTMENT MODE")
             window.addstr(2, 1, "Use ↑/↓ to select, ←/→ to adjust, 's'=save, 'r'=read, 'b'=back")
@@ -366,6 +556,70 @@ class CameraHandler:
 
             window.refresh()
 
+            # Sleep until the next key, showing the logs of the live feed meanwhile
+            k = -1
+            while k == -1:
+                self.display_logs_in_window()
+                k = self.wait_for_key(window)
+
+    def run_remote_record(self, window: curses.window, key):
+        recording = self.jobs.is_running("remote_record")
+
+        if key in [ord("q"), ord("Q")]:
+            self.jobs.stop("remote_record")
+            self.current_mode = Menu.HOME
+            return
+
+        if not recording and key in [10, 13, curses.KEY_ENTER]:
+            receivers = self.ask_receivers(window, 4)
+            if receivers:
+                output_dir = str(Path(__file__).parent.parent / "assets")
+                recording = self.jobs.start("remote_record", self.remote_record, receivers=receivers,
+                                            output_dir=output_dir) is not None
+
+        window.erase()
+        window.box()
+        window.addstr(1, 1, "REMOTE RECORD MODE")
+        if recording:
+            window.addstr(2, 1, "Recording with a live preview, press 'q' to stop and go back")
+        else:
+            window.addstr(2, 1, "Press Enter to start recording, 'q' to go back")
+        self.draw_jobs(window, 6)
+        window.refresh()
+
+    def run_remote_live(self, window: curses.window, key):
+        streaming = self.jobs.is_running("remote_live")
+
+        if key in [ord("q"), ord("Q")]:
+            self.jobs.stop("remote_live")
+            self.current_mode = Menu.HOME
+            return
+
+        if not streaming and key in [10, 13, curses.KEY_ENTER]:
+            receivers = self.ask_receivers(window, 4)
+            if receivers:
+                streaming = self.jobs.start("remote_live", self.remote_live, receivers=receivers) is not None
+
+        window.erase()
+        window.box()
+        window.addstr(1, 1, "REMOTE LIVE MODE")
+        if streaming:
+            window.addstr(2, 1, "Streaming the live view, press 'q' to stop and go back")
+        else:
+            window.addstr(2, 1, "Press Enter to start streaming, 'q' to go back")
+        self.draw_jobs(window, 6)
+        window.refresh()
+
+    def ask_receivers(self, window, y):
+        """Receivers typed in the menu window instead of stdin, '' if none"""
+        label = "Receiver IPs: "
+        window.addstr(y, 2, label)
+        curses.echo()
+        window.timeout(-1)
+        receivers = window.getstr(y, 2 + len(label), 128).decode("utf-8").strip()
+        curses.noecho()
+        return receivers
+
     def adjust_bias(self):
         if not self.device:
             self.logger.warning("No device available for recording.")
@@ -463,301 +717,3 @@ class CameraHandler:
                 stdscr.refresh()
 
         curses.wrapper(run)
-        
-    def record(self, output_dir="", DISPLAY=True):
-        if not self.device:
-            self.logger.warning("No device available for recording.")
-            return
-        
-        # Events iterator on Device
-        mv_iterator = EventsIterator.from_device(device=self.device)
-        height, width = mv_iterator.get_size()  # Camera Geometry
-
-        # Start the recording
-        if self.device.get_i_events_stream():
-            log_path = "recording_" + time.strftime("%y%m%d_%H%M%S", time.localtime()) + ".raw"
-            if output_dir != "":
-                log_path = os.path.join(output_dir, log_path)
-            self.logger.info(f'Recording to {log_path}')
-            self.device.get_i_events_stream().log_raw_data(log_path)
-
-        if DISPLAY:
-            self.logger.info("Open window")
-            with MTWindow(title="Metavision Events Viewer",
-                          width=width,
-                          height=height,
-                          mode=BaseWindow.RenderMode.BGR) as window:
-                def keyboard_cb(key, scancode, action, mods):
-                    if key == UIKeyEvent.KEY_ESCAPE or key == UIKeyEvent.KEY_Q:
-                        window.set_close_flag()
-
-                window.set_keyboard_callback(keyboard_cb)
-
-                # Event Frame Generator
-                event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=width,
-                                                                sensor_height=height,
-                                                                fps=25,
-                                                                palette=ColorPalette.Dark)
-
-                def on_cd_frame_cb(ts, cd_frame):
-                    window.show_async(cd_frame)
-
-                event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-                # Process events
-                for evs in mv_iterator:
-                    # Dispatch system events to the window
-                    EventLoop.poll_and_dispatch()
-                    event_frame_gen.process_events(evs)
-
-                    if window.should_close():
-                        # Stop the recording
-                        self.device.get_i_events_stream().stop_log_raw_data()
-                        self.logger.info(f"Stopped recording. Saved to {log_path}")
-                        break
-        else:
-            try:
-                for evs in mv_iterator:
-                    pass
-            except KeyboardInterrupt:
-                self.logger.info("Interrupted by user.")
-            except Exception as e:
-                self.logger.error(f"Error during recording: {e}")
-            finally:
-                self.device.get_i_events_stream().stop_log_raw_data()
-                self.logger.info(f"Stopped recording. Saved to {log_path}")
-
-    def play(self, input_file: str = ""):
-        if input_file == "":
-            self.logger.error("No input file provided for playback.")
-            return
-        
-        if not os.path.exists(input_file):
-            self.logger.error(f"Input file does not exist: {input_file}")
-            return
-        
-        self.logger.info("Setup events iterator")
-        self.mv_iterator = EventsIterator(input_path=input_file, delta_t=1000)
-        height, width = self.mv_iterator.get_size() # Camera Geometry
-        
-        if not is_live_camera(input_file):
-            self.mv_iterator = LiveReplayEventsIterator(self.mv_iterator)
-        
-        self.logger.info("Open window")
-        with MTWindow(
-            title="Metavision Events Viewer", 
-            width=width, 
-            height=height,
-            mode=BaseWindow.RenderMode.BGR
-        ) as window:
-            
-            def keyboard_cb(key, scancode, action, mods):
-                if key == UIKeyEvent.KEY_ESCAPE or key == UIKeyEvent.KEY_Q:
-                    window.set_close_flag()
-
-            window.set_keyboard_callback(keyboard_cb)
-
-            # Event Frame Generator
-            event_frame_gen = PeriodicFrameGenerationAlgorithm(
-                sensor_width=width, 
-                sensor_height=height, 
-                fps=25,
-                palette=ColorPalette.Dark
-            )
-
-            def on_cd_frame_cb(ts, cd_frame):
-                window.show_async(cd_frame)
-
-            event_frame_gen.set_output_callback(on_cd_frame_cb)
-            
-            # Process events
-            for evs in self.mv_iterator:
-                self.display_logs_in_window()
-                
-                # Dispatch system events to the window
-                EventLoop.poll_and_dispatch()
-                event_frame_gen.process_events(evs)
-
-                if window.should_close():
-                    break
-
-    def live(self):
-        if not self.device:
-            self.logger.warning("No device available for living.")
-            return
-        
-        # Events iterator on Device
-        mv_iterator = EventsIterator.from_device(device=self.device)
-        height, width = mv_iterator.get_size()  # Camera Geometry
-
-        self.logger.info("Open window")
-        with MTWindow(title="Metavision Events Viewer",
-                        width=width,
-                        height=height,
-                        mode=BaseWindow.RenderMode.BGR) as window:
-            def keyboard_cb(key, scancode, action, mods):
-                if key == UIKeyEvent.KEY_ESCAPE or key == UIKeyEvent.KEY_Q:
-                    window.set_close_flag()
-
-            window.set_keyboard_callback(keyboard_cb)
-
-            # Event Frame Generator
-            event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=width,
-                                                            sensor_height=height,
-                                                            fps=25,
-                                                            palette=ColorPalette.Dark)
-
-            def on_cd_frame_cb(ts, cd_frame):
-                window.show_async(cd_frame)
-
-            event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-            # Process events
-            for evs in mv_iterator:
-                # Dispatch system events to the window
-                EventLoop.poll_and_dispatch()
-                event_frame_gen.process_events(evs)
-
-                if window.should_close():
-                    # Stop the recording
-                    self.logger.info(f"Stopped living")
-                    break
-    
-    def remote_live(self, quality="medium", fps=25):
-        if not self.device:
-            self.logger.warning("No device available for streaming.")
-            return
-
-        mv_iterator = EventsIterator.from_device(device=self.device)
-        height, width = mv_iterator.get_size()
-
-        receiver_ip = input("Enter the receiver's IP address to stream to: ")
-        # receiver_port = int(input("Enter the port to stream to: "))
-        receiver_port = 5000
-        self.logger.info(f"Streaming live frame to {receiver_ip}:{receiver_port} (quality={quality}, fps={fps})")
-
-        # Compression settings
-        if quality == "low":
-            preset, crf = "slow", 35
-        elif quality == "high":
-            preset, crf = "veryfast", 20
-        else:
-            preset, crf = "fast", 28
-
-        # ffmpeg command
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-f", "rawvideo",
-            "-pixel_format", "bgr24",
-            "-video_size", f"{width}x{height}",
-            "-r", "25",
-            "-i", "-",
-            "-c:v", "libx264",
-            "-preset", f"{preset}",
-            "-crf", f"{crf}",
-            "-tune", "zerolatency",
-            "-g", "25",
-            "-f", "mpegts",
-            f"udp://{receiver_ip}:{receiver_port}"
-        ]
-
-        proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
-
-        # Event Frame Generator
-        event_frame_gen = PeriodicFrameGenerationAlgorithm(
-            sensor_width=width,
-            sensor_height=height,
-            fps=fps,
-            palette=ColorPalette.Dark,
-        )
-
-        def on_cd_frame_cb(ts, cd_frame):
-            try:
-                proc.stdin.write(cd_frame.tobytes())
-            except (BrokenPipeError, IOError):
-                self.logger.error("SSH stream closed.")
-                proc.terminate()
-
-        event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-        for evs in mv_iterator:
-            EventLoop.poll_and_dispatch()
-            event_frame_gen.process_events(evs)
-            if proc.poll() is not None:
-                break
-
-        proc.stdin.close()
-        proc.wait()
-        self.logger.info("Stopped streaming.")
-
-    def remote_play(self, input_file="", quality="medium", fps=25):
-        if input_file == "":
-            self.logger.error("No input file provided for playback.")
-            return
-        
-        if not os.path.exists(input_file):
-            self.logger.error(f"Input file does not exist: {input_file}")
-            return
-
-        receiver_ip = input("Enter the receiver's IP address to stream to: ")
-        # receiver_port = int(input("Enter the port to stream to: "))
-        receiver_port = 5000
-        self.logger.info(f"Streaming {input_file} to {receiver_ip}:{receiver_port} (quality={quality}, fps={fps})")
-
-        if quality == "low":
-            preset, crf = "slow", 35
-        elif quality == "high":
-            preset, crf = "veryfast", 20
-        else:
-            preset, crf = "fast", 28
-
-        self.mv_iterator = EventsIterator(input_path=input_file, delta_t=1000)
-        height, width = self.mv_iterator.get_size()
-
-        if not is_live_camera(input_file):
-            self.mv_iterator = LiveReplayEventsIterator(self.mv_iterator)
-
-        # ffmpeg command
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-f", "rawvideo",
-            "-pixel_format", "bgr24",
-            "-video_size", f"{width}x{height}",
-            "-r", "25",
-            "-i", "-",
-            "-c:v", "libx264",
-            "-preset", f"{preset}",
-            "-crf", f"{crf}",
-            "-tune", "zerolatency",
-            "-g", "25",
-            "-f", "mpegts",
-            f"udp://{receiver_ip}:{receiver_port}"
-        ]
-
-        proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
-
-        event_frame_gen = PeriodicFrameGenerationAlgorithm(
-            sensor_width=width,
-            sensor_height=height,
-            fps=fps,
-            palette=ColorPalette.Dark
-        )
-
-        def on_cd_frame_cb(ts, cd_frame):
-            try:
-                proc.stdin.write(cd_frame.tobytes())
-            except (BrokenPipeError, IOError):
-                self.logger.error("UDP stream closed.")
-                proc.terminate()
-
-        event_frame_gen.set_output_callback(on_cd_frame_cb)
-
-        for evs in self.mv_iterator:
-            EventLoop.poll_and_dispatch()
-            event_frame_gen.process_events(evs)
-            if proc.poll() is not None:
-                break
-
-        proc.stdin.close()
-        proc.wait()
-        self.logger.info("Stopped streaming.")
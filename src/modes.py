@@ -0,0 +1,252 @@
+from metavision_core.event_io import EventsIterator, LiveReplayEventsIterator, is_live_camera
+import os
+import time
+from pathlib import Path
+
+try:
+    from .event_file import EventFileReader
+    from .simulator import open_device, iterator_from_device
+    from .batching import BatchPolicy
+    from .encoder_service import EncoderService
+    from .pipeline import (Pipeline, WindowSink, RawLogSink, FfmpegStreamSink,
+                           PreviewStreamSink, EventStreamSink)
+except ImportError:
+    from event_file import EventFileReader
+    from simulator import open_device, iterator_from_device
+    from batching import BatchPolicy
+    from encoder_service import EncoderService
+    from pipeline import (Pipeline, WindowSink, RawLogSink, FfmpegStreamSink,
+                          PreviewStreamSink, EventStreamSink)
+
+
+def recording_path(output_dir="", localtime=None):
+    """Timestamped recording path, suffixed if a file with the same name already exists"""
+    stem = "recording_" + time.strftime("%y%m%d_%H%M%S", localtime or time.localtime())
+    log_path = os.path.join(output_dir, stem + ".raw")
+
+    index = 1
+    while os.path.exists(log_path):
+        log_path = os.path.join(output_dir, f"{stem}_{index}.raw")
+        index += 1
+
+    return log_path
+
+
+class PipelineModes:
+    """
+    Pipeline based modes shared by Camera and CameraHandler: recording,
+    play, live, recording with a preview and the video and event streams.
+
+    The class using it sets `logger` before calling this __init__. Modes
+    started without a `stop_event` stop on `self.stop_event`, if any.
+    """
+
+    stop_event = None
+
+    def __init__(self, device=None, simulate=None, batching=None):
+        try:
+            # HAL Device on live camera, or a simulated one without hardware
+            self.device = device or open_device(simulate)
+        except Exception as e:
+            self.logger.error(f"Failed to initiate device: {e}")
+            self.logger.info("Continue without camera")
+            self.device = None
+
+        # Default batching of every mode, see BatchPolicy.parse
+        self.batching = batching
+
+        # Running video stream, viewers join and leave through its relay
+        self.stream_sink = None
+        # ffmpeg kept warm between streaming sessions
+        self.encoder_service = EncoderService()
+
+    def batch_policy(self, batching=None, delta_t=10000):
+        """Batching of a mode: its own setting, else the default of the object, else `delta_t` batches"""
+        return BatchPolicy.parse(batching if batching is not None else self.batching, default_delta_t=delta_t)
+
+    def run_pipeline(self, sinks, source=None, batching=None, stop_event=None, on_batch=None):
+        """
+        Fan one event source out to `sinks`, e.g. a WindowSink, a RawLogSink
+        and a FfmpegStreamSink to view, record and stream at the same time.
+        The source defaults to the device.
+        """
+        policy = self.batch_policy(batching)
+        if source is None:
+            if not self.device:
+                self.logger.warning("No device available.")
+                return 0
+            source = iterator_from_device(self.device, **policy.iterator_kwargs())
+
+        if stop_event is None:
+            stop_event = self.stop_event
+        return Pipeline(source, sinks, policy=policy, on_batch=on_batch).run(stop_event)
+
+    def replay_iterator(self, input_file, start_ts=0, policy=None):
+        """Iterator over a recording, paced like the live camera"""
+        kwargs = policy.iterator_kwargs() if policy else {}
+        if start_ts > 0:
+            # Jump through the seek index instead of decoding everything before start_ts
+            return EventFileReader(input_file, start_ts=start_ts, realtime=True, **kwargs)
+
+        mv_iterator = EventsIterator(input_path=input_file, **kwargs)
+        if not is_live_camera(input_file):
+            mv_iterator = LiveReplayEventsIterator(mv_iterator)
+        return mv_iterator
+
+    def record(self, output_dir=None, DISPLAY=True, segment_s=None, segment_mb=None, batching=None,
+               stop_event=None, on_batch=None):
+        """Record to `output_dir` (the assets folder by default), in a window unless not `DISPLAY`"""
+        if not self.device:
+            self.logger.warning("No device available for recording.")
+            return None
+
+        # Start the recording
+        if output_dir is None:
+            output_dir = str(Path(__file__).parent.parent / "assets")
+        log_path = recording_path(output_dir)
+
+        # Rotating segments are written from the decoded events, plain recordings by the device
+        sinks = [RawLogSink(log_path, device=self.device, segment_s=segment_s, segment_mb=segment_mb)]
+        if DISPLAY:
+            self.logger.info("Open window")
+            sinks.append(WindowSink())
+
+        self.run_pipeline(sinks, batching=batching, stop_event=stop_event, on_batch=on_batch)
+        return log_path
+
+    def remote_record(self, receivers=None, receiver_port=5000, output_dir="assets/", preview_fps=10,
+                      quality="low", segment_s=None, segment_mb=None, batching=None, stop_event=None,
+                      pixel_format="gray", listen_port=None, preview_binning=2, on_batch=None):
+        """
+        Record at full event fidelity while streaming a low rate H.264
+        preview, from one device stream. The preview is generated and encoded
+        at a lower priority and drops frames when it cannot keep up.
+        """
+        if not self.device:
+            self.logger.warning("No device available for recording.")
+            return None
+
+        if receivers is None and listen_port is None:
+            receivers = input("Enter the receivers' IP addresses to stream to (comma separated): ")
+
+        log_path = recording_path(output_dir)
+        sinks = [
+            RawLogSink(log_path, device=self.device, segment_s=segment_s, segment_mb=segment_mb),
+            PreviewStreamSink(receivers, receiver_port, quality=quality, fps=preview_fps,
+                              pixel_format=pixel_format, listen_port=listen_port,
+                              encoder_service=self.encoder_service, binning=preview_binning),
+        ]
+        self.stream_sink = sinks[1]
+        self.run_pipeline(sinks, batching=batching, stop_event=stop_event, on_batch=on_batch)
+        return log_path
+
+    def play(self, input_file: str = "", start_ts=0, batching=None, stop_event=None, on_batch=None):
+        if input_file == "":
+            self.logger.error("No input file provided for playback.")
+            return
+
+        if not os.path.exists(input_file):
+            self.logger.error(f"Input file does not exist: {input_file}")
+            return
+
+        self.logger.info("Setup events iterator")
+        policy = self.batch_policy(batching, delta_t=1000)
+        self.mv_iterator = self.replay_iterator(input_file, start_ts, policy)
+
+        self.logger.info("Open window")
+        self.run_pipeline([WindowSink()], source=self.mv_iterator, batching=policy,
+                          stop_event=stop_event, on_batch=on_batch)
+
+    def live(self, batching=None, stop_event=None, on_batch=None):
+        if not self.device:
+            self.logger.warning("No device available for living.")
+            return
+
+        self.logger.info("Open window")
+        self.run_pipeline([WindowSink()], batching=batching, stop_event=stop_event, on_batch=on_batch)
+        self.logger.info(f"Stopped living")
+
+    def remote_live(self, quality="medium", fps=25, batching=None, pixel_format="bgr24", adaptive=False,
+                    time_stamps=False, receivers=None, receiver_port=5000, listen_port=None, binning=1,
+                    stop_event=None, on_batch=None):
+        """
+        Stream the live events as video to the UDP `receivers` ("ip",
+        "ip:port" or a list) and to TCP viewers on `listen_port`, encoded once
+        whatever the number of viewers; see add_receiver/remove_receiver.
+        `binning` 2 or 4 sends smaller frames, binned from the events.
+        """
+        if not self.device:
+            self.logger.warning("No device available for streaming.")
+            return
+
+        if receivers is None and listen_port is None:
+            receivers = input("Enter the receivers' IP addresses to stream to (comma separated): ")
+
+        self.stream_sink = FfmpegStreamSink(receivers, receiver_port, quality=quality, fps=fps,
+                                            pixel_format=pixel_format, adaptive=adaptive,
+                                            time_stamps=time_stamps, listen_port=listen_port,
+                                            encoder_service=self.encoder_service, binning=binning)
+        self.run_pipeline([self.stream_sink], batching=batching, stop_event=stop_event, on_batch=on_batch)
+
+    def remote_play(self, input_file="", quality="medium", fps=25, start_ts=0, batching=None,
+                    pixel_format="bgr24", adaptive=False, time_stamps=False, receivers=None, receiver_port=5000,
+                    listen_port=None, binning=1, stop_event=None, on_batch=None):
+        if input_file == "":
+            self.logger.error("No input file provided for playback.")
+            return
+
+        if not os.path.exists(input_file):
+            self.logger.error(f"Input file does not exist: {input_file}")
+            return
+
+        if receivers is None and listen_port is None:
+            receivers = input("Enter the receivers' IP addresses to stream to (comma separated): ")
+
+        policy = self.batch_policy(batching, delta_t=1000)
+        self.mv_iterator = self.replay_iterator(input_file, start_ts, policy)
+        self.stream_sink = FfmpegStreamSink(receivers, receiver_port, quality=quality, fps=fps,
+                                            pixel_format=pixel_format, adaptive=adaptive,
+                                            time_stamps=time_stamps, listen_port=listen_port,
+                                            encoder_service=self.encoder_service, binning=binning)
+        self.run_pipeline([self.stream_sink], source=self.mv_iterator, batching=policy,
+                          stop_event=stop_event, on_batch=on_batch)
+
+    def add_receiver(self, ip, port=5000):
+        """Send the running video stream to one more UDP receiver"""
+        relay = self.stream_sink.relay if self.stream_sink else None
+        if relay is None:
+            self.logger.warning("No video stream running.")
+            return False
+        relay.add(ip, port)
+        return True
+
+    def remove_receiver(self, ip, port=5000):
+        relay = self.stream_sink.relay if self.stream_sink else None
+        return relay is not None and relay.remove(ip, port)
+
+    def remote_events(self, input_file="", receiver_ip=None, receiver_port=5001, protocol="tcp",
+                      compression="zstd", start_ts=0, batching=None, stop_event=None, on_batch=None):
+        """
+        Stream the events themselves instead of video, from the device or
+        from `input_file` when given. Run scripts/host_receive.py --events
+        on the receiver first when using TCP.
+        """
+        if input_file:
+            if not os.path.exists(input_file):
+                self.logger.error(f"Input file does not exist: {input_file}")
+                return
+        elif not self.device:
+            self.logger.warning("No device available for streaming.")
+            return
+
+        if receiver_ip is None:
+            receiver_ip = input("Enter the receiver's IP address to stream to: ")
+
+        sink = EventStreamSink(receiver_ip, receiver_port, protocol=protocol, compression=compression)
+        if input_file:
+            policy = self.batch_policy(batching, delta_t=1000)
+            self.mv_iterator = self.replay_iterator(input_file, start_ts, policy)
+            self.run_pipeline([sink], source=self.mv_iterator, batching=policy,
+                              stop_event=stop_event, on_batch=on_batch)
+        else:
+            self.run_pipeline([sink], batching=batching, stop_event=stop_event, on_batch=on_batch)
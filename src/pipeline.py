@@ -0,0 +1,617 @@
+from metavision_sdk_core import PeriodicFrameGenerationAlgorithm, ColorPalette
+from metavision_sdk_ui import EventLoop, BaseWindow, MTWindow, UIKeyEvent
+import os
+import queue
+import threading
+import time
+import logging
+import numpy as np
+
+try:
+    from .event_file import open_event_writer, lock_for_writing
+    from .render import IndexedFrameRenderer, downscale, recolor, stamp_time
+    from .stream_control import StreamController, StreamSettings
+    from .event_stream import EventStreamSender
+    from .stream_relay import StreamRelay
+    from .encoder_service import EncoderService, EncoderConfig
+    from .event_stats import EventStatistics
+    from .recording_summary import SummaryWorker
+except ImportError:
+    from event_file import open_event_writer, lock_for_writing
+    from render import IndexedFrameRenderer, downscale, recolor, stamp_time
+    from stream_control import StreamController, StreamSettings
+    from event_stream import EventStreamSender
+    from stream_relay import StreamRelay
+    from encoder_service import EncoderService, EncoderConfig
+    from event_stats import EventStatistics
+    from recording_summary import SummaryWorker
+
+
+class Sink:
+    """
+    Consumer of the event batches of a Pipeline.
+
+    `open` and `close` run on the pipeline thread, `process` on a worker
+    thread of its own fed through a queue of `queue_size` batches. When the
+    queue is full, lossy sinks drop their oldest batch, counted in
+    `dropped`, while lossless ones make the source wait. A positive `nice`
+    lowers the priority of the worker thread.
+    """
+    name = "sink"
+    queue_size = 4
+    lossless = False
+    wants_events = True
+    nice = 0
+    dropped = 0
+
+    def open(self, width, height):
+        pass
+
+    def process(self, evs):
+        pass
+
+    def poll(self):
+        """Called on the pipeline thread after every batch"""
+        pass
+
+    def should_stop(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class WindowSink(Sink):
+    """Frames of the events in a Metavision window, closed with Escape or q"""
+    name = "window"
+
+    def __init__(self, title="Metavision Events Viewer", fps=25, palette=ColorPalette.Dark):
+        self.title = title
+        self.fps = fps
+        self.palette = palette
+        self.window = None
+        self.event_frame_gen = None
+
+    def open(self, width, height):
+        self.window = MTWindow(title=self.title, width=width, height=height, mode=BaseWindow.RenderMode.BGR)
+        self.window.__enter__()
+
+        def keyboard_cb(key, scancode, action, mods):
+            if key == UIKeyEvent.KEY_ESCAPE or key == UIKeyEvent.KEY_Q:
+                self.window.set_close_flag()
+
+        self.window.set_keyboard_callback(keyboard_cb)
+
+        # Event Frame Generator
+        self.event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=width,
+                                                                sensor_height=height,
+                                                                fps=self.fps,
+                                                                palette=self.palette)
+
+        def on_cd_frame_cb(ts, cd_frame):
+            self.window.show_async(cd_frame)
+
+        self.event_frame_gen.set_output_callback(on_cd_frame_cb)
+
+    def process(self, evs):
+        self.event_frame_gen.process_events(evs)
+
+    def poll(self):
+        # Dispatch system events to the window
+        EventLoop.poll_and_dispatch()
+
+    def should_stop(self):
+        return self.window.should_close()
+
+    def close(self):
+        if self.window is not None:
+            self.window.__exit__(None, None, None)
+            self.window = None
+
+
+class RawLogSink(Sink):
+    """
+    Record the events to a RAW file, with its RecordingSummary sidecar.
+
+    With a `device` and no segmentation, the device logs its own stream and
+    the batches only feed the summary; otherwise they are encoded by an
+    EventFileWriter, rotated with `segment_s` and/or `segment_mb`, each
+    segment with its own summary. Summaries are built by a SummaryWorker,
+    lossy and at a lower priority, so they never hold back the RAW logging.
+    """
+    name = "raw_log"
+    queue_size = 64
+    lossless = True
+
+    def __init__(self, path, device=None, segment_s=None, segment_mb=None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.device = device if segment_s is None and segment_mb is None else None
+        self.segment_s = segment_s
+        self.segment_mb = segment_mb
+        self.writer = None
+        self.lock = None
+        self.summaries = None
+
+    def open(self, width, height):
+        self.logger.info(f"Recording to {self.path}")
+        self.summaries = SummaryWorker(width, height)
+        if self.device is not None:
+            self.device.get_i_events_stream().log_raw_data(self.path)
+            self.lock = lock_for_writing(self.path)
+        else:
+            self.writer = open_event_writer(self.path, width, height, segment_s=self.segment_s,
+                                            segment_mb=self.segment_mb, summaries=self.summaries)
+
+    def process(self, evs):
+        if self.writer is not None:
+            self.writer.write(evs)
+        else:
+            # Pipeline batches are never reused, no need to copy them again
+            self.summaries.update(self.path, evs, copy=False)
+
+    def close(self):
+        if self.device is not None:
+            self.device.get_i_events_stream().stop_log_raw_data()
+            self.lock.close()
+            self.logger.info(f"Stopped recording. Saved to {self.path}")
+        elif self.writer is not None:
+            self.writer.close()
+            if getattr(self.writer, "segments", None):
+                self.logger.info(f"Stopped recording. Saved {self.writer.event_count} events "
+                                 f"to {len(self.writer.segments)} segments of {self.path}")
+            else:
+                self.logger.info(f"Stopped recording. Saved {self.writer.event_count} events to {self.path}")
+        if self.summaries is not None:
+            self.summaries.close()
+
+
+class FfmpegStreamSink(Sink):
+    """
+    Frames of the events encoded by ffmpeg (libx264) and sent as MPEG-TS.
+
+    The stream is encoded once and fanned out by a StreamRelay to the UDP
+    `receivers` ("ip", "ip:port" or a list of them) and, with a
+    `listen_port`, to TCP viewers connecting to the camera. Viewers can join
+    and leave through `relay` while streaming.
+
+    Frames reach ffmpeg through a FrameWriter, so a stalled encoder or
+    network drops the oldest frames instead of blocking event processing.
+    With pixel_format="gray", palette-indexed single channel frames are
+    sent instead of BGR ones and encoded as yuv420p, a third of the pipe
+    traffic; the receiver recolours them (scripts/host_receive.py --gray).
+
+    With `adaptive` (True or a StreamController), fps, frame size and CRF
+    follow the load of the encoder; ffmpeg is restarted with the new
+    settings on every change. A shared `encoder_service` keeps the encoder
+    running between sessions. `binning` (2, 4) streams frames that much
+    smaller, binned from the events without rendering the full frame
+    (see IndexedFrameRenderer). With `time_stamps`, the wall clock time of
+    every frame is drawn in its top left corner, for the receiver to
+    measure the latency (scripts/host_receive.py --latency).
+    """
+    name = "ffmpeg_stream"
+
+    QUALITY_PRESETS = {
+        "low": ("slow", 35),
+        "medium": ("fast", 28),
+        "high": ("veryfast", 20),
+    }
+
+    def __init__(self, receivers=None, receiver_port=5000, quality="medium", fps=25, palette=ColorPalette.Dark,
+                 frame_queue=2, pixel_format="bgr24", adaptive=None, time_stamps=False, listen_port=None,
+                 encoder_service=None, binning=1):
+        if pixel_format not in ("bgr24", "gray"):
+            raise ValueError(f"Unsupported pixel format: {pixel_format}")
+        self.logger = logging.getLogger(__name__)
+        self.receivers = receivers
+        self.receiver_port = receiver_port
+        self.listen_port = listen_port
+        self.relay = None
+        self.quality = quality
+        self.fps = fps
+        self.palette = palette
+        self.frame_queue = frame_queue
+        self.pixel_format = pixel_format
+        self.adaptive = adaptive
+        self.time_stamps = time_stamps
+        self.binning = binning
+        # Without a shared service, the encoder lives as long as the sink
+        self.encoder_service = encoder_service or EncoderService(keep_warm_s=0)
+        self.encoder = None
+        self.controller = None
+        self.lock = threading.Lock()
+        self.event_frame_gen = None
+        self.sensor_size = None
+        self.settings = None
+        self.writer_base = None
+        self.sent_frames = 0
+        self.dropped_total = 0
+        self.late_total = 0
+
+    def open(self, width, height):
+        self.preset, crf = self.QUALITY_PRESETS.get(self.quality, self.QUALITY_PRESETS["medium"])
+        self.sensor_size = (width, height)
+        if isinstance(self.adaptive, StreamController):
+            self.controller = self.adaptive
+        elif self.adaptive:
+            self.controller = StreamController(fps=self.fps, crf=crf)
+
+        settings = self.controller.settings if self.controller else StreamSettings(self.fps, 1, crf)
+        self.relay = StreamRelay(self.receivers, self.receiver_port, listen_port=self.listen_port)
+        viewers = self.relay.viewers + ([f"tcp port {self.listen_port}"] if self.listen_port is not None else [])
+        # The size actually encoded, after binning and the scale of the settings
+        config = self.encoder_config(settings)
+        self.logger.info(f"Streaming to {', '.join(viewers) or 'no viewer yet'} "
+                         f"(quality={self.quality}, {config.width}x{config.height}, binning {self.binning}, "
+                         f"{settings.fps} fps, crf {settings.crf}, {self.pixel_format}"
+                         f"{', adaptive' if self.controller else ''})")
+        self.start(settings)
+
+    def encoder_config(self, settings):
+        width, height = self.sensor_size
+        scale = settings.scale * self.binning
+        # yuv420p needs even dimensions
+        return EncoderConfig(width // scale & ~1, height // scale & ~1, pixel_format=self.pixel_format,
+                             fps=settings.fps, preset=self.preset, crf=settings.crf,
+                             frame_queue=self.frame_queue, nice=self.nice)
+
+    def start(self, settings):
+        width, height = self.sensor_size
+        self.settings = settings
+        config = self.encoder_config(settings)
+        self.encoder = self.encoder_service.acquire(config)
+        self.encoder.attach(self.relay)
+        self.writer_base = self.encoder.frame_writer.stats()
+
+        scale = settings.scale * self.binning
+        # Bin in the event domain, and recolour binned BGR frames here, unless
+        # only the SDK renders the palette
+        colour = self.pixel_format == "bgr24" and scale > 1 and self.palette == ColorPalette.Dark
+        if self.pixel_format == "gray" or colour:
+            self.event_frame_gen = IndexedFrameRenderer(width, height, fps=settings.fps, binning=scale)
+            rendered_shape = self.event_frame_gen.frame.shape
+            frame_scale = 1
+        else:
+            # Event Frame Generator
+            self.event_frame_gen = PeriodicFrameGenerationAlgorithm(sensor_width=width,
+                                                                    sensor_height=height,
+                                                                    fps=settings.fps,
+                                                                    palette=self.palette)
+            rendered_shape = (height, width, 3)
+            frame_scale = scale
+
+        scaled = None
+        if frame_scale > 1:
+            scaled = np.empty((height // scale, width // scale, 3), dtype=np.uint8)
+        coloured = np.empty(rendered_shape + (3,), dtype=np.uint8) if colour else None
+        stamped = None
+        if self.time_stamps and scaled is None and coloured is None:
+            stamped = np.empty(rendered_shape, dtype=np.uint8)
+        rows, cols = config.height, config.width
+        frame_writer = self.encoder.frame_writer
+
+        def on_cd_frame_cb(ts, cd_frame):
+            frame = downscale(cd_frame, frame_scale, out=scaled)
+            if coloured is not None:
+                frame = recolor(frame, out=coloured)
+            if self.time_stamps:
+                # Never draw on the buffer of the frame generator
+                if frame is cd_frame:
+                    np.copyto(stamped, cd_frame)
+                    frame = stamped
+                stamp_time(frame, time.time() * 1000)
+            frame_writer.submit(frame[:rows, :cols])
+
+        self.event_frame_gen.set_output_callback(on_cd_frame_cb)
+
+    def count_frames(self):
+        """Add the frames of the current encoder since this session started using it"""
+        stats = self.encoder.frame_writer.stats()
+        self.sent_frames += stats["written"] - self.writer_base["written"]
+        self.dropped_total += stats["dropped"] - self.writer_base["dropped"]
+        self.late_total += stats["late"] - self.writer_base["late"]
+        self.writer_base = stats
+
+    def restart(self, settings):
+        with self.lock:
+            self.count_frames()
+            self.start(settings)
+        self.controller.reset()
+
+    @property
+    def dropped_frames(self):
+        if self.encoder is None:
+            return self.dropped_total
+        return self.dropped_total + self.encoder.frame_writer.dropped - self.writer_base["dropped"]
+
+    @property
+    def late_frames(self):
+        if self.encoder is None:
+            return self.late_total
+        return self.late_total + self.encoder.frame_writer.late - self.writer_base["late"]
+
+    def process(self, evs):
+        if not self.encoder.alive:
+            if self.encoder.first_frame_ms is None:
+                # Never worked, should_stop ends the stream
+                return
+            self.logger.warning("Encoder failed, resetting it")
+            with self.lock:
+                self.count_frames()
+                self.start(self.settings)
+        if self.controller is not None and self.controller.due():
+            # Reading the encoder CPU time parses /proc, only done once per interval
+            stats = self.encoder.frame_writer.stats()
+            stats["encode_time"] = self.encoder.cpu_time()
+            settings = self.controller.update(stats)
+            if settings is not None:
+                self.restart(settings)
+        self.event_frame_gen.process_events(evs)
+
+    def should_stop(self):
+        # The worker thread may be restarting the encoder
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            return not self.encoder.alive and self.encoder.first_frame_ms is None
+        finally:
+            self.lock.release()
+
+    def close(self):
+        if self.encoder is not None:
+            # Released first so that the frames drained on closing are counted
+            self.encoder_service.release(self.encoder)
+            self.count_frames()
+            self.encoder = None
+            self.logger.info(f"Sent {self.sent_frames} frames, dropped {self.dropped_total}, late {self.late_total}")
+        if self.relay is not None:
+            self.relay.close()
+            self.relay = None
+            self.logger.info("Stopped streaming.")
+
+
+class PreviewStreamSink(FfmpegStreamSink):
+    """
+    Low rate preview stream that never holds back the recording.
+
+    Frames are binned 2x2 by default, generated and encoded at a lower
+    priority, and only the latest frame waits for the encoder. If even frame generation falls behind, the oldest
+    batches are dropped from the preview queue; recording sinks are not
+    affected.
+    """
+    name = "preview"
+    queue_size = 16
+    nice = 10
+
+    def __init__(self, receivers=None, receiver_port=5000, quality="low", fps=10, palette=ColorPalette.Dark,
+                 pixel_format="gray", adaptive=None, listen_port=None, encoder_service=None, binning=2):
+        super().__init__(receivers, receiver_port, quality=quality, fps=fps, palette=palette, frame_queue=1,
+                         pixel_format=pixel_format, adaptive=adaptive, listen_port=listen_port,
+                         encoder_service=encoder_service, binning=binning)
+
+    def should_stop(self):
+        # A lost preview must not end the recording
+        return False
+
+
+class EventStreamSink(Sink):
+    """
+    The events themselves sent as compressed packets over TCP or UDP.
+
+    No rendering or video encoding on the device: the cost follows the
+    event rate, so sparse scenes are cheap, and the receiver gets every
+    event with its timestamp (scripts/host_receive.py --events).
+    """
+    name = "event_stream"
+    queue_size = 32
+
+    def __init__(self, receiver_ip, receiver_port=5001, protocol="tcp", compression="zstd"):
+        self.logger = logging.getLogger(__name__)
+        self.receiver_ip = receiver_ip
+        self.receiver_port = receiver_port
+        self.protocol = protocol
+        self.compression = compression
+        self.sender = None
+        self.error = None
+
+    def open(self, width, height):
+        self.sender = EventStreamSender(self.receiver_ip, self.receiver_port, protocol=self.protocol,
+                                        codec=self.compression, width=width, height=height)
+        self.logger.info(f"Streaming events to {self.receiver_ip}:{self.receiver_port} "
+                         f"({self.protocol}, {self.sender.encoder.codec})")
+
+    def process(self, evs):
+        try:
+            self.sender.send(evs)
+        except OSError as e:
+            self.error = e
+            raise
+
+    def should_stop(self):
+        return self.error is not None
+
+    def close(self):
+        if self.sender is not None:
+            if self.error is not None:
+                self.logger.error(f"Event stream closed: {self.error}")
+            self.sender.close()
+            sent = self.sender.events_sent
+            ratio = self.sender.bytes_sent / sent if sent else 0.0
+            self.logger.info(f"Sent {sent} events in {self.sender.bytes_sent / 1e6:.1f} MB "
+                             f"({ratio:.2f} bytes/event)")
+            self.sender = None
+
+
+class StatsSink(Sink):
+    """
+    Log the event rate and polarity balance every `interval_s`.
+
+    Full statistics (per-pixel counts, inter-event times, batch sizes) are
+    kept in `stats`, an EventStatistics.
+    """
+    name = "stats"
+
+    def __init__(self, interval_s=5.0):
+        self.logger = logging.getLogger(__name__)
+        self.interval_s = interval_s
+        self.stats = None
+        self.count = 0
+        self.on_count = 0
+        self.window_start = None
+
+    def open(self, width, height):
+        self.stats = EventStatistics(width, height)
+        self.window_start = time.perf_counter()
+
+    def process(self, evs):
+        if len(evs) == 0:
+            return
+        on_count = self.stats.on_count
+        self.stats.update(evs)
+        self.count += len(evs)
+        self.on_count += self.stats.on_count - on_count
+
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed >= self.interval_s:
+            self.log(elapsed)
+
+    def log(self, elapsed):
+        on_ratio = self.on_count / self.count if self.count else 0.0
+        self.logger.info(f"{self.count / elapsed / 1e6:.2f} Mev/s, {on_ratio * 100:.0f}% ON, "
+                         f"{self.stats.recent_rate / 1e6:.2f} Mev/s of sensor time, "
+                         f"{self.stats.event_count} events in total")
+        self.count = 0
+        self.on_count = 0
+        self.window_start = time.perf_counter()
+
+    def close(self):
+        if self.count:
+            self.log(time.perf_counter() - self.window_start)
+        if self.stats is not None and self.stats.event_count:
+            summary = self.stats.summary()
+            self.logger.info(f"{summary['active_pixels']} active pixels, hottest {summary['hot_pixels'][:3]}, "
+                             f"median inter-event time {summary['inter_event_us']['p50']} us")
+
+
+class SinkWorker:
+    """Thread feeding one sink from its bounded queue"""
+
+    def __init__(self, sink):
+        self.logger = logging.getLogger(__name__)
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=sink.queue_size)
+        self.thread = threading.Thread(target=self.run, name=f"sink-{sink.name}", daemon=True)
+        self.failed = False
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, evs):
+        if self.failed:
+            return
+        if self.sink.lossless:
+            self.queue.put(evs)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(evs)
+                return
+            except queue.Full:
+                # Keep the most recent batches, the oldest one is dropped
+                try:
+                    self.queue.get_nowait()
+                    self.sink.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        if self.sink.nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.sink.nice)
+            except (OSError, AttributeError) as e:
+                self.logger.warning(f"Could not lower the priority of sink {self.sink.name}: {e}")
+
+        while True:
+            evs = self.queue.get()
+            if evs is None:
+                break
+            if self.failed:
+                continue
+            try:
+                self.sink.process(evs)
+            except Exception as e:
+                self.logger.error(f"Sink {self.sink.name} failed: {e}")
+                self.failed = True
+
+    def finish(self):
+        if self.thread.ident is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        if self.sink.dropped:
+            self.logger.warning(f"Sink {self.sink.name} dropped {self.sink.dropped} batches")
+
+
+class Pipeline:
+    """
+    One event source fanned out to several sinks.
+
+    The source is read on the calling thread, and each batch is copied once
+    and shared by the queues of the sinks, so a slow sink never holds the
+    source back unless it is lossless. The pipeline stops when the source
+    ends, `stop_event` is set or any sink asks to stop.
+    """
+
+    def __init__(self, source, sinks, policy=None, on_batch=None):
+        self.logger = logging.getLogger(__name__)
+        self.source = source
+        self.sinks = list(sinks)
+        self.policy = policy
+        self.on_batch = on_batch
+        self.event_count = 0
+
+    def run(self, stop_event=None):
+        height, width = self.source.get_size()
+
+        opened = []
+        workers = []
+        try:
+            for sink in self.sinks:
+                sink.open(width, height)
+                opened.append(sink)
+            for sink in opened:
+                if sink.wants_events:
+                    workers.append(SinkWorker(sink))
+                    workers[-1].start()
+
+            batches = self.policy.batches(self.source) if self.policy else self.source
+            for evs in batches:
+                self.event_count += len(evs)
+                if workers:
+                    # Batches may be reused by the source once we ask for the next one
+                    batch = evs.copy()
+                    for worker in workers:
+                        worker.put(batch)
+
+                for sink in opened:
+                    sink.poll()
+                if self.on_batch is not None:
+                    self.on_batch(evs)
+
+                if stop_event is not None and stop_event.is_set():
+                    break
+                if any(sink.should_stop() for sink in opened):
+                    break
+        except KeyboardInterrupt:
+            self.logger.info("Interrupted by user.")
+        except Exception as e:
+            self.logger.error(f"Error in pipeline: {e}")
+        finally:
+            for worker in workers:
+                worker.finish()
+            for sink in reversed(opened):
+                sink.close()
+
+        return self.event_count
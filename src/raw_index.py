@@ -0,0 +1,194 @@
+import os
+import logging
+import numpy as np
+
+try:
+    from .evt_codec import DECODERS, read_raw_header, time_high_points
+except ImportError:
+    from evt_codec import DECODERS, read_raw_header, time_high_points
+
+INDEX_VERSION = 1
+
+
+def index_path(raw_path):
+    return os.path.splitext(raw_path)[0] + ".index.npz"
+
+
+class RawIndex:
+    """
+    Sensor time to byte offset index of a RAW recording.
+
+    Bucket `i` holds the last TIME_HIGH word at or before `t0 + i * step_us`,
+    a point where decoding can restart. Times given to `lookup` are relative
+    to `t0`, the first TIME_HIGH of the file, so 0 is the start of the
+    recording whatever the absolute sensor clock was.
+    """
+
+    def __init__(self, raw_path, evt_format, data_offset, step_us, t0, t_end,
+                 offsets, times, file_size, mtime):
+        self.raw_path = raw_path
+        self.evt_format = evt_format
+        self.data_offset = data_offset
+        self.step_us = step_us
+        self.t0 = t0
+        self.t_end = t_end
+        self.offsets = offsets  # Byte offset of the resync point of each bucket
+        self.times = times      # Unwrapped sensor time of that resync point
+        self.file_size = file_size
+        self.mtime = mtime
+
+    @property
+    def duration_us(self):
+        return self.t_end - self.t0
+
+    def lookup(self, ts):
+        """Byte offset and absolute time of a resync point at or before `ts`, in constant time"""
+        bucket = min(max(int(ts) // self.step_us, 0), len(self.offsets) - 1)
+        return int(self.offsets[bucket]), int(self.times[bucket])
+
+    def is_valid(self):
+        try:
+            stat = os.stat(self.raw_path)
+        except OSError:
+            return False
+        return stat.st_size == self.file_size and stat.st_mtime == self.mtime
+
+    def save(self, path=None):
+        path = path or index_path(self.raw_path)
+        with open(path, "wb") as f:
+            np.savez(f,
+                     version=INDEX_VERSION,
+                     evt_format=self.evt_format,
+                     data_offset=self.data_offset,
+                     step_us=self.step_us,
+                     t0=self.t0,
+                     t_end=self.t_end,
+                     offsets=self.offsets,
+                     times=self.times,
+                     file_size=self.file_size,
+                     mtime=self.mtime)
+
+    @classmethod
+    def load(cls, raw_path, path=None):
+        """Cached index next to the recording, or None if missing or stale"""
+        path = path or index_path(raw_path)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != INDEX_VERSION:
+                    return None
+                index = cls(raw_path,
+                            evt_format=str(data["evt_format"]),
+                            data_offset=int(data["data_offset"]),
+                            step_us=int(data["step_us"]),
+                            t0=int(data["t0"]),
+                            t_end=int(data["t_end"]),
+                            offsets=data["offsets"],
+                            times=data["times"],
+                            file_size=int(data["file_size"]),
+                            mtime=float(data["mtime"]))
+        except (OSError, KeyError, ValueError) as e:
+            logging.getLogger(__name__).warning(f"Ignoring unreadable index {path}: {e}")
+            return None
+
+        return index if index.is_valid() else None
+
+    @classmethod
+    def build(cls, raw_path, step_us=10000, chunk_bytes=16 * 1024 * 1024):
+        """Scan the TIME_HIGH words of a recording, without decoding the events"""
+        header = read_raw_header(raw_path)
+        decoder = DECODERS[header["format"]]()
+        word_size = decoder.word_dtype.itemsize
+
+        stat = os.stat(raw_path)
+        n_words = (stat.st_size - header["data_offset"]) // word_size
+        builder = RawIndexBuilder(step_us)
+
+        if n_words > 0:
+            words = np.memmap(raw_path, dtype=decoder.word_dtype, mode="r",
+                              offset=header["data_offset"], shape=(n_words,))
+            chunk_words = chunk_bytes // word_size
+            for start in range(0, n_words, chunk_words):
+                idx, times = time_high_points(words[start:start + chunk_words], header["format"], decoder)
+                builder.add_points(header["data_offset"] + (start + idx) * word_size, times)
+            del words
+
+        return builder.finish(raw_path, header["format"], header["data_offset"], stat)
+
+    @classmethod
+    def open(cls, raw_path, step_us=10000, save=True):
+        """Cached index if up to date, otherwise build it and cache it next to the file"""
+        index = cls.load(raw_path)
+        if index is not None:
+            return index
+
+        logger = logging.getLogger(__name__)
+        logger.info(f"Building seek index of {raw_path}")
+        index = cls.build(raw_path, step_us=step_us)
+
+        if save:
+            try:
+                index.save()
+            except OSError as e:
+                logger.warning(f"Could not cache seek index of {raw_path}: {e}")
+
+        return index
+
+
+class RawIndexBuilder:
+    """Fill the fixed step buckets of a RawIndex from resync points seen in file order"""
+
+    def __init__(self, step_us=10000):
+        self.step_us = step_us
+        self.t0 = None
+        self.t_end = None
+        self._offsets = []
+        self._times = []
+        self._last = None
+        self._next_bucket_ts = None
+
+    @property
+    def next_bucket_ts(self):
+        """Absolute time of the next bucket without a resync point yet"""
+        return self._next_bucket_ts
+
+    def add_point(self, offset, ts):
+        self.add_points(np.array([offset]), np.array([ts]))
+
+    def add_points(self, offsets, times):
+        if len(times) == 0:
+            return
+
+        if self.t0 is None:
+            self.t0 = int(times[0])
+            self._next_bucket_ts = self.t0
+            self._last = (int(offsets[0]), self.t0)
+
+        # Buckets starting before the last point of this chunk
+        last_bucket_ts = int(times[-1])
+        if last_bucket_ts >= self._next_bucket_ts:
+            bucket_ts = np.arange(self._next_bucket_ts, last_bucket_ts + 1, self.step_us)
+            pos = np.searchsorted(times, bucket_ts, side="right") - 1
+            before = pos < 0
+            self._offsets.append(np.where(before, self._last[0], offsets[np.maximum(pos, 0)]))
+            self._times.append(np.where(before, self._last[1], times[np.maximum(pos, 0)]))
+            self._next_bucket_ts = int(bucket_ts[-1]) + self.step_us
+
+        self._last = (int(offsets[-1]), int(times[-1]))
+        self.t_end = int(times[-1])
+
+    def finish(self, raw_path, evt_format, data_offset, stat=None):
+        stat = stat or os.stat(raw_path)
+        if self._offsets:
+            offsets = np.concatenate(self._offsets).astype(np.int64)
+            times = np.concatenate(self._times).astype(np.int64)
+        else:
+            offsets = np.array([data_offset], dtype=np.int64)
+            times = np.zeros(1, dtype=np.int64)
+
+        return RawIndex(raw_path, evt_format, data_offset, self.step_us,
+                        t0=self.t0 or 0, t_end=self.t_end or 0,
+                        offsets=offsets, times=times,
+                        file_size=stat.st_size, mtime=stat.st_mtime)
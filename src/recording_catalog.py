@@ -0,0 +1,158 @@
+import os
+import time
+import logging
+from dataclasses import dataclass
+
+try:
+    from .recording_summary import RecordingSummary, summary_path
+except ImportError:
+    from recording_summary import RecordingSummary, summary_path
+
+SORT_KEYS = ("name", "mtime", "size", "duration")
+
+
+@dataclass
+class RecordingEntry:
+    name: str
+    path: str
+    size: int
+    mtime: float
+    summary: dict = None
+    summary_mtime: float = None
+
+    @property
+    def duration_s(self):
+        return self.summary["duration_s"] if self.summary else None
+
+
+class RecordingCatalog:
+    """
+    In memory list of the recordings of a folder, with their size, mtime
+    and summary sidecar.
+
+    `refresh` is cheap enough to call on every UI tick: at most once per
+    `check_interval_s` it stats the folder, and only rescans it when the
+    folder mtime changed (a file was added, removed or renamed, which is
+    also how summaries are saved), or every `rescan_s` for filesystems
+    with a coarse mtime. A rescan stats the files but only reloads the
+    summaries that changed. Sorting and paging never touch the disk.
+    """
+
+    def __init__(self, folder, sort_key="name", reverse=False, page_size=20, check_interval_s=1.0, rescan_s=30.0):
+        self.logger = logging.getLogger(__name__)
+        self.folder = str(folder)
+        self.sort_key = sort_key
+        self.reverse = reverse
+        self.page_size = page_size
+        self.check_interval_s = check_interval_s
+        self.rescan_s = rescan_s
+        self.by_name = {}
+        self.entries = []
+        self.folder_mtime = None
+        self.checked_at = None
+        self.scanned_at = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def refresh(self, force=False):
+        """Pick up changes of the folder, returns True if the list changed"""
+        now = time.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < self.check_interval_s:
+            return False
+        self.checked_at = now
+
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            mtime = None
+        if not force and mtime == self.folder_mtime and now - self.scanned_at < self.rescan_s:
+            return False
+        self.folder_mtime = mtime
+        self.scanned_at = now
+        return self.scan()
+
+    def scan(self):
+        try:
+            names = set(os.listdir(self.folder))
+        except OSError as e:
+            self.logger.warning(f"Could not list {self.folder}: {e}")
+            names = set()
+
+        changed = False
+        for name in list(self.by_name):
+            if name not in names:
+                del self.by_name[name]
+                changed = True
+
+        for name in names:
+            # Dot files are recordings still being written, e.g. by the armed recorder
+            if not name.endswith(".raw") or name.startswith("."):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self.by_name.get(name)
+            if entry is None:
+                entry = self.by_name[name] = RecordingEntry(name, path, stat.st_size, stat.st_mtime)
+                changed = True
+            elif (entry.size, entry.mtime) != (stat.st_size, stat.st_mtime):
+                entry.size, entry.mtime = stat.st_size, stat.st_mtime
+                changed = True
+
+            sidecar = os.path.basename(summary_path(path))
+            if sidecar not in names:
+                changed |= entry.summary is not None
+                entry.summary = entry.summary_mtime = None
+                continue
+            try:
+                summary_mtime = os.stat(os.path.join(self.folder, sidecar)).st_mtime
+            except OSError:
+                continue
+            if summary_mtime != entry.summary_mtime:
+                entry.summary = RecordingSummary.load(path)
+                entry.summary_mtime = summary_mtime
+                changed = True
+
+        if changed:
+            self.sort()
+        return changed
+
+    def sort(self, sort_key=None, reverse=None):
+        if sort_key is not None:
+            self.sort_key = sort_key
+        if reverse is not None:
+            self.reverse = reverse
+
+        entries = self.by_name.values()
+        if self.sort_key == "duration":
+            # Recordings without a summary yet go last, whatever the order
+            known = sorted((e for e in entries if e.duration_s is not None),
+                           key=lambda e: (e.duration_s, e.name), reverse=self.reverse)
+            self.entries = known + sorted((e for e in entries if e.duration_s is None), key=lambda e: e.name)
+        else:
+            self.entries = sorted(entries, key=lambda e: (getattr(e, self.sort_key), e.name), reverse=self.reverse)
+
+    def next_sort(self):
+        """Cycle through SORT_KEYS"""
+        self.sort(SORT_KEYS[(SORT_KEYS.index(self.sort_key) + 1) % len(SORT_KEYS)])
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.entries) // self.page_size))
+
+    def page(self, number):
+        start = number * self.page_size
+        return self.entries[start:start + self.page_size]
+
+    def index(self, name):
+        """Position of a recording in the sorted list, None if it is gone"""
+        for i, entry in enumerate(self.entries):
+            if entry.name == name:
+                return i
+        return None
@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+
+try:
+    from .event_file import EventFileReader, is_being_written
+    from .event_stats import EventStatistics
+except ImportError:
+    from event_file import EventFileReader, is_being_written
+    from event_stats import EventStatistics
+
+SUMMARY_VERSION = 1
+
+
+def summary_path(raw_path):
+    return os.path.splitext(raw_path)[0] + ".summary.json"
+
+
+class RecordingSummary:
+    """
+    Metadata of a RAW recording, computed incrementally while it is written.
+
+    On top of the EventStatistics totals, it keeps a rate timeline of at
+    most `timeline_points` bins, whose length doubles (neighbours merged)
+    whenever the recording outgrows it, the peak rate over `peak_window_us`
+    and a heatmap thumbnail about `thumbnail_width` pixels wide. With a
+    `save_interval_s`, the sidecar is rewritten (atomically) while
+    recording, so an interrupted recording still has one. `approximate`
+    is set when some batches of the recording were not seen.
+    """
+
+    def __init__(self, raw_path, width, height, timeline_points=256, bin_us=10000, peak_window_us=100000,
+                 thumbnail_width=64, save_interval_s=5.0):
+        self.logger = logging.getLogger(__name__)
+        self.raw_path = raw_path
+        self.width = width
+        self.height = height
+        self.stats = EventStatistics(width, height)
+        self.timeline = np.zeros(timeline_points + timeline_points % 2, dtype=np.int64)
+        self.bin_us = bin_us
+        self.peak_window_us = peak_window_us
+        self.peak_count = 0
+        self.window_index = None  # Peak window still receiving events
+        self.window_count = 0
+        self.thumbnail_width = thumbnail_width
+        self.save_interval_s = save_interval_s
+        self.saved_at = None
+        self.approximate = False
+
+    def update(self, evs):
+        self.update_columns(evs["x"], evs["y"], evs["p"], evs["t"])
+
+    def update_columns(self, x, y, p, t):
+        self.stats.update_columns(x, y, p, t)
+        if len(t) == 0:
+            return
+
+        t0 = self.stats.first_ts
+        while (int(t[-1]) - t0) // self.bin_us >= len(self.timeline):
+            self.merge_timeline()
+        bins = (t - t0) // self.bin_us
+        first = int(bins[0])
+        counts = np.bincount(bins - first)
+        self.timeline[first:first + len(counts)] += counts
+
+        # Every window before the last one of the batch is complete
+        windows = (t - t0) // self.peak_window_us
+        first = int(windows[0])
+        counts = np.bincount(windows - first)
+        if first == self.window_index:
+            counts[0] += self.window_count
+        else:
+            self.peak_count = max(self.peak_count, self.window_count)
+        if len(counts) > 1:
+            self.peak_count = max(self.peak_count, int(counts[:-1].max()))
+        self.window_index = first + len(counts) - 1
+        self.window_count = int(counts[-1])
+
+        if self.save_interval_s is not None and (
+                self.saved_at is None or time.monotonic() - self.saved_at >= self.save_interval_s):
+            self.save(complete=False)
+
+    def merge_timeline(self):
+        half = len(self.timeline) // 2
+        self.timeline[:half] = self.timeline[0::2] + self.timeline[1::2]
+        self.timeline[half:] = 0
+        self.bin_us *= 2
+
+    @property
+    def peak_rate(self):
+        """Events per second of the busiest `peak_window_us`"""
+        return max(self.peak_count, self.window_count) * 1e6 / self.peak_window_us
+
+    def thumbnail(self):
+        """Events per block of pixels, log scaled to 0-255, and the block size"""
+        block = max(1, -(-self.width // self.thumbnail_width))
+        rows, cols = -(-self.height // block), -(-self.width // block)
+        padded = np.zeros((rows * block, cols * block), dtype=np.int64)
+        padded[:self.height, :self.width] = self.stats.pixel_counts
+        counts = padded.reshape(rows, block, cols, block).sum(axis=(1, 3))
+        peak = counts.max()
+        if peak == 0:
+            return counts.astype(np.uint8), block
+        return (np.log1p(counts) * (255 / np.log1p(peak))).astype(np.uint8), block
+
+    def to_dict(self, complete=True):
+        stats = self.stats
+        used = (stats.last_ts - stats.first_ts) // self.bin_us + 1 if stats.event_count else 0
+        thumbnail, block = self.thumbnail()
+        return {
+            "version": SUMMARY_VERSION,
+            "path": os.path.basename(self.raw_path),
+            "complete": complete,
+            "approximate": self.approximate,
+            "width": self.width,
+            "height": self.height,
+            "duration_s": stats.duration_us / 1e6,
+            "event_count": stats.event_count,
+            "first_ts": stats.first_ts,
+            "last_ts": stats.last_ts,
+            "mean_rate": stats.rate,
+            "peak_rate": self.peak_rate,
+            "peak_window_us": self.peak_window_us,
+            "on_ratio": stats.on_ratio,
+            "active_pixels": int(np.count_nonzero(stats.pixel_counts)),
+            "hot_pixels": stats.hot_pixels(),
+            "timeline": {"bin_us": self.bin_us, "counts": self.timeline[:used].tolist()},
+            "thumbnail": {"block": block, "rows": thumbnail.tolist()},
+        }
+
+    def save(self, complete=True, path=None):
+        path = path or summary_path(self.raw_path)
+        self.saved_at = time.monotonic()
+        try:
+            # Written aside and renamed, readers never see half a file
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.to_dict(complete), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self.logger.warning(f"Could not save summary of {self.raw_path}: {e}")
+
+    @classmethod
+    def load(cls, raw_path, path=None):
+        """Summary dict of a recording, or None if missing or unreadable"""
+        path = path or summary_path(raw_path)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                summary = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.getLogger(__name__).warning(f"Ignoring unreadable summary {path}: {e}")
+            return None
+        return summary if summary.get("version") == SUMMARY_VERSION else None
+
+    @classmethod
+    def build(cls, raw_path, delta_t=100000):
+        """Summary of an existing recording, decoded in one pass"""
+        reader = EventFileReader(raw_path, delta_t=delta_t)
+        height, width = reader.get_size()
+        summary = cls(raw_path, width, height, save_interval_s=None)
+        for evs in reader:
+            summary.update(evs)
+        return summary
+
+
+class SummaryWorker:
+    """
+    Build the RecordingSummary sidecars of a recording session on a thread
+    of its own, so the recording loop only queues its batches.
+
+    Like a lossy pipeline sink, the queue holds `queue_size` batches and
+    drops the oldest one when full, which marks the summary of that file
+    approximate, and the thread runs with a positive `nice`. Every file
+    gets its own summary, started by its first batch and saved complete by
+    `finish`, under the path the file was renamed to if any. `stats` holds
+    the EventStatistics summary of the finished files, by path.
+    """
+
+    def __init__(self, width, height, queue_size=64, nice=10, save_interval_s=5.0, name="summary-worker"):
+        self.logger = logging.getLogger(__name__)
+        self.width = width
+        self.height = height
+        self.queue_size = queue_size
+        self.nice = nice
+        self.save_interval_s = save_interval_s
+        self.items = deque()    # ("update", path, batch) or ("finish", path, (final path, on_saved))
+        self.queued = 0         # Batches in items
+        self.lossy = set()      # Files with dropped batches
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self.closing = False
+        self.summaries = {}
+        self.stats = {}
+
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def update(self, raw_path, evs, copy=True):
+        """Queue a batch of `raw_path`, copied unless the caller never reuses it"""
+        if len(evs):
+            self.put(raw_path, evs.copy() if copy else evs)
+
+    def update_columns(self, raw_path, x, y, p, t):
+        if len(t):
+            self.put(raw_path, (x.copy(), y.copy(), p.copy(), t.copy()))
+
+    def put(self, raw_path, batch):
+        with self.condition:
+            if self.queued >= self.queue_size:
+                # Drop the oldest batch, never a finish
+                for i, item in enumerate(self.items):
+                    if item[0] == "update":
+                        del self.items[i]
+                        self.queued -= 1
+                        self.dropped += 1
+                        self.lossy.add(item[1])
+                        break
+            self.items.append(("update", raw_path, batch))
+            self.queued += 1
+            self.condition.notify()
+
+    def finish(self, raw_path, final_path=None, on_saved=None):
+        """
+        Save the summary of `raw_path` once its queued batches are in, as
+        `final_path` if given, then call `on_saved` with its statistics.
+        """
+        with self.condition:
+            self.items.append(("finish", raw_path, (final_path, on_saved)))
+            self.condition.notify()
+
+    def run(self):
+        if self.nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+            except (OSError, AttributeError) as e:
+                self.logger.warning(f"Could not lower the priority of the summary worker: {e}")
+
+        while True:
+            with self.condition:
+                while not self.items and not self.closing:
+                    self.condition.wait()
+                if not self.items:
+                    break
+                kind, raw_path, arg = self.items.popleft()
+                if kind == "update":
+                    self.queued -= 1
+                approximate = raw_path in self.lossy
+
+            try:
+                if kind == "finish":
+                    self.save(raw_path, *arg)
+                    continue
+                summary = self.summaries.get(raw_path)
+                if summary is None:
+                    summary = self.summaries[raw_path] = RecordingSummary(
+                        raw_path, self.width, self.height, save_interval_s=self.save_interval_s)
+                summary.approximate = approximate
+                if isinstance(arg, tuple):
+                    summary.update_columns(*arg)
+                else:
+                    summary.update(arg)
+            except Exception as e:
+                self.logger.error(f"Could not summarise {raw_path}: {e}")
+
+        # Files never finished are complete once the session is over
+        for raw_path in list(self.summaries):
+            self.save(raw_path)
+
+    def save(self, raw_path, final_path=None, on_saved=None):
+        summary = self.summaries.pop(raw_path, None)
+        if summary is None:
+            # No event at all, the sidecar still tells the file is summarised
+            summary = RecordingSummary(raw_path, self.width, self.height, save_interval_s=None)
+        summary.raw_path = final_path or raw_path
+        with self.condition:
+            summary.approximate = raw_path in self.lossy
+            self.lossy.discard(raw_path)
+        summary.save()
+        self.stats[summary.raw_path] = summary.stats.summary()
+        if on_saved is not None:
+            on_saved(self.stats[summary.raw_path])
+
+    def close(self):
+        """Save every summary after the queued batches, and stop the thread"""
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.thread.join()
+        if self.dropped:
+            self.logger.warning(f"Summary worker dropped {self.dropped} batches")
+
+
+def backfill_summaries(folder, stop_event=None):
+    """
+    Build and save the missing summaries of the recordings in `folder`,
+    returns how many were added. Files still open by a writer are left to
+    it, and incomplete summaries of files that are not (an interrupted
+    recording) are rebuilt.
+    """
+    logger = logging.getLogger(__name__)
+    added = 0
+    for name in sorted(os.listdir(folder)):
+        if stop_event is not None and stop_event.is_set():
+            break
+        # Dot files are recordings still being written, e.g. by the armed recorder
+        if not name.endswith(".raw") or name.startswith("."):
+            continue
+        raw_path = os.path.join(folder, name)
+        if os.path.exists(summary_path(raw_path)):
+            summary = RecordingSummary.load(raw_path)
+            if summary is None or summary["complete"]:
+                continue
+        if is_being_written(raw_path):
+            continue
+
+        logger.info(f"Building summary of {raw_path}")
+        try:
+            RecordingSummary.build(raw_path).save()
+            added += 1
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not summarise {raw_path}: {e}")
+    return added
+
+
+def start_backfill(folder, stop_event=None):
+    """Run backfill_summaries on a background thread"""
+    thread = threading.Thread(target=backfill_summaries, args=(folder, stop_event),
+                              name="summary-backfill", daemon=True)
+    thread.start()
+    return thread
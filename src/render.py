@@ -0,0 +1,130 @@
+import numpy as np
+
+# Background, OFF and ON colours (BGR) of ColorPalette.Dark
+DARK_PALETTE = np.array([[52, 37, 30], [200, 126, 64], [255, 255, 255]], dtype=np.uint8)
+
+# Gray levels of background, OFF and ON pixels in indexed frames, far enough
+# apart to survive the encoder
+GRAY_LEVELS = np.array([0, 128, 255], dtype=np.uint8)
+
+
+class IndexedFrameRenderer:
+    """
+    Single channel counterpart of PeriodicFrameGenerationAlgorithm.
+
+    Every 1/fps of sensor time, the events of that period are drawn on a
+    uint8 frame where each pixel holds the gray level of its palette entry
+    (background, OFF or ON, last event wins). One byte per pixel instead of
+    three, and the receiver recolours the frames with `recolor`.
+
+    With `binning` b > 1, events are drawn straight into a frame b times
+    smaller in each direction, each pixel covering a b x b block of the
+    sensor (ON over OFF over background, as `downscale`), so the full
+    resolution frame is never rendered, copied or encoded.
+    """
+
+    def __init__(self, sensor_width, sensor_height, fps=25, binning=1):
+        self.width = sensor_width
+        self.height = sensor_height
+        self.binning = binning
+        self.period_us = int(round(1e6 / fps))
+        self.frame = np.zeros((-(-sensor_height // binning), -(-sensor_width // binning)), dtype=np.uint8)
+        self.frame_end = None
+        self.callback = None
+
+    def set_output_callback(self, callback):
+        self.callback = callback
+
+    def process_events(self, evs):
+        if len(evs) == 0:
+            return
+
+        t = evs["t"]
+        if self.frame_end is None:
+            self.frame_end = (int(t[0]) // self.period_us + 1) * self.period_us
+
+        # Draw up to every frame boundary crossed by the batch, then keep drawing the current frame
+        begin = 0
+        while int(t[-1]) >= self.frame_end:
+            end = int(np.searchsorted(t, self.frame_end))
+            self.draw(evs[begin:end])
+            if self.callback is not None:
+                self.callback(self.frame_end, self.frame)
+            self.frame.fill(GRAY_LEVELS[0])
+            self.frame_end += self.period_us
+            begin = end
+        self.draw(evs[begin:])
+
+    def draw(self, evs):
+        if not len(evs):
+            return
+        if self.binning == 1:
+            self.frame[evs["y"], evs["x"]] = GRAY_LEVELS[1 + evs["p"]]
+            return
+
+        # Flat indices into the binned frame
+        index = (evs["y"] // self.binning).astype(np.intp) * self.frame.shape[1] + evs["x"] // self.binning
+        on = evs["p"] > 0
+        flat = self.frame.reshape(-1)
+        # OFF only where the block is not ON yet, then ON over everything
+        off = index[~on]
+        flat[off] = np.maximum(flat[off], GRAY_LEVELS[1])
+        flat[index[on]] = GRAY_LEVELS[2]
+
+
+def downscale(frame, factor, out=None):
+    """
+    Frame `factor` times smaller, each pixel the max of its factor x factor
+    block so that sparse events survive (ON over OFF over background, for
+    both indexed and Dark palette frames).
+    """
+    if factor == 1:
+        return frame
+    height, width = frame.shape[0] // factor, frame.shape[1] // factor
+    blocks = frame[:height * factor, :width * factor].reshape(height, factor, width, factor, *frame.shape[2:])
+    return blocks.max(axis=(1, 3), out=out)
+
+
+# Start pattern of a time stamp, then 32 bits of wall clock ms, MSB first
+STAMP_MARKER = (1, 0, 1, 0)
+STAMP_BITS = 32
+
+
+def stamp_time(frame, ms, block=8):
+    """
+    Write `ms` (wall clock, modulo 2**32) as black and white blocks along
+    the top left edge of `frame`, coarse enough to survive the encoder.
+    """
+    bits = STAMP_MARKER + tuple((int(ms) >> shift) & 1 for shift in range(STAMP_BITS - 1, -1, -1))
+    for i, bit in enumerate(bits):
+        frame[:block, i * block:(i + 1) * block] = 255 if bit else 0
+
+
+def read_time_stamp(frame, block=8):
+    """Time stamp written by `stamp_time`, None if the frame has none"""
+    count = len(STAMP_MARKER) + STAMP_BITS
+    if frame.shape[1] < count * block or frame.shape[0] < block:
+        return None
+    # Centre pixel of every block, averaged over the channels
+    centres = frame[block // 2, block // 2:count * block:block]
+    bits = (centres.reshape(count, -1).mean(axis=1) > 127).astype(int)
+    if tuple(bits[:len(STAMP_MARKER)]) != STAMP_MARKER:
+        return None
+    ms = 0
+    for bit in bits[len(STAMP_MARKER):]:
+        ms = ms << 1 | int(bit)
+    return ms
+
+
+def palette_lut(palette=DARK_PALETTE):
+    """Colour of every decoded gray value, snapped to the nearest palette entry"""
+    thresholds = (GRAY_LEVELS[:-1].astype(np.int16) + GRAY_LEVELS[1:]) // 2
+    return palette[np.searchsorted(thresholds, np.arange(256), side="right")]
+
+
+DARK_LUT = palette_lut(DARK_PALETTE)
+
+
+def recolor(gray, lut=DARK_LUT, out=None):
+    """BGR image of an indexed frame"""
+    return np.take(lut, gray, axis=0, out=out)
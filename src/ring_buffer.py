@@ -0,0 +1,109 @@
+import numpy as np
+
+# x, y and p as 16-bit, t as 64-bit columns
+BYTES_PER_EVENT = 2 + 2 + 2 + 8
+
+
+class EventRingBuffer:
+    """
+    Bounded history of the most recent CD events.
+
+    Events are kept as separate preallocated x/y/p/t columns, so pushing a
+    batch is a couple of slice copies and the memory footprint never changes.
+    The history is bounded by `capacity` events (or `max_bytes`) and,
+    optionally, by `max_duration_us` of sensor time.
+    """
+
+    def __init__(self, capacity=None, max_bytes=None, max_duration_us=None):
+        if capacity is None:
+            if max_bytes is None:
+                raise ValueError("Either capacity or max_bytes must be given")
+            capacity = int(max_bytes) // BYTES_PER_EVENT
+        if capacity <= 0:
+            raise ValueError(f"Invalid ring buffer capacity: {capacity}")
+
+        self.capacity = int(capacity)
+        self.max_duration_us = max_duration_us
+
+        self._x = np.zeros(self.capacity, dtype=np.uint16)
+        self._y = np.zeros(self.capacity, dtype=np.uint16)
+        self._p = np.zeros(self.capacity, dtype=np.int16)
+        self._t = np.zeros(self.capacity, dtype=np.int64)
+
+        self._start = 0  # Index of the oldest event
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return self._x.nbytes + self._y.nbytes + self._p.nbytes + self._t.nbytes
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def push(self, evs):
+        n = len(evs)
+        if n == 0:
+            return
+
+        if n >= self.capacity:
+            # The batch alone fills the buffer, keep its tail
+            self._copy_in(evs, n - self.capacity, 0, self.capacity)
+            self._start = 0
+            self._size = self.capacity
+        else:
+            end = (self._start + self._size) % self.capacity
+            first = min(n, self.capacity - end)
+            self._copy_in(evs, 0, end, first)
+            if first < n:
+                self._copy_in(evs, first, 0, n - first)
+
+            overflow = self._size + n - self.capacity
+            if overflow > 0:
+                self._start = (self._start + overflow) % self.capacity
+                self._size = self.capacity
+            else:
+                self._size += n
+
+        if self.max_duration_us is not None:
+            self._drop_older_than(int(evs["t"][-1]) - self.max_duration_us)
+
+    def segments(self):
+        """Views on the buffered events in chronological order, as (x, y, p, t) tuples"""
+        first = min(self._size, self.capacity - self._start)
+        views = [self._view(self._start, self._start + first)]
+        if first < self._size:
+            views.append(self._view(0, self._size - first))
+        return views
+
+    def flush_to(self, writer):
+        """Write the buffered history to an EventFileWriter and empty the buffer"""
+        for x, y, p, t in self.segments():
+            writer.write_columns(x, y, p, t)
+        self.clear()
+
+    def _copy_in(self, evs, src, dst, count):
+        self._x[dst:dst + count] = evs["x"][src:src + count]
+        self._y[dst:dst + count] = evs["y"][src:src + count]
+        self._p[dst:dst + count] = evs["p"][src:src + count]
+        self._t[dst:dst + count] = evs["t"][src:src + count]
+
+    def _view(self, begin, end):
+        return self._x[begin:end], self._y[begin:end], self._p[begin:end], self._t[begin:end]
+
+    def _drop_older_than(self, threshold):
+        if self._size == 0 or self._t[self._start] >= threshold:
+            return
+
+        dropped = 0
+        for _, _, _, t in self.segments():
+            count = int(np.searchsorted(t, threshold))
+            dropped += count
+            if count < len(t):
+                break
+
+        self._start = (self._start + dropped) % self.capacity
+        self._size -= dropped
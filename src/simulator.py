@@ -0,0 +1,263 @@
+import os
+import math
+import time
+import logging
+import numpy as np
+
+try:
+    from .evt_codec import EVENT_DTYPE
+    from .event_file import EventFileWriter
+except ImportError:
+    from evt_codec import EVENT_DTYPE
+    from event_file import EventFileWriter
+
+# Default values and ranges of the IMX636 (EVK4) biases
+DEFAULT_BIASES = {
+    "bias_diff": (0, (0, 0)),
+    "bias_diff_on": (0, (-85, 140)),
+    "bias_diff_off": (0, (-35, 190)),
+    "bias_fo": (0, (-35, 55)),
+    "bias_hpf": (0, (0, 120)),
+    "bias_refr": (0, (-20, 235)),
+}
+
+
+class SimulatedBiases:
+    """Same surface as metavision_hal.I_LL_Biases"""
+
+    def __init__(self):
+        self.values = {name: value for name, (value, _) in DEFAULT_BIASES.items()}
+        self.ranges = {name: bias_range for name, (_, bias_range) in DEFAULT_BIASES.items()}
+
+    def get_all_biases(self):
+        return dict(self.values)
+
+    def get(self, name):
+        return self.values[name]
+
+    def set(self, name, value):
+        if name not in self.values:
+            raise ValueError(f"Unknown bias: {name}")
+        low, high = self.ranges[name]
+        if not low <= value <= high:
+            raise ValueError(f"{name} out of range [{low}, {high}]: {value}")
+        self.values[name] = int(value)
+        return True
+
+    def rate_scales(self):
+        """
+        Event rate multipliers (ON, OFF, noise) for the current biases.
+
+        Lower contrast thresholds give more events, the high pass filter cuts
+        background noise, the low pass filter bandwidth and the refractory
+        period scale everything.
+        """
+        common = math.exp(self.values["bias_fo"] / 80) * math.exp(-self.values["bias_refr"] / 150)
+        on = math.exp(-self.values["bias_diff_on"] / 40) * common
+        off = math.exp(-self.values["bias_diff_off"] / 40) * common
+        noise = math.exp(-self.values["bias_hpf"] / 30) * common
+        return on, off, noise
+
+
+class SimulatedGeometry:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+
+class SimulatedEventsStream:
+    """Same surface as metavision_hal.I_EventsStream, logging is fed by the iterators"""
+
+    def __init__(self, device):
+        self.device = device
+        self.writer = None
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def log_raw_data(self, path):
+        self.stop_log_raw_data()
+        self.writer = EventFileWriter(path, self.device.width, self.device.height)
+        return True
+
+    def stop_log_raw_data(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        return True
+
+
+class SimulatedDevice:
+    """
+    Synthetic stand-in for a HAL device.
+
+    Events are generated at `event_rate` (events/s) with a spatial
+    `distribution` of "uniform", "blob" (moving gaussian spot) or "bar"
+    (moving vertical edge), plus uniform background noise at `noise_rate`.
+    Rates follow the current bias values. With `realtime`, iterators are
+    paced to the sensor clock like a live camera.
+    """
+
+    def __init__(self, width=1280, height=720, event_rate=1e6, noise_rate=5e4,
+                 distribution="blob", speed=0.5, realtime=True, seed=0):
+        self.logger = logging.getLogger(__name__)
+        self.width = width
+        self.height = height
+        self.event_rate = event_rate
+        self.noise_rate = noise_rate
+        self.distribution = distribution
+        self.speed = speed  # Sensor widths per second
+        self.realtime = realtime
+        self.seed = seed
+
+        self.biases = SimulatedBiases()
+        self.geometry = SimulatedGeometry(width, height)
+        self.events_stream = SimulatedEventsStream(self)
+
+    def get_i_ll_biases(self):
+        return self.biases
+
+    def get_i_geometry(self):
+        return self.geometry
+
+    def get_i_events_stream(self):
+        return self.events_stream
+
+    def events_iterator(self, mode="delta_t", delta_t=10000, n_events=10000, max_duration=None, **kwargs):
+        return SimulatedEventsIterator(self, mode=mode, delta_t=delta_t, n_events=n_events,
+                                       max_duration=max_duration)
+
+
+class SimulatedEventsIterator:
+    """Same surface as EventsIterator.from_device, over a SimulatedDevice"""
+
+    def __init__(self, device, mode="delta_t", delta_t=10000, n_events=10000, max_duration=None):
+        self.device = device
+        self.mode = mode
+        self.delta_t = delta_t
+        self.n_events = n_events
+        self.max_duration = max_duration
+        self.current_time = 0
+        self.rng = np.random.default_rng(device.seed)
+
+    def get_size(self):
+        return self.device.height, self.device.width
+
+    def get_current_time(self):
+        return self.current_time
+
+    def __iter__(self):
+        start = time.perf_counter()
+        while self.max_duration is None or self.current_time < self.max_duration:
+            if self.mode == "n_events":
+                rate = sum(self._rates())
+                duration = max(1, int(self.n_events / max(rate, 1) * 1e6))
+            else:
+                duration = self.delta_t
+
+            evs = self.generate(self.current_time, duration)
+            self.current_time += duration
+
+            if self.device.realtime:
+                delay = self.current_time / 1e6 - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            writer = self.device.events_stream.writer
+            if writer is not None:
+                writer.write(evs)
+
+            yield evs
+
+    def _rates(self):
+        on_scale, off_scale, noise_scale = self.device.biases.rate_scales()
+        signal = self.device.event_rate / 2
+        return signal * on_scale, signal * off_scale, self.device.noise_rate * noise_scale
+
+    def generate(self, t_start, duration):
+        """Events in [t_start, t_start + duration), sorted by time"""
+        width, height = self.device.width, self.device.height
+        on_rate, off_rate, noise_rate = self._rates()
+        seconds = duration / 1e6
+
+        n_on = self.rng.poisson(on_rate * seconds)
+        n_off = self.rng.poisson(off_rate * seconds)
+        n_noise = self.rng.poisson(noise_rate * seconds)
+        n_signal = n_on + n_off
+        n = n_signal + n_noise
+
+        t = np.sort(self.rng.integers(t_start, t_start + duration, n))
+        x = np.empty(n, dtype=np.float64)
+        y = np.empty(n, dtype=np.float64)
+        p = np.empty(n, dtype=np.int16)
+
+        # Signal events follow the scene, the noise is uniform
+        order = self.rng.permutation(n)
+        signal, noise = order[:n_signal], order[n_signal:]
+        p[signal[:n_on]] = 1
+        p[signal[n_on:]] = 0
+        p[noise] = self.rng.integers(0, 2, n_noise)
+
+        phase = t[signal] / 1e6 * self.device.speed
+        if self.device.distribution == "blob":
+            angle = 2 * math.pi * phase
+            sigma = min(width, height) / 20
+            x[signal] = width / 2 + width / 4 * np.cos(angle) + self.rng.normal(0, sigma, n_signal)
+            y[signal] = height / 2 + height / 4 * np.sin(angle) + self.rng.normal(0, sigma, n_signal)
+        elif self.device.distribution == "bar":
+            # ON events on the leading edge, OFF events on the trailing edge
+            bar_x = (phase % 1.0) * width
+            offset = np.where(p[signal] == 1, 4.0, -4.0)
+            x[signal] = bar_x + offset + self.rng.normal(0, 2, n_signal)
+            y[signal] = self.rng.uniform(0, height, n_signal)
+        else:
+            x[signal] = self.rng.uniform(0, width, n_signal)
+            y[signal] = self.rng.uniform(0, height, n_signal)
+
+        x[noise] = self.rng.uniform(0, width, n_noise)
+        y[noise] = self.rng.uniform(0, height, n_noise)
+
+        evs = np.empty(n, dtype=EVENT_DTYPE)
+        evs["x"] = np.clip(x, 0, width - 1)
+        evs["y"] = np.clip(y, 0, height - 1)
+        evs["p"] = p
+        evs["t"] = t
+        return evs
+
+
+def simulation_requested(simulate=None):
+    if simulate is None:
+        simulate = os.environ.get("CAMERA_SIMULATE", "").lower() not in ("", "0", "false", "no")
+    return bool(simulate)
+
+
+def open_device(simulate=None, **options):
+    """
+    HAL device of the plugged camera, or a SimulatedDevice built with
+    `options` when `simulate` is set. `simulate` defaults to the
+    CAMERA_SIMULATE environment variable.
+    """
+    if simulation_requested(simulate):
+        logging.getLogger(__name__).info("Using a simulated event camera")
+        return SimulatedDevice(**options)
+
+    from metavision_core.event_io.raw_reader import initiate_device
+    return initiate_device("")
+
+
+def iterator_from_device(device, **kwargs):
+    """EventsIterator.from_device, also accepting a SimulatedDevice"""
+    if isinstance(device, SimulatedDevice):
+        return device.events_iterator(**kwargs)
+
+    from metavision_core.event_io import EventsIterator
+    return EventsIterator.from_device(device=device, **kwargs)
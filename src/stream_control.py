@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class StreamSettings:
+    fps: int
+    scale: int
+    crf: int
+
+    def __str__(self):
+        return f"{self.fps} fps, 1/{self.scale} size, crf {self.crf}"
+
+
+class StreamController:
+    """
+    Adapt the settings of an encoded stream to what the encoder and the
+    network sustain.
+
+    The settings form a ladder from the best one down: CRF first goes up by
+    `crf_step` to `max_crf`, then fps halves down to `min_fps`, then the
+    frame size halves down to 1/`max_scale`. Every `interval_s`, `update`
+    looks at the FrameWriter counters of the last interval: dropped or late
+    frames, or a load above `high_load`, step one rung down. The load is
+    the larger of the time the writer spent blocked on the encoder stdin
+    and the encoder CPU time per frame, relative to the frame period and
+    divided by `cpu_count` (x264 spreads a frame over the cores).
+    After `recover_after` intervals below `low_load` without drops, it
+    steps one rung back up; when that step is congested at once, the wait
+    before the next attempt doubles, up to `max_recover_after`.
+    """
+
+    def __init__(self, fps=25, crf=28, min_fps=5, max_crf=40, max_scale=4, crf_step=4, interval_s=2.0,
+                 low_load=0.4, high_load=0.8, recover_after=3, max_recover_after=48, cpu_count=None):
+        self.logger = logging.getLogger(__name__)
+        self.interval_s = interval_s
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.low_load = low_load
+        self.high_load = high_load
+        self.recover_after = recover_after
+        self.max_recover_after = max_recover_after
+        self.recover_wait = recover_after
+        self.stepped_up = False
+        self.ladder = self.build_ladder(fps, crf, min_fps, max_crf, max_scale, crf_step)
+        self.level = 0
+        self.calm = 0
+        self.last_stats = None
+        self.last_time = None
+
+    @staticmethod
+    def build_ladder(fps, crf, min_fps, max_crf, max_scale, crf_step):
+        ladder = [StreamSettings(fps, 1, crf)]
+        while ladder[-1].crf < max_crf:
+            last = ladder[-1]
+            ladder.append(StreamSettings(last.fps, last.scale, min(last.crf + crf_step, max_crf)))
+        while ladder[-1].fps > min_fps:
+            last = ladder[-1]
+            ladder.append(StreamSettings(max(last.fps // 2, min_fps), last.scale, last.crf))
+        while ladder[-1].scale < max_scale:
+            last = ladder[-1]
+            ladder.append(StreamSettings(last.fps, min(last.scale * 2, max_scale), last.crf))
+        return ladder
+
+    @property
+    def settings(self):
+        return self.ladder[self.level]
+
+    def reset(self):
+        """Forget the counters, e.g. after the encoder was restarted with new settings"""
+        self.last_stats = None
+        self.last_time = None
+
+    def due(self):
+        """Whether `update` would look at the stats now, so they are only gathered then"""
+        return self.last_time is None or time.perf_counter() - self.last_time >= self.interval_s
+
+    def update(self, stats):
+        """
+        New settings if the stream should change, otherwise None.
+        `stats` are FrameWriter.stats() of the running encoder, with its CPU
+        time in seconds as "encode_time" when known.
+        """
+        now = time.perf_counter()
+        if self.last_stats is None:
+            self.last_stats = stats
+            self.last_time = now
+            return None
+        elapsed = now - self.last_time
+        if elapsed < self.interval_s:
+            return None
+
+        written = stats["written"] - self.last_stats["written"]
+        dropped = stats["dropped"] - self.last_stats["dropped"]
+        late = stats["late"] - self.last_stats["late"]
+        blocked = (stats["write_time"] - self.last_stats["write_time"]) / elapsed
+        encode_ms = None
+        load = blocked
+        if stats.get("encode_time") is not None and self.last_stats.get("encode_time") is not None and written:
+            encode_ms = (stats["encode_time"] - self.last_stats["encode_time"]) / written * 1000
+            load = max(load, encode_ms * self.settings.fps / 1000 / self.cpu_count)
+        self.last_stats = stats
+        self.last_time = now
+
+        details = (f"{written} frames, {dropped} dropped, {late} late, queue {stats['queue_depth']}, "
+                   f"{blocked * 100:.0f}% blocked on stdin"
+                   + (f", {encode_ms:.1f} ms/frame encoding" if encode_ms is not None else ""))
+        stepped_up, self.stepped_up = self.stepped_up, False
+
+        if dropped or late or load > self.high_load:
+            self.calm = 0
+            if stepped_up:
+                self.recover_wait = min(self.recover_wait * 2, self.max_recover_after)
+            if self.level + 1 < len(self.ladder):
+                return self.change(self.level + 1, f"congested ({details})")
+            self.logger.debug(f"Stream congested at the lowest settings ({details})")
+            return None
+
+        if stepped_up:
+            # The last step up held
+            self.recover_wait = self.recover_after
+        if load < self.low_load:
+            self.calm += 1
+            if self.calm >= self.recover_wait and self.level > 0:
+                self.calm = 0
+                self.stepped_up = True
+                return self.change(self.level - 1, f"headroom ({details})")
+        else:
+            self.calm = 0
+        return None
+
+    def change(self, level, reason):
+        old = self.settings
+        self.level = level
+        self.logger.info(f"Stream {old} -> {self.settings}: {reason}")
+        return self.settings
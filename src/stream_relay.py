@@ -0,0 +1,158 @@
+import queue
+import socket
+import logging
+import threading
+
+
+def parse_receivers(receivers, default_port=5000):
+    """[(ip, port)] from "ip", "ip:port", a comma separated list of them, or a list"""
+    if not receivers:
+        return []
+    if isinstance(receivers, str):
+        receivers = receivers.split(",")
+    addresses = []
+    for receiver in receivers:
+        if isinstance(receiver, tuple):
+            addresses.append(receiver)
+            continue
+        host, _, port = receiver.strip().partition(":")
+        if host:
+            addresses.append((host, int(port) if port else default_port))
+    return addresses
+
+
+class Subscriber:
+    """
+    One viewer of a StreamRelay, fed from its own queue and thread.
+
+    When the viewer falls `queue_size` chunks behind, its whole queue is
+    dropped: the decoder resyncs on the next keyframe after one gap instead
+    of stuttering on scattered losses, and the other viewers never wait.
+    """
+
+    def __init__(self, name, send, close=None, queue_size=512):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.send = send
+        self.close_socket = close
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.skips = 0
+        self.bytes_sent = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name=f"relay-{name}", daemon=True)
+        self.thread.start()
+
+    def put(self, chunk):
+        try:
+            self.queue.put_nowait(chunk)
+        except queue.Full:
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.skips += 1
+            self.queue.put_nowait(chunk)
+
+    def run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            try:
+                self.send(chunk)
+                self.bytes_sent += len(chunk)
+            except OSError as e:
+                self.logger.info(f"Viewer {self.name} left: {e}")
+                break
+        self.closed = True
+        if self.close_socket is not None:
+            self.close_socket()
+
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(None)
+
+
+class StreamRelay:
+    """
+    Fan one encoded stream out to any number of viewers.
+
+    Every chunk of the encoder output given to `publish` is copied to every
+    subscriber: UDP receivers added with `add`, and, with a `listen_port`,
+    TCP viewers connecting to it (e.g. ffplay tcp://<camera>:<port>), which
+    leave by disconnecting. Viewers join and leave while the stream runs,
+    and the relay outlives encoder restarts (attach it to the new encoder).
+    """
+
+    def __init__(self, receivers=None, receiver_port=5000, listen_port=None):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.listen_port = listen_port
+        self.server = None
+        self.closing = False
+        for host, port in parse_receivers(receivers, receiver_port):
+            self.add(host, port)
+
+        if listen_port is not None:
+            self.server = socket.create_server(("0.0.0.0", listen_port))
+            threading.Thread(target=self.accept, name="relay-accept", daemon=True).start()
+
+    def add(self, host, port=5000):
+        """Start sending the stream to a UDP receiver"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        name = f"udp://{host}:{port}"
+        self.subscribe(name, lambda chunk: sock.sendto(chunk, (host, port)), sock.close)
+        return name
+
+    def remove(self, host, port=5000):
+        return self.unsubscribe(f"udp://{host}:{port}")
+
+    def subscribe(self, name, send, close=None):
+        with self.lock:
+            if name in self.subscribers:
+                return
+            self.subscribers[name] = Subscriber(name, send, close)
+        self.logger.info(f"Viewer {name} joined, {len(self.subscribers)} in total")
+
+    def unsubscribe(self, name):
+        with self.lock:
+            subscriber = self.subscribers.pop(name, None)
+        if subscriber is None:
+            return False
+        subscriber.close()
+        self.logger.info(f"Viewer {name} left, {len(self.subscribers)} in total")
+        return True
+
+    @property
+    def viewers(self):
+        with self.lock:
+            return list(self.subscribers)
+
+    def accept(self):
+        while not self.closing:
+            try:
+                conn, address = self.server.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.subscribe(f"tcp://{address[0]}:{address[1]}", conn.sendall, conn.close)
+
+    def publish(self, chunk):
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+        for name, subscriber in subscribers:
+            if subscriber.closed:
+                self.unsubscribe(name)
+            else:
+                subscriber.put(chunk)
+
+    def close(self):
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        for name in self.viewers:
+            self.unsubscribe(name)
@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import threading
+import cv2
+import numpy as np
+
+# Demuxer and decoder options of the OpenCV FFmpeg backend: no input
+# buffering, no frame reordering, and a short probe so the first frame shows quickly
+LOW_LATENCY_OPTIONS = ("fflags;nobuffer|flags;low_delay|max_delay;0|reorder_queue_size;0"
+                       "|probesize;32768|analyzeduration;100000")
+
+
+class LatestFrameReceiver:
+    """
+    Decode a video stream on a background thread, keeping only the latest frame.
+
+    The capture is drained as fast as frames arrive, so the demuxer and
+    socket buffers never fill up and latency does not build up when the
+    display is slower than the stream. Frames replaced before being read
+    count as `skipped`.
+    """
+
+    def __init__(self, url, low_latency=True):
+        self.logger = logging.getLogger(__name__)
+        self.url = url
+        self.low_latency = low_latency
+        self.condition = threading.Condition()
+        self.frame = None
+        self.received_at = None
+        self.sequence = 0
+        self.read_sequence = 0
+        self.received = 0
+        self.skipped = 0
+        self.failures = 0
+        self.closing = False
+        self.thread = threading.Thread(target=self.run, name="frame-receiver", daemon=True)
+
+    def open(self):
+        if self.low_latency:
+            # Read by the FFmpeg backend when the capture is opened
+            os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", LOW_LATENCY_OPTIONS)
+        capture = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return capture
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        capture = self.open()
+        try:
+            while not self.closing:
+                ret, frame = capture.read()
+                received_at = time.time()
+                if not ret:
+                    # Gap in the stream, wait instead of spinning
+                    self.failures += 1
+                    time.sleep(0.01)
+                    continue
+                with self.condition:
+                    if self.sequence != self.read_sequence:
+                        self.skipped += 1
+                    self.frame = frame
+                    self.received_at = received_at
+                    self.sequence += 1
+                    self.received += 1
+                    self.condition.notify_all()
+        finally:
+            capture.release()
+
+    def latest(self, timeout=1.0):
+        """(frame, reception wall clock time) of a frame not returned yet, None on timeout"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.sequence != self.read_sequence or self.closing, timeout):
+                return None
+            if self.closing:
+                return None
+            self.read_sequence = self.sequence
+            return self.frame, self.received_at
+
+    def close(self):
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.thread.join(timeout=2.0)
+
+
+class LatencyMeter:
+    """
+    Latency and jitter of time stamped frames.
+
+    Latency is the receiver clock minus the sender stamp, so it is only
+    meaningful when both clocks are synchronised (NTP/PTP); a constant
+    clock offset still leaves the jitter valid. Jitter is the smoothed mean
+    deviation of consecutive latencies, as in RFC 3550.
+    """
+
+    def __init__(self, window=256):
+        self.latencies = np.zeros(window)
+        self.count = 0
+        self.jitter = 0.0
+        self.last = None
+
+    def add(self, sent_ms, shown_at):
+        # Stamps are ms modulo 2**32
+        latency = ((int(shown_at * 1000) - sent_ms + 2 ** 31) % 2 ** 32) - 2 ** 31
+        if self.last is not None:
+            self.jitter += (abs(latency - self.last) - self.jitter) / 16
+        self.last = latency
+        self.latencies[self.count % len(self.latencies)] = latency
+        self.count += 1
+        return latency
+
+    def stats(self):
+        latencies = self.latencies[:min(self.count, len(self.latencies))]
+        if not len(latencies):
+            return None
+        return {
+            "latency_ms": float(np.median(latencies)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "jitter_ms": self.jitter,
+        }